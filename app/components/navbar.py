@@ -2,9 +2,7 @@ from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
 
-from app.services.auth import get_current_user
-from app.services.users import get_len_panier, get_wallet_balance, get_user_from_id, get_user_info, get_in_progress_orders_count
-from app.services.settings import get_setting
+from app.services.user_context import get_user_context
 from app.translations.translations import t
 
 
@@ -29,16 +27,17 @@ def navbar(request: Request):
     lang_cookie = request.cookies.get("language", "fr")
     distance_cookie = float(request.cookies.get("max_distance", "10"))
 
-    user_id = get_current_user()
-    if user_id:
-        user_info = get_user_info(user_id)
+    # Contexte partagé avec la page (une seule requête SQL pour toute la navbar)
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    user_info = context["user_info"]
     # user_id = get_current_user(request)
 
     with ui.header().classes('app-navbar items-center justify-between px-4 py-3 shadow-md'):
 
         with ui.row().classes('items-center gap-3'):
             # === Nom et logo ===
-            site_name = get_setting("site_name")
+            site_name = context["site_name"]
             ui.button(f'🏥 {site_name}', on_click=lambda: ui.navigate.to('/home')) \
                 .props("color='' unelevated") \
                 .classes('nav-brand text-lg') \
@@ -46,7 +45,7 @@ def navbar(request: Request):
             
             # === Avatar sur Mobile ===
             if user_id and (user_info.get('is_confirmed', False) or user_info.get('is_admin', False)):
-                username = get_user_from_id(user_id)
+                username = user_info["username"]
                 with ui.row().classes('flex md:hidden items-center gap-3'):
                     ui.image(f"https://ui-avatars.com/api/?name={username}&background=34a853&color=fff&size=128") \
                         .classes('nav-avatar')
@@ -68,7 +67,7 @@ def navbar(request: Request):
                 
         # === Zone utilisateur ===
         if user_id and (user_info.get('is_confirmed', False) or user_info.get('is_admin', False)):
-            username = get_user_from_id(user_id)
+            username = user_info["username"]
             with ui.row().classes('items-center gap-3 desktop-nav'):
 
                 # === Avatar ===
@@ -82,14 +81,14 @@ def navbar(request: Request):
                     .classes('nav-username')
                 
                 # === Wallet ===
-                wallet_balance = get_wallet_balance(user_id)
+                wallet_balance = context["wallet_balance"]
                 ui.button(f'💳 {wallet_balance:.2f} €',
                           on_click=lambda: ui.navigate.to('/wallet')) \
                     .props("color='' unelevated") \
                     .classes('nav-btn nav-wallet')
                 
                 # === Commandes ===
-                orders_in_progress = get_in_progress_orders_count(user_id)
+                orders_in_progress = context["orders_in_progress"]
 
                 with ui.button(on_click=lambda: ui.navigate.to('/orders_in_progress')) \
                         .props("color='' unelevated") \
@@ -99,7 +98,7 @@ def navbar(request: Request):
                     ui.icon('local_shipping')
 
                 # === Panier ===
-                items_in_panier = get_len_panier(user_id)
+                items_in_panier = context["panier_count"]
                 with ui.button(on_click=lambda: ui.navigate.to('/panier')) \
                         .props("color='' unelevated") \
                         .classes('nav-btn nav-cart'):
@@ -173,14 +172,14 @@ def navbar(request: Request):
             with ui.row().classes('flex md:hidden items-center gap-3'):
 
                 # === Wallet ===
-                wallet_balance = get_wallet_balance(user_id)
+                wallet_balance = context["wallet_balance"]
                 ui.button(f'💳 {wallet_balance:.2f} €',
                           on_click=lambda: ui.navigate.to('/wallet')) \
                     .props("color='' unelevated") \
                     .classes('nav-btn nav-wallet')
                 
                 # === Commandes ===
-                orders_in_progress = get_in_progress_orders_count(user_id)
+                orders_in_progress = context["orders_in_progress"]
 
                 with ui.button(on_click=lambda: ui.navigate.to('/orders_in_progress')) \
                         .props("color='' unelevated") \
@@ -190,7 +189,7 @@ def navbar(request: Request):
                     ui.icon('local_shipping')
 
                 # === Panier ===
-                items_in_panier = get_len_panier(user_id)
+                items_in_panier = context["panier_count"]
                 with ui.button(on_click=lambda: ui.navigate.to('/panier')) \
                         .props("color='' unelevated") \
                         .classes('nav-btn nav-cart'):
@@ -2,9 +2,7 @@ from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
 
-from app.services.auth import get_current_user
-from app.services.users import get_user_from_id, get_user_info
-from app.services.settings import get_setting
+from app.services.user_context import get_user_context
 from app.translations.translations import t
 
 
@@ -29,13 +27,16 @@ def navbar_delivery(request: Request):
     lang_cookie = request.cookies.get("language", "fr")
     distance_cookie = float(request.cookies.get("max_distance", "10"))
 
-    user_id = get_current_user()
+    # Contexte partagé avec la page (une seule requête SQL pour toute la navbar)
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    user_info = context["user_info"]
 
     with ui.header().classes('app-navbar items-center justify-between px-4 py-3 shadow-md'):
 
         with ui.row().classes('items-center gap-3'):
             # === Nom et logo ===
-            site_name = get_setting("site_name")
+            site_name = context["site_name"]
             ui.button(f'🏥 {site_name}', on_click=lambda: ui.navigate.to('/delivery/home')) \
                 .props("color='' unelevated") \
                 .classes('nav-brand text-lg') \
@@ -43,7 +44,7 @@ def navbar_delivery(request: Request):
             
             # === Avatar sur Mobile ===
             if user_id:
-                username = get_user_from_id(user_id)
+                username = user_info["username"]
                 with ui.row().classes('flex md:hidden items-center gap-3'):
                     ui.image(f"https://ui-avatars.com/api/?name={username}&background=34a853&color=fff&size=128") \
                         .classes('nav-avatar')
@@ -54,7 +55,6 @@ def navbar_delivery(request: Request):
 
             # === Admin panel ===
             if user_id:
-                user_info = get_user_info(user_id)
                 with ui.row().classes('items-center gap-3 desktop-nav'):
                     if user_info.get('is_admin', False):
                         ui.button(t('admin_panel', lang_cookie), on_click=lambda: ui.navigate.to('/admin_panel')) \
@@ -68,7 +68,7 @@ def navbar_delivery(request: Request):
         
         # === Zone utilisateur ===
         if user_id:
-            username = get_user_from_id(user_id)
+            username = user_info["username"]
             with ui.row().classes('items-center gap-3 desktop-nav'):
 
                 # === Avatar ===
@@ -175,6 +175,9 @@ def init_db(conn):
     )
     """)
 
+    # Résumé prix/stock par produit (maintenu par les triggers de pharmacy_products)
+    create_price_summary(conn)
+
     # Table des interactions produits/utilisateurs
     cur.execute("""
         CREATE TABLE IF NOT EXISTS user_product_interactions (
@@ -199,6 +202,101 @@ def init_db(conn):
     print("✅ Tables créées (si elles n'existaient pas déjà).")
 
 
+def _refresh_price_summary_sql(product_id_expr: str) -> str:
+
+    """Requête recalculant la ligne de résumé d'un produit (product_id_expr : ex. NEW.product_id)."""
+
+    return f"""
+        INSERT OR REPLACE INTO product_price_summary (product_id, min_price, min_price_pharmacy_id, total_qty, pharmacy_count)
+        SELECT {product_id_expr},
+            (SELECT price FROM pharmacy_products WHERE product_id = {product_id_expr} AND qty > 0 ORDER BY price ASC LIMIT 1),
+            (SELECT pharmacy_id FROM pharmacy_products WHERE product_id = {product_id_expr} AND qty > 0 ORDER BY price ASC LIMIT 1),
+            (SELECT COALESCE(SUM(qty), 0) FROM pharmacy_products WHERE product_id = {product_id_expr}),
+            (SELECT COUNT(*) FROM pharmacy_products WHERE product_id = {product_id_expr} AND qty > 0);
+    """
+
+
+def create_price_summary(conn):
+
+    """
+    Créer la table product_price_summary (prix min, pharmacie la moins chère, stock total et
+    nombre de pharmacies avec stock, par produit) et les triggers qui la tiennent à jour à chaque
+    écriture sur pharmacy_products (commandes, éditeur de stock admin, suppressions...).
+    La table est remplie à partir des stocks existants si elle vient d'être créée.
+    """
+
+    cur = conn.cursor()
+
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_price_summary'")
+    already_exists = cur.fetchone() is not None
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS product_price_summary (
+        product_id INTEGER PRIMARY KEY,
+        min_price REAL,                  -- prix le plus bas parmi les pharmacies avec stock (NULL si indisponible)
+        min_price_pharmacy_id INTEGER,   -- pharmacie proposant ce prix
+        total_qty INTEGER NOT NULL DEFAULT 0,
+        pharmacy_count INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(product_id) REFERENCES products(id)
+    )
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS pharmacy_products_summary_insert
+    AFTER INSERT ON pharmacy_products
+    BEGIN
+        {_refresh_price_summary_sql("NEW.product_id")}
+    END
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS pharmacy_products_summary_update
+    AFTER UPDATE OF product_id, price, qty ON pharmacy_products
+    BEGIN
+        {_refresh_price_summary_sql("OLD.product_id")}
+        {_refresh_price_summary_sql("NEW.product_id")}
+    END
+    """)
+
+    cur.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS pharmacy_products_summary_delete
+    AFTER DELETE ON pharmacy_products
+    BEGIN
+        {_refresh_price_summary_sql("OLD.product_id")}
+    END
+    """)
+
+    if not already_exists:
+        rebuild_price_summary(conn)
+
+    conn.commit()
+
+
+def rebuild_price_summary(conn):
+
+    """Recalculer entièrement product_price_summary à partir de pharmacy_products."""
+
+    cur = conn.cursor()
+    cur.execute("DELETE FROM product_price_summary")
+    cur.execute("""
+        INSERT INTO product_price_summary (product_id, min_price, min_price_pharmacy_id, total_qty, pharmacy_count)
+        SELECT totals.product_id, cheapest.price, cheapest.pharmacy_id, totals.total_qty, totals.pharmacy_count
+        FROM (
+            SELECT product_id, SUM(qty) AS total_qty, SUM(qty > 0) AS pharmacy_count
+            FROM pharmacy_products
+            GROUP BY product_id
+        ) AS totals
+        LEFT JOIN (
+            -- SQLite renvoie les colonnes "nues" de la ligne qui porte le MIN()
+            SELECT product_id, pharmacy_id, MIN(price) AS price
+            FROM pharmacy_products
+            WHERE qty > 0
+            GROUP BY product_id
+        ) AS cheapest ON cheapest.product_id = totals.product_id
+    """)
+    conn.commit()
+
+
 def main():
 
     conn = sqlite3.connect(DB_FILE)
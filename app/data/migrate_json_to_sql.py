@@ -3,6 +3,8 @@ import sqlite3
 from pathlib import Path
 from collections import Counter
 
+from app.data.migrations import run_migrations
+
 
 BASE_DIR = Path(__file__).resolve().parent
 
@@ -305,26 +307,44 @@ def migrate_users(conn):
                 address = item.get("address", None)
                 delivery_person_id = item.get("delivery_person_id", None)
 
-                # Vérifier si une ligne existe déjà pour cet order_id + user_id + product_id
+                # En-tête de la commande (créé à la première ligne rencontrée)
+                cur.execute("""
+                    INSERT INTO order_headers (id, user_id, delivery_person_id, status, date, latitude, longitude, address)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET status = excluded.status, delivery_person_id = excluded.delivery_person_id
+                """, (order_id, user_id, delivery_person_id, status, date, latitude, longitude, address))
+
+                if product_id == 0:  # frais de livraison
+                    cur.execute("UPDATE order_headers SET delivery_fee = ? WHERE id = ?", (total_price, order_id))
+                    continue
+
+                # Vérifier si une ligne existe déjà pour cet order_id + product_id + pharmacy_id
                 cur.execute("""
                     SELECT id FROM orders
-                    WHERE order_id = ? AND user_id = ? AND product_id = ?
-                """, (order_id, user_id, product_id))
+                    WHERE order_id = ? AND product_id = ? AND pharmacy_id IS ?
+                """, (order_id, product_id, pharmacy_id))
                 row = cur.fetchone()
 
                 if row:
                     # Mise à jour si déjà présent
                     cur.execute("""
                         UPDATE orders
-                        SET qty = ?, total_price = ?, date = ?
+                        SET qty = ?, total_price = ?
                         WHERE id = ?
-                    """, (qty, total_price, date, row[0]))
+                    """, (qty, total_price, row[0]))
                 else:
                     # Insertion sinon
                     cur.execute("""
-                        INSERT INTO orders (order_id, user_id, product_id, qty, total_price, pharmacy_id, date, status, latitude, longitude, address, delivery_person_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (order_id, user_id, product_id, qty, total_price, pharmacy_id, date, status, latitude, longitude, address, delivery_person_id))
+                        INSERT INTO orders (order_id, product_id, qty, total_price, pharmacy_id)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, (order_id, product_id, qty, total_price, pharmacy_id))
+
+            # Total de la commande = lignes + frais de livraison
+            cur.execute("""
+                UPDATE order_headers
+                SET total = delivery_fee + COALESCE((SELECT SUM(total_price) FROM orders WHERE order_id = ?), 0)
+                WHERE id = ?
+            """, (order_id, order_id))
 
 
     conn.commit()
@@ -556,6 +576,7 @@ def main():
     conn = sqlite3.connect(DB_FILE)
 
     init_db(conn)
+    run_migrations(conn)  # schéma à jour (order_headers...) avant d'importer les commandes
     migrate_users(conn)
     migrate_reviews(conn)
     migrate_products(conn)
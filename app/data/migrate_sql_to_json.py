@@ -66,12 +66,18 @@ def export_users(conn):
             user_info["wallet_data"]["history"].append([date, amount, desc])
 
         # commandes / orders
+        # une entrée par ligne produit (+ une entrée product_id 0 pour les frais de livraison), champs de l'en-tête répétés
         cur.execute("""
-            SELECT order_id, product_id, qty, total_price, date, pharmacy_id, status, latitude, longitude, address, delivery_person_id
-            FROM orders
-            WHERE user_id = ?
-            ORDER BY order_id
-        """, (user_id,))
+            SELECT h.id, o.product_id, o.qty, o.total_price, h.date, o.pharmacy_id, h.status, h.latitude, h.longitude, h.address, h.delivery_person_id
+            FROM order_headers h
+            JOIN orders o ON o.order_id = h.id
+            WHERE h.user_id = ?
+            UNION ALL
+            SELECT id, 0, 0, delivery_fee, date, NULL, status, latitude, longitude, address, delivery_person_id
+            FROM order_headers
+            WHERE user_id = ? AND delivery_fee > 0
+            ORDER BY 1
+        """, (user_id, user_id))
         for order_id, product_id, qty, total_price, date, pharmacy_id, status, latitude, longitude, address, delivery_person_id in cur.fetchall():
             if order_id not in user_info["orders"]:
                 user_info["orders"][order_id] = []
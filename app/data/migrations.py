@@ -0,0 +1,426 @@
+import sqlite3
+import sys
+from pathlib import Path
+
+from app.data.create_db import create_price_summary, init_db
+from app.recommendations.collaborative import USER_RECOMMENDATIONS_SQL
+from app.services.catalog import CATALOG_COMPONENTS_SQL, CATALOG_PRICES_SQL, CATALOG_PRODUCTS_SQL, CATALOG_TAGS_SQL
+from app.services.auth import SESSION_GET_SQL, SESSION_PURGE_SQL
+from app.services.db import CHANGE_COUNTER_SQL
+from app.services.geocoding import GEOCODE_CACHE_READ_SQL
+from app.services.items import DELETE_PRODUCT_ROWS_SQL, TOTAL_PRICE_FOR_PRODUCT_SQL
+from app.services.reviews import AVERAGE_RATING_SQL, REVIEWS_SQL
+from app.services.users import (
+    CLAIM_ORDER_SQL, CLAIM_STATUS_SQL, GET_ID_FROM_USERNAME_SQL, GET_PANIER_SQL, IN_PROGRESS_ORDERS_COUNT_SQL,
+    LAST_ORDER_CHANGE_SQL, ORDER_CHANGES_SQL, ORDER_FILTER_CUSTOMER, ORDER_FILTER_DELIVERY_PERSON, ORDER_FILTER_ID,
+    ORDER_FILTER_LAST, ORDER_FILTER_PENDING, ORDER_FILTER_PENDING_ID, ORDERS_SQL, VISIT_FLUSH_SQL, VISIT_HISTORY_SQL,
+)
+from app.services.wallet import (
+    WALLET_BALANCE_SQL, WALLET_DEBIT_SQL, WALLET_HISTORY_BEFORE_SQL, WALLET_HISTORY_COUNT_SQL, WALLET_HISTORY_SQL,
+)
+
+
+BASE_DIR = Path(__file__).resolve().parent
+DB_FILE = BASE_DIR / "data.db"
+
+
+# === Migrations ===
+# Chaque migration est idempotente et identifiée par un numéro de version croissant.
+# La version courante de la base est stockée dans PRAGMA user_version.
+
+def _add_price_summary(conn):
+
+    """Table product_price_summary + triggers de mise à jour (remplie depuis pharmacy_products)."""
+
+    create_price_summary(conn)
+
+
+def _add_hot_lookup_indexes(conn):
+
+    """Index secondaires des recherches les plus fréquentes (évite les scans complets de tables)."""
+
+    cur = conn.cursor()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_user_status ON orders(user_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_delivery_person_status ON orders(delivery_person_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_date ON orders(status, date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_history_user_page ON user_history(user_id, page)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_product_tags_product ON product_tags(product_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_product_tags_tag ON product_tags(tag)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_product_components_product ON product_components(product_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_pharmacy_products_product_qty_price ON pharmacy_products(product_id, qty, price)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_reviews_product_date ON reviews(product_id, date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wallet_history_user_date ON wallet_history(user_id, date)")
+    cur.execute("ANALYZE")  # statistiques pour que le planificateur choisisse les bons index
+
+
+def _unique_user_history_page(conn):
+
+    """Fusionne les doublons (user_id, page) de user_history et rend le couple unique (upsert des visites)."""
+
+    cur = conn.cursor()
+    cur.execute("""
+        UPDATE user_history
+        SET visits = (
+            SELECT SUM(h.visits) FROM user_history h
+            WHERE h.user_id IS user_history.user_id AND h.page IS user_history.page
+        )
+        WHERE id IN (SELECT MIN(id) FROM user_history GROUP BY user_id, page HAVING COUNT(*) > 1)
+    """)
+    cur.execute("DELETE FROM user_history WHERE id NOT IN (SELECT MIN(id) FROM user_history GROUP BY user_id, page)")
+    cur.execute("DROP INDEX IF EXISTS idx_user_history_user_page")  # remplacé par l'index unique
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_user_history_user_page ON user_history(user_id, page)")
+
+
+def _add_sessions(conn):
+
+    """Table des sessions partagée entre process (backend SESSION_BACKEND=sqlite)."""
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            token TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires_at ON sessions(expires_at)")
+
+
+def _add_geocode_cache(conn):
+
+    """Cache persistant du géocodage : adresse normalisée -> coordonnées (NULL = adresse introuvable)."""
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS geocode_cache (
+            address_key TEXT PRIMARY KEY,
+            address TEXT NOT NULL,
+            lat REAL,
+            lng REAL,
+            updated_at REAL NOT NULL
+        )
+    """)
+
+
+def _add_order_headers(conn):
+
+    """
+    Table order_headers (une ligne par commande : client, livreur, statut, date, adresse, frais, total) ;
+    orders ne garde que les lignes produits (order_id -> order_headers.id). Les frais de livraison
+    (anciennes lignes product_id = 0) passent dans order_headers.delivery_fee.
+    """
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_headers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            delivery_person_id INTEGER,
+            status TEXT NOT NULL,
+            date TEXT NOT NULL,
+            latitude REAL,
+            longitude REAL,
+            address TEXT,
+            delivery_fee REAL NOT NULL DEFAULT 0,
+            total REAL NOT NULL DEFAULT 0,              -- produits + frais de livraison
+            FOREIGN KEY(user_id) REFERENCES users(id),
+            FOREIGN KEY(delivery_person_id) REFERENCES users(id)
+        )
+    """)
+
+    columns = {row[1] for row in cur.execute("PRAGMA table_info(orders)")}
+    if "status" in columns:  # ancien schéma : une commande = plusieurs lignes portant toutes ses informations
+        cur.execute("""
+            INSERT OR IGNORE INTO order_headers (id, user_id, delivery_person_id, status, date, latitude, longitude, address, delivery_fee, total)
+            SELECT order_id, MIN(user_id), MAX(delivery_person_id), MIN(status), MIN(date),
+                   MAX(latitude), MAX(longitude), MAX(address),
+                   COALESCE(SUM(CASE WHEN product_id = 0 THEN total_price END), 0), COALESCE(SUM(total_price), 0)
+            FROM orders
+            GROUP BY order_id
+        """)
+        cur.execute("""
+            CREATE TABLE orders_lines (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                qty INTEGER NOT NULL,
+                total_price REAL NOT NULL,
+                pharmacy_id INTEGER,
+                FOREIGN KEY(order_id) REFERENCES order_headers(id) ON DELETE CASCADE,
+                FOREIGN KEY(product_id) REFERENCES products(id)
+            )
+        """)
+        cur.execute("""
+            INSERT INTO orders_lines (id, order_id, product_id, qty, total_price, pharmacy_id)
+            SELECT id, order_id, product_id, qty, total_price, pharmacy_id FROM orders WHERE product_id != 0
+        """)
+        cur.execute("DROP TABLE orders")  # supprime aussi ses index (statut, livreur, date)
+        cur.execute("ALTER TABLE orders_lines RENAME TO orders")
+
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_order_id ON orders(order_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_order_headers_user_status ON order_headers(user_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_order_headers_delivery_person_status ON order_headers(delivery_person_id, status)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_order_headers_status_date ON order_headers(status, date)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_order_headers_date ON order_headers(date)")
+    cur.execute("ANALYZE")
+
+
+def _add_wallet_history_keyset_index(conn):
+
+    """Index (user_id, id) de wallet_history : historique paginé par clé, sans tri sur la date texte."""
+
+    cur = conn.cursor()
+    cur.execute("DROP INDEX IF EXISTS idx_wallet_history_user_date")  # remplacé (l'historique est trié par id)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_wallet_history_user_id ON wallet_history(user_id, id)")
+
+
+def _add_user_recommendations(conn):
+
+    """Recommandations précalculées par le filtrage collaboratif : top N produits par utilisateur, dans l'ordre."""
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS user_recommendations (
+            user_id INTEGER NOT NULL,
+            rank INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (user_id, rank)
+        ) WITHOUT ROWID
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_user_recommendations_product ON user_recommendations(product_id)")
+
+
+def _create_change_counter(cur, name: str, table: str):
+
+    """Compteur `name` de change_counters, incrémenté par trigger à chaque écriture sur `table`."""
+
+    cur.execute("INSERT OR IGNORE INTO change_counters (name, version) VALUES (?, 0)", (name,))
+    for event in ("INSERT", "UPDATE", "DELETE"):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_change_counter_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE change_counters SET version = version + 1 WHERE name = '{name}';
+            END
+        """)
+
+
+def _add_change_counters(conn):
+
+    """
+    Table change_counters : un numéro de version par famille de données, incrémenté par trigger.
+    Les caches en mémoire d'un processus le relisent (une ligne par clé primaire) pour voir les
+    écritures faites par les autres workers. Premier compteur : "orders" (table order_headers).
+    """
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS change_counters (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    _create_change_counter(cur, "orders", "order_headers")
+
+
+def _add_catalog_change_counters(conn):
+
+    """
+    Compteurs "catalog" (products, product_tags, product_components) et "prices" (product_price_summary,
+    tenu par les triggers de pharmacy_products, et pharmacies pour leur nom) : la photo du catalogue
+    d'un worker se recharge quand un autre worker les modifie.
+    """
+
+    cur = conn.cursor()
+    for table in ("products", "product_tags", "product_components"):
+        _create_change_counter(cur, "catalog", table)
+    for table in ("product_price_summary", "pharmacies"):
+        _create_change_counter(cur, "prices", table)
+
+
+ORDER_CHANGES_KEPT = 10000  # lignes gardées dans order_changes (au-delà, un tableau en retard se recharge entièrement)
+
+
+def _add_order_changes(conn):
+
+    """
+    Journal order_changes (numéro croissant, commande) rempli par trigger à chaque écriture sur order_headers :
+    le tableau des commandes en attente d'un worker n'y relit que les commandes modifiées depuis sa dernière
+    synchronisation. Seules les ORDER_CHANGES_KEPT dernières lignes sont gardées.
+    """
+
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS order_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL
+        )
+    """)
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        cur.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS order_headers_changes_{event.lower()}
+            AFTER {event} ON order_headers
+            BEGIN
+                INSERT INTO order_changes (order_id) VALUES ({row}.id);
+            END
+        """)
+    cur.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS order_changes_prune
+        AFTER INSERT ON order_changes
+        BEGIN
+            DELETE FROM order_changes WHERE seq <= NEW.seq - {ORDER_CHANGES_KEPT};
+        END
+    """)
+
+
+MIGRATIONS = [
+    (1, "Résumé prix/stock par produit", _add_price_summary),
+    (2, "Index des recherches fréquentes", _add_hot_lookup_indexes),
+    (3, "Unicité (user_id, page) de l'historique de visites", _unique_user_history_page),
+    (4, "Table des sessions partagées", _add_sessions),
+    (5, "Cache de géocodage des adresses", _add_geocode_cache),
+    (6, "En-têtes de commande (order_headers), orders devient la table des lignes", _add_order_headers),
+    (7, "Index de pagination de l'historique des wallets", _add_wallet_history_keyset_index),
+    (8, "Recommandations précalculées (filtrage collaboratif)", _add_user_recommendations),
+    (9, "Compteurs de changements partagés entre workers", _add_change_counters),
+    (10, "Compteurs de changements du catalogue et des prix", _add_catalog_change_counters),
+    (11, "Journal des commandes modifiées", _add_order_changes),
+]
+
+
+def get_schema_version(conn) -> int:
+
+    """Retourne la version de schéma enregistrée dans la base (0 si jamais migrée)."""
+
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn):
+
+    """Applique, dans l'ordre, les migrations dont la version est supérieure à celle de la base."""
+
+    current = get_schema_version(conn)
+
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+
+        print(f"🔧 Migration {version} : {description}...")
+        migrate(conn)
+        conn.execute(f"PRAGMA user_version = {version}")
+        conn.commit()
+
+    if current < MIGRATIONS[-1][0]:
+        print(f"✅ Schéma à jour (version {MIGRATIONS[-1][0]}).")
+
+
+# === Contrôle des plans de requêtes ===
+# Requêtes des services qui doivent toujours passer par un index (jamais de "SCAN <table>").
+# Ce sont les constantes exécutées par les services eux-mêmes : le contrôle ne peut pas dériver du code.
+HOT_QUERIES = {
+    "get_order_details": ORDERS_SQL.format(order_filter=ORDER_FILTER_ID),
+    "get_last_order": ORDERS_SQL.format(order_filter=ORDER_FILTER_LAST),
+    "get_all_pending_order": ORDERS_SQL.format(order_filter=ORDER_FILTER_PENDING),
+    "get_all_pending_order (une commande)": ORDERS_SQL.format(order_filter=ORDER_FILTER_PENDING_ID),
+    "get_orders_for_delivery_person": ORDERS_SQL.format(order_filter=ORDER_FILTER_DELIVERY_PERSON),
+    "get_orders_for_customer": ORDERS_SQL.format(order_filter=ORDER_FILTER_CUSTOMER),
+    "get_in_progress_orders_count": IN_PROGRESS_ORDERS_COUNT_SQL,
+    "claim_order": CLAIM_ORDER_SQL,
+    "claim_order (raison du refus)": CLAIM_STATUS_SQL,
+    "record_visit (flush)": VISIT_FLUSH_SQL,
+    "get_visit_history": VISIT_HISTORY_SQL,
+    "get_total_price_for_product": TOTAL_PRICE_FOR_PRODUCT_SQL,
+    "get_reviews": REVIEWS_SQL,
+    "get_average_rating": AVERAGE_RATING_SQL,
+    "get_wallet_history": WALLET_HISTORY_SQL,
+    "get_wallet_history (page suivante)": WALLET_HISTORY_BEFORE_SQL,
+    "count_wallet_history": WALLET_HISTORY_COUNT_SQL,
+    "wallet debit": WALLET_DEBIT_SQL,
+    "get_wallet_balance": WALLET_BALANCE_SQL,
+    "get_panier": GET_PANIER_SQL,
+    "get_id_from_username": GET_ID_FROM_USERNAME_SQL,
+    "sessions (lecture)": SESSION_GET_SQL,
+    "sessions (purge)": SESSION_PURGE_SQL,
+    "geocode (cache)": GEOCODE_CACHE_READ_SQL,
+    "get_user_recommendations": USER_RECOMMENDATIONS_SQL,
+    "delete_product (recommandations)": DELETE_PRODUCT_ROWS_SQL.format(table="user_recommendations"),
+    "get_change_counter": CHANGE_COUNTER_SQL,
+    "tableau des commandes (journal)": ORDER_CHANGES_SQL,
+    "tableau des commandes (dernier numéro)": LAST_ORDER_CHANGE_SQL,
+}
+
+# Chargements complets (photo du catalogue) : un seul parcours, celui de la table principale,
+# sans tri temporaire (USE TEMP B-TREE) ni parcours des tables jointes.
+BULK_QUERIES = {
+    "catalogue (produits)": CATALOG_PRODUCTS_SQL,
+    "catalogue (composants)": CATALOG_COMPONENTS_SQL,
+    "catalogue (tags)": CATALOG_TAGS_SQL,
+    "catalogue (prix)": CATALOG_PRICES_SQL,
+}
+
+
+def find_full_scans(conn) -> dict[str, list[str]]:
+
+    """
+    Exécute EXPLAIN QUERY PLAN sur chaque requête de HOT_QUERIES et BULK_QUERIES.
+    Retourne {nom de la requête: [étapes fautives]} : "SCAN ..." pour HOT_QUERIES, parcours ou tri
+    au-delà du parcours de la table principale pour BULK_QUERIES.
+    """
+
+    scans = {}
+    for name, query in HOT_QUERIES.items():
+        params = (None,) * query.count("?")
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        full_scans = [detail for *_, detail in plan if detail.startswith("SCAN ")]
+        if full_scans:
+            scans[name] = full_scans
+
+    # Chargements complets : le premier parcours est attendu, pas un second ni un tri temporaire
+    for name, query in BULK_QUERIES.items():
+        plan = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        extra_steps = [detail for *_, detail in plan if detail.startswith(("SCAN ", "USE TEMP B-TREE"))][1:]
+        if extra_steps:
+            scans[name] = extra_steps
+
+    return scans
+
+
+def check_query_plans() -> bool:
+
+    """
+    Vérifie sur une base neuve (en mémoire) que les requêtes fréquentes utilisent toutes un index.
+    Affiche les requêtes fautives et retourne False si une requête repasse en scan complet.
+    """
+
+    conn = sqlite3.connect(":memory:")
+    init_db(conn)
+    run_migrations(conn)
+    scans = find_full_scans(conn)
+    conn.close()
+
+    for name, details in scans.items():
+        print(f"❌ {name} : {', '.join(details)}")
+    if not scans:
+        print(f"✅ {len(HOT_QUERIES) + len(BULK_QUERIES)} requêtes vérifiées, aucun scan complet inattendu.")
+
+    return not scans
+
+
+def main():
+
+    if "--check-plans" in sys.argv:
+        sys.exit(0 if check_query_plans() else 1)
+
+    conn = sqlite3.connect(DB_FILE)
+    run_migrations(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
+
+# run with python -m app.data.migrations [--check-plans]
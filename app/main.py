@@ -3,6 +3,7 @@
 from pathlib import Path
 import importlib
 import os
+import sqlite3
 import sys
 
 CURRENT_DIR = Path(__file__).resolve().parent
@@ -47,6 +48,13 @@ from app.routes.delivery import (
     delivery_order,
     delivery_profil,
 )
+from app.services.db import close_all_connections
+from app.services.users import pending_orders_sync_task, visit_buffer
+from app.recommendations.interaction_events import interaction_buffer
+from app.services.wallet import reconciliation_task
+from app.recommendations.collaborative import recommendation_task
+from app.recommendations.recommendations import prewarm_task
+from app.recommendations.user_product_matrix import interactions_rebuild_task
 
 
 
@@ -77,13 +85,18 @@ def _load_data_modules():
         f"{package_name}.data.migrate_json_to_sql" if package_name else None,
         "data.migrate_json_to_sql",
     )
-    return create_db_module, migrate_module
+    schema_module = _resolve_module(
+        "app.data.migrations",
+        f"{package_name}.data.migrations" if package_name else None,
+        "data.migrations",
+    )
+    return create_db_module, migrate_module, schema_module
 
 
 def main():
     """Application bootstrap routine used for both script and module execution."""
 
-    create_db_module, migrate_module = _load_data_modules()
+    create_db_module, migrate_module, schema_module = _load_data_modules()
 
     # Initialisation des tables (vides) dans la base de données si elle n'existe pas
     DB_FILE = DATA_DIR / "data.db"
@@ -92,8 +105,6 @@ def main():
 
     if not DB_FILE.exists():
 
-        import sqlite3
-
         init_db = create_db_module.init_db
         migrate_pharmacies = migrate_module.migrate_pharmacies
         migrate_products = migrate_module.migrate_products
@@ -111,6 +122,38 @@ def main():
     else:
         print(f"📂 Base de données trouvées dans {DB_FILE}")
 
+    # Migrations de schéma versionnées (index, tables dérivées), pour les bases neuves comme existantes
+    conn = sqlite3.connect(DB_FILE)
+    schema_module.run_migrations(conn)
+    conn.close()
+
+
+    # Contrôle périodique des wallets : solde == somme du journal (WALLET_RECONCILE_INTERVAL)
+    app.on_startup(reconciliation_task.start)
+    app.on_shutdown(reconciliation_task.stop)
+
+    # Recalcul hors requêtes des recommandations collaboratives (CF_REBUILD_INTERVAL)
+    app.on_startup(recommendation_task.start)
+    app.on_shutdown(recommendation_task.stop)
+
+    # Pré-calcul des recommandations des utilisateurs récemment actifs (RECO_PREWARM_INTERVAL)
+    app.on_startup(prewarm_task.start)
+    app.on_shutdown(prewarm_task.stop)
+
+    # Resynchronisation du tableau des commandes en attente avec les autres workers (ORDER_BOARD_SYNC_INTERVAL)
+    app.on_startup(pending_orders_sync_task.start)
+    app.on_shutdown(pending_orders_sync_task.stop)
+
+    # Reconstruction complète de user_product_interactions (INTERACTIONS_REBUILD_INTERVAL, désactivée par défaut)
+    app.on_startup(interactions_rebuild_task.start)
+    app.on_shutdown(interactions_rebuild_task.stop)
+
+    # À l'arrêt du serveur : écriture des visites et interactions en attente puis fermeture des connexions SQLite partagées
+    app.on_startup(visit_buffer.start)
+    app.on_shutdown(visit_buffer.stop)
+    app.on_startup(interaction_buffer.start)
+    app.on_shutdown(interaction_buffer.stop)
+    app.on_shutdown(close_all_connections)
 
     # Lancement de l'application
     host = os.getenv("APP_HOST", "0.0.0.0")
@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+
+from app.services.db import get_connection, immediate_transaction
+from app.services.periodic import PeriodicTask
+
+
+# === Paramètres ===
+CF_TOP_N = int(os.getenv("CF_TOP_N", "20"))                               # recommandations précalculées par utilisateur
+CF_NEIGHBOURS = int(os.getenv("CF_NEIGHBOURS", "50"))                     # voisins gardés par produit
+CF_MAX_ITEMS_PER_USER = int(os.getenv("CF_MAX_ITEMS_PER_USER", "200"))    # produits d'un utilisateur comptés dans les co-occurrences
+CF_REBUILD_INTERVAL = float(os.getenv("CF_REBUILD_INTERVAL", "21600"))    # secondes entre deux recalculs (0 = désactivé)
+_PAIR_CHUNK = 2_000_000                                                   # paires accumulées avant réduction (borne la mémoire)
+
+
+class InteractionMatrix:
+
+    """
+    Matrice creuse users × produits des scores d'interaction, au format CSR (tableaux NumPy) :
+    les colonnes de la ligne u sont indices[indptr[u]:indptr[u + 1]] et leurs scores data[...].
+    user_ids[u] et product_ids[j] redonnent les identifiants en base. Seules les interactions
+    non nulles sont stockées (pas de pivot dense users × produits).
+    """
+
+    def __init__(self, user_ids: np.ndarray, product_ids: np.ndarray, indptr: np.ndarray, indices: np.ndarray, data: np.ndarray):
+
+        self.user_ids = user_ids
+        self.product_ids = product_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_triplets(cls, users, products, scores) -> "InteractionMatrix":
+
+        """Construit la matrice à partir de triplets (user_id, product_id, score), un par couple."""
+
+        users = np.asarray(users, dtype=np.int64)
+        products = np.asarray(products, dtype=np.int64)
+        scores = np.asarray(scores, dtype=np.float64)
+        keep = scores > 0
+        users, products, scores = users[keep], products[keep], scores[keep]
+
+        user_ids, rows = np.unique(users, return_inverse=True)
+        product_ids, cols = np.unique(products, return_inverse=True)
+        order = np.lexsort((cols, rows))
+
+        indptr = np.zeros(len(user_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=len(user_ids)), out=indptr[1:])
+
+        return cls(user_ids, product_ids, indptr, cols[order], scores[order])
+
+    @property
+    def shape(self) -> tuple[int, int]:
+
+        return len(self.user_ids), len(self.product_ids)
+
+
+def load_interaction_matrix() -> InteractionMatrix:
+
+    """Lit user_product_interactions dans une InteractionMatrix."""
+
+    with get_connection() as conn:
+        rows = conn.execute("SELECT user_id, product_id, score FROM user_product_interactions WHERE score > 0").fetchall()
+
+    if not rows:
+        return InteractionMatrix.from_triplets([], [], [])
+
+    users, products, scores = zip(*rows)
+
+    return InteractionMatrix.from_triplets(users, products, scores)
+
+
+# === Modèle produit-produit (co-occurrences) ===
+def _reduce(keys: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+
+    """Additionne les valeurs de même clé."""
+
+    keys, inverse = np.unique(keys, return_inverse=True)
+
+    return keys, np.bincount(inverse, weights=values)
+
+
+def item_neighbours(matrix: InteractionMatrix, k: int = CF_NEIGHBOURS, max_items_per_user: int = CF_MAX_ITEMS_PER_USER):
+
+    """
+    Similarité cosinus entre colonnes (produits) de la matrice, calculée sur les co-occurrences :
+    chaque utilisateur ajoute w_i * w_j à la paire (i, j) de ses produits (w = log(1 + score), pour
+    qu'un produit visité cent fois ne domine pas). Seuls les `k` meilleurs voisins de chaque produit sont gardés.
+    Retourne les voisins au format CSR : (indptr, indices, scores), triés par score décroissant.
+    """
+
+    n_products = matrix.shape[1]
+    weights = np.log1p(matrix.data)
+    norms = np.sqrt(np.bincount(matrix.indices, weights=weights ** 2, minlength=n_products))
+
+    reduced_keys, reduced_values = [], []
+    chunk_keys, chunk_values, pending = [], [], 0
+
+    for u in range(matrix.shape[0]):
+        start, end = matrix.indptr[u], matrix.indptr[u + 1]
+        if end - start < 2:
+            continue
+        items, w = matrix.indices[start:end], weights[start:end]
+        if len(items) > max_items_per_user:
+            top = np.argpartition(-w, max_items_per_user)[:max_items_per_user]
+            items, w = items[top], w[top]
+
+        m = len(items)
+        left, right = np.repeat(items, m), np.tile(items, m)
+        distinct = left != right
+        chunk_keys.append(left[distinct] * n_products + right[distinct])
+        chunk_values.append(np.outer(w, w).ravel()[distinct])
+        pending += m * (m - 1)
+
+        if pending >= _PAIR_CHUNK:
+            keys, values = _reduce(np.concatenate(chunk_keys), np.concatenate(chunk_values))
+            reduced_keys.append(keys)
+            reduced_values.append(values)
+            chunk_keys, chunk_values, pending = [], [], 0
+
+    reduced_keys.extend(chunk_keys)
+    reduced_values.extend(chunk_values)
+    if not reduced_keys:
+        return np.zeros(n_products + 1, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+
+    keys, values = _reduce(np.concatenate(reduced_keys), np.concatenate(reduced_values))
+    left, right = keys // n_products, keys % n_products
+    similarity = values / (norms[left] * norms[right])
+
+    # Top k par produit : tri par (produit, similarité décroissante) puis rang dans chaque groupe
+    order = np.lexsort((-similarity, left))
+    left, right, similarity = left[order], right[order], similarity[order]
+    group_start = np.searchsorted(left, left, side="left")
+    keep = np.arange(len(left)) - group_start < k
+    left, right, similarity = left[keep], right[keep], similarity[keep]
+
+    indptr = np.zeros(n_products + 1, dtype=np.int64)
+    np.cumsum(np.bincount(left, minlength=n_products), out=indptr[1:])
+
+    return indptr, right, similarity
+
+
+def recommend_all(matrix: InteractionMatrix, neighbours, top_n: int = CF_TOP_N):
+
+    """
+    Pour chaque utilisateur : score(j) = somme sur ses produits i de w_i * sim(i, j), produits déjà vus exclus.
+    Génère (user_id, [product_id, ...], [score, ...]) avec au plus `top_n` produits, du meilleur au moins bon.
+    """
+
+    nb_indptr, nb_indices, nb_scores = neighbours
+    weights = np.log1p(matrix.data)
+
+    for u in range(matrix.shape[0]):
+        start, end = matrix.indptr[u], matrix.indptr[u + 1]
+        items, w = matrix.indices[start:end], weights[start:end]
+
+        # Positions des voisins de tous ses produits, concaténées sans boucle
+        starts, lengths = nb_indptr[items], nb_indptr[items + 1] - nb_indptr[items]
+        total = int(lengths.sum())
+        if not total:
+            continue
+        positions = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths - starts, lengths)
+
+        candidates, scores = _reduce(nb_indices[positions], nb_scores[positions] * np.repeat(w, lengths))
+        unseen = ~np.isin(candidates, items)
+        candidates, scores = candidates[unseen], scores[unseen]
+        if not len(candidates):
+            continue
+
+        best = np.argsort(-scores, kind="stable")[:top_n]
+        yield int(matrix.user_ids[u]), matrix.product_ids[candidates[best]].tolist(), scores[best].tolist()
+
+
+# === Table précalculée ===
+def rebuild_recommendations() -> int:
+
+    """
+    Recalcule hors ligne le modèle et la table user_recommendations (remplacée en une transaction).
+    Retourne le nombre d'utilisateurs ayant des recommandations.
+    """
+
+    matrix = load_interaction_matrix()
+    rows = [
+        (user_id, rank, product_id, score)
+        for user_id, products, scores in recommend_all(matrix, item_neighbours(matrix))
+        for rank, (product_id, score) in enumerate(zip(products, scores))
+    ]
+
+    with immediate_transaction() as conn:
+        conn.execute("DELETE FROM user_recommendations")
+        conn.executemany("INSERT INTO user_recommendations (user_id, rank, product_id, score) VALUES (?, ?, ?, ?)", rows)
+
+    n_users = len({row[0] for row in rows})
+    print(f"✅ Recommandations recalculées : {n_users} utilisateurs, matrice {matrix.shape[0]} × {matrix.shape[1]} "
+          f"({len(matrix.data)} interactions).")
+
+    return n_users
+
+
+USER_RECOMMENDATIONS_SQL = "SELECT product_id, score FROM user_recommendations WHERE user_id = ? ORDER BY rank LIMIT ?"
+
+
+def get_user_recommendations(user_id: int, limit: int = CF_TOP_N) -> list[tuple[int, float]]:
+
+    """Recommandations précalculées d'un utilisateur : [(product_id, score), ...] (liste vide s'il n'en a pas encore)."""
+
+    with get_connection() as conn:
+        return conn.execute(USER_RECOMMENDATIONS_SQL, (user_id, limit)).fetchall()
+
+
+recommendation_task = PeriodicTask(rebuild_recommendations, interval=CF_REBUILD_INTERVAL, name="cf-rebuild")
+
+
+if __name__ == "__main__":
+    rebuild_recommendations()
+
+# run with python -m app.recommendations.collaborative
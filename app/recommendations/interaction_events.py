@@ -0,0 +1,59 @@
+import os
+from typing import Callable
+
+from app.services.db import get_connection
+from app.services.write_buffer import WriteBehindBuffer
+
+
+# === Événements d'interaction (signaux de recommandation) ===
+# Les événements (user, produit, poids) sont additionnés en mémoire par couple puis écrits par lots
+# (un upsert executemany) par un thread de fond : un clic "ajouter au panier" ou une commande
+# n'attend plus une écriture + commit par produit.
+INTERACTION_FLUSH_INTERVAL = float(os.getenv("INTERACTION_FLUSH_INTERVAL", "2"))         # secondes entre deux écritures
+INTERACTION_BUFFER_MAX_SIZE = int(os.getenv("INTERACTION_BUFFER_MAX_SIZE", "500"))       # nb de couples déclenchant une écriture anticipée
+INTERACTION_BUFFER_CAPACITY = int(os.getenv("INTERACTION_BUFFER_CAPACITY", "50000"))     # nb max de couples en attente (au-delà : événement perdu)
+
+
+def _flush_interactions(scores: dict[tuple[int, int], int]):
+
+    """Écrit un lot {(user_id, product_id): poids cumulé} en une seule requête upsert."""
+
+    rows = [(user_id, product_id, score) for (user_id, product_id), score in scores.items()]
+
+    with get_connection() as conn:
+        conn.executemany("""
+            INSERT INTO user_product_interactions (user_id, product_id, score)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id, product_id) DO UPDATE
+            SET score = score + excluded.score
+        """, rows)
+
+
+interaction_buffer = WriteBehindBuffer(
+    _flush_interactions,
+    interval=INTERACTION_FLUSH_INTERVAL,
+    max_size=INTERACTION_BUFFER_MAX_SIZE,
+    capacity=INTERACTION_BUFFER_CAPACITY,
+    name="interactions",
+)
+
+
+# Fonctions appelées avec (user_id, product_id, poids) à chaque événement (ex : cache des recommandations)
+_listeners: list[Callable[[int, int, int], object]] = []
+
+
+def add_interaction_listener(listener: Callable[[int, int, int], object]):
+
+    """Abonne `listener(user_id, product_id, poids)` aux événements d'interaction (appelé dans le thread de l'événement)."""
+
+    _listeners.append(listener)
+
+
+def record_interaction(user_id: int, product_id: int, weight: int) -> bool:
+
+    """Enregistre un événement d'interaction sans attendre la base. Retourne False s'il a été perdu (file pleine)."""
+
+    for listener in _listeners:
+        listener(user_id, product_id, weight)
+
+    return interaction_buffer.add((user_id, product_id), weight)
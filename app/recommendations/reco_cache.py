@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+class RecommendationCache:
+
+    """
+    Cache des recommandations par utilisateur : la liste classée calculée par `compute_fn(user_id)`
+    est gardée `ttl` secondes (au plus `max_users` utilisateurs, les moins récents sont oubliés).
+
+    - get(user_id) sert la liste depuis la mémoire, ou la calcule si elle manque ou a expiré.
+    - note_activity(user_id, weight) cumule les variations de score d'interaction de l'utilisateur ;
+      au-delà de `threshold`, son entrée est invalidée (recalculée au prochain get ou au pré-chauffage).
+    - prewarm() recalcule les entrées manquantes des utilisateurs actifs depuis moins de `active_window` secondes.
+    Les compteurs d'un utilisateur (variation, version) sont oubliés quand il n'est plus ni en cache ni actif.
+    """
+
+    def __init__(self, compute_fn: Callable[[int], list], ttl: float = 600, threshold: float = 5,
+                 max_users: int = 10000, active_window: float = 1800):
+
+        self.compute_fn = compute_fn
+        self.ttl = ttl
+        self.threshold = threshold
+        self.max_users = max_users
+        self.active_window = active_window
+
+        self._entries: OrderedDict[int, tuple[list, float]] = OrderedDict()  # user_id -> (recommandations, fin de validité)
+        self._drift: dict[int, float] = {}                                  # variation de score depuis le dernier calcul
+        self._versions: dict[int, int] = {}                                 # incrémenté à chaque invalidation
+        self._active: OrderedDict[int, float] = OrderedDict()               # user_id -> dernière activité (monotonic)
+        self._computing: dict[int, int] = {}                                # user_id -> nb de calculs en cours
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0, "prewarmed": 0}
+
+    # === Lecture ===
+    def get(self, user_id: int) -> list:
+
+        now = time.monotonic()
+        with self._lock:
+            self._touch(user_id, now)
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                self._stats["hits"] += 1
+                return list(entry[0])
+            self._stats["misses"] += 1
+
+        return list(self._compute(user_id))
+
+    def _compute(self, user_id: int) -> list:
+
+        with self._lock:
+            version = self._versions.get(user_id, 0)
+            self._computing[user_id] = self._computing.get(user_id, 0) + 1  # sa version ne doit pas être oubliée
+
+        try:
+            recommendations = self.compute_fn(user_id)
+        except BaseException:
+            with self._lock:
+                self._done_computing(user_id)
+            raise
+
+        with self._lock:
+            self._done_computing(user_id)
+            if self._versions.get(user_id, 0) == version:  # pas d'activité importante pendant le calcul
+                self._entries[user_id] = (recommendations, time.monotonic() + self.ttl)
+                self._entries.move_to_end(user_id)
+                self._drift.pop(user_id, None)
+                while len(self._entries) > self.max_users:
+                    self._forget(self._entries.popitem(last=False)[0])
+            else:
+                self._forget(user_id)
+
+        return recommendations
+
+    def _done_computing(self, user_id: int):
+
+        remaining = self._computing.pop(user_id) - 1
+        if remaining:
+            self._computing[user_id] = remaining
+
+    # === Invalidation ===
+    def note_activity(self, user_id: int, weight: float):
+
+        """Prend en compte une variation de score d'interaction de l'utilisateur."""
+
+        with self._lock:
+            self._touch(user_id, time.monotonic())
+            drift = self._drift.get(user_id, 0) + abs(weight)
+            if drift < self.threshold:
+                self._drift[user_id] = drift
+                return
+            self._drift.pop(user_id, None)
+            self._invalidate(user_id)
+
+    def invalidate(self, user_id: int | None = None):
+
+        """Oublie les recommandations d'un utilisateur (ou de tous si user_id est None)."""
+
+        with self._lock:
+            for uid in ([user_id] if user_id is not None else list(self._entries)):
+                self._invalidate(uid)
+
+    def _invalidate(self, user_id: int):
+
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        if self._entries.pop(user_id, None) is not None:
+            self._stats["invalidations"] += 1
+        self._forget(user_id)
+
+    def _forget(self, user_id: int):
+
+        """Oublie la variation et la version d'un utilisateur sorti du cache et des actifs (sans calcul en cours)."""
+
+        if user_id not in self._entries and user_id not in self._active and user_id not in self._computing:
+            self._drift.pop(user_id, None)
+            self._versions.pop(user_id, None)
+
+    def _touch(self, user_id: int, now: float):
+
+        self._active[user_id] = now
+        self._active.move_to_end(user_id)
+        while len(self._active) > self.max_users:
+            self._forget(self._active.popitem(last=False)[0])
+
+    # === Pré-chauffage ===
+    def prewarm(self) -> int:
+
+        """Calcule les recommandations manquantes ou expirées des utilisateurs récemment actifs. Retourne leur nombre."""
+
+        now = time.monotonic()
+        with self._lock:
+            while self._active and next(iter(self._active.values())) < now - self.active_window:
+                self._forget(self._active.popitem(last=False)[0])  # inactifs depuis trop longtemps
+            todo = [user_id for user_id in self._active
+                    if user_id not in self._entries or self._entries[user_id][1] <= now + self.ttl / 10]  # bientôt expirée
+
+        for user_id in todo:
+            self._compute(user_id)
+        with self._lock:
+            self._stats["prewarmed"] += len(todo)
+
+        return len(todo)
+
+    def stats(self) -> dict:
+
+        with self._lock:
+            return dict(self._stats, users=len(self._entries))
@@ -1,39 +1,111 @@
+import os
+
+from app.recommendations.collaborative import get_user_recommendations
+from app.recommendations.interaction_events import add_interaction_listener
+from app.recommendations.reco_cache import RecommendationCache
+from app.recommendations.similarity import get_similarity_index
+from app.services.periodic import PeriodicTask
+from app.services.catalog import get_catalog
 from app.services.users import get_visit_history
-from app.services.items import get_connection, get_product
+from app.services.items import get_connection, get_product, get_products
 
 
-def find_similar_products(product_id: int, min_common_tags: int = 2) -> list[dict]:
+def find_similar_products(product_id: int, min_common_tags: int = 2, limit: int | None = None) -> list[dict]:
 
     """
-    Trouver les produits similaires à un produit donné en comparant les tags.
-    Retourne une liste triée par nombre de tags en commun (décroissant).
+    Trouver les produits similaires à un produit donné (tags et composants en commun), depuis l'index
+    précalculé de similarity. Seuls les produits partageant au moins `min_common_tags` tags sont gardés.
+    Retourne une liste triée par score de similarité (décroissant), au plus `limit` produits.
     """
 
-    current = get_product(product_id)
-    if not current:
+    neighbours = [(pid, score) for pid, score, common in get_similarity_index().neighbours(product_id) if common >= min_common_tags]
+    if limit is not None:
+        neighbours = neighbours[:limit]
+    if not neighbours:
         return []
 
-    current_tags = set(current.get("tags", []))
+    products = get_products([product_id] + [pid for pid, _ in neighbours])  # 3 requêtes pour tous les produits affichés
+    current_tags = set(products[product_id]["tags"]) if product_id in products else set()
 
     similar = []
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM products WHERE id != ?", (product_id,))
-        for (pid,) in cursor.fetchall():
-            product = get_product(pid)
-            if not product:
-                continue
-            common = current_tags & set(product.get("tags", []))
-            if len(common) >= min_common_tags:
-                product["common_tags"] = list(common)
-                product["score"] = len(common)
-                similar.append(product)
+    for pid, score in neighbours:
+        product = products.get(pid)
+        if product:
+            product["common_tags"] = list(current_tags & set(product["tags"]))
+            product["score"] = score
+            similar.append(product)
+
+    return similar
+
+
+RECOMMENDATION_STRATEGY = os.getenv("RECOMMENDATION_STRATEGY", "tags")  # "tags" ou "collaborative"
+
+
+def recommend_products(user_id: int, min_common_tags: int = 2, strategy: str | None = None) -> list[dict]:
+
+    """
+    Recommande des produits à un utilisateur, selon `strategy` (RECOMMENDATION_STRATEGY par défaut) :
+    - "tags" : tags des produits visités (recommend_by_tags) ;
+    - "collaborative" : table précalculée par le filtrage collaboratif (app.recommendations.collaborative),
+      avec repli sur les tags pour un utilisateur qui n'y figure pas encore.
+    """
+
+    if (strategy or RECOMMENDATION_STRATEGY) == "collaborative":
+        recommended = recommend_collaborative(user_id)
+        if recommended:
+            return recommended
+
+    return recommend_by_tags(user_id, min_common_tags)
+
+
+# === Cache par utilisateur ===
+RECO_CACHE_TTL = float(os.getenv("RECO_CACHE_TTL", "600"))                     # secondes de validité d'une liste calculée
+RECO_CACHE_THRESHOLD = float(os.getenv("RECO_CACHE_THRESHOLD", "5"))           # variation de score qui invalide la liste (5 = un ajout au panier)
+RECO_CACHE_MAX_USERS = int(os.getenv("RECO_CACHE_MAX_USERS", "10000"))         # utilisateurs gardés en mémoire
+RECO_PREWARM_INTERVAL = float(os.getenv("RECO_PREWARM_INTERVAL", "60"))        # secondes entre deux pré-chauffages (0 = désactivé)
+RECO_ACTIVE_WINDOW = float(os.getenv("RECO_ACTIVE_WINDOW", "1800"))            # un utilisateur est "actif" pendant ce délai après sa dernière activité
+
+recommendation_cache = RecommendationCache(
+    recommend_products,
+    ttl=RECO_CACHE_TTL,
+    threshold=RECO_CACHE_THRESHOLD,
+    max_users=RECO_CACHE_MAX_USERS,
+    active_window=RECO_ACTIVE_WINDOW,
+)
+add_interaction_listener(lambda user_id, product_id, weight: recommendation_cache.note_activity(user_id, weight))
+prewarm_task = PeriodicTask(recommendation_cache.prewarm, interval=RECO_PREWARM_INTERVAL, name="reco-prewarm")
+
+
+def get_recommendations(user_id: int) -> list[dict]:
+
+    """
+    Recommandations de l'utilisateur (recommend_products) servies depuis le cache, recalculées si besoin.
+    Les produits supprimés depuis le calcul sont écartés (comparés à la photo du catalogue).
+    """
+
+    products = get_catalog().products
+
+    return [product for product in recommendation_cache.get(user_id) if product["id"] in products]
+
+
+def recommend_collaborative(user_id: int, limit: int = 5) -> list[dict]:
+
+    """Top `limit` des recommandations précalculées de l'utilisateur (produits déjà vus exclus au calcul)."""
+
+    scores = dict(get_user_recommendations(user_id, limit))
+    products = get_products(list(scores))
+
+    recommended = []
+    for product_id, score in scores.items():
+        product = products.get(product_id)
+        if product:
+            product["score"] = score
+            recommended.append(product)
 
-    # trier par nb de tags en commun
-    return sorted(similar, key=lambda p: p["score"], reverse=True)
+    return recommended
 
 
-def recommend_products(user_id: int, min_common_tags: int = 2) -> list[dict]:
+def recommend_by_tags(user_id: int, min_common_tags: int = 2) -> list[dict]:
 
     """
     Recommande des produits en fonction de l'historique utilisateur et des tags.
@@ -0,0 +1,187 @@
+import heapq
+import math
+import os
+import threading
+from collections import Counter
+from itertools import chain
+
+from app.services.db import get_connection
+
+
+# === Paramètres ===
+SIMILARITY_TOP_K = int(os.getenv("SIMILARITY_TOP_K", "20"))         # voisins gardés par produit
+SIMILARITY_METRIC = os.getenv("SIMILARITY_METRIC", "jaccard")       # "jaccard" ou "cosine"
+
+
+class SimilarityIndex:
+
+    """
+    Index produit-produit précalculé à partir des tags et des composants.
+
+    Chaque produit est une ligne binaire (tags et composants comme colonnes), stockée en listes creuses
+    dans les deux sens : features[produit] = ses colonnes, postings[colonne] = produits qui la portent.
+    Les voisins d'un produit sont les K meilleurs scores (Jaccard ou cosinus) parmi les produits qui
+    partagent au moins une colonne avec lui ; ils sont calculés à la construction, puis recalculés
+    seulement pour les produits touchés par une modification (update_product / remove_product).
+    neighbours(product_id) est une simple lecture : O(K).
+    """
+
+    def __init__(self, tag_rows, component_rows, k: int = SIMILARITY_TOP_K, metric: str = SIMILARITY_METRIC):
+
+        """tag_rows / component_rows : itérables de (product_id, tag) / (product_id, component)."""
+
+        self.k = k
+        self.metric = metric
+
+        self.features: dict[int, frozenset[tuple[str, str]]] = {}
+        self.postings: dict[tuple[str, str], set[int]] = {}
+        self._neighbours: dict[int, tuple[tuple[int, float, int], ...]] = {}
+        self._lock = threading.Lock()  # une mise à jour à la fois (les lectures n'en ont pas besoin)
+
+        features: dict[int, set[tuple[str, str]]] = {}
+        for kind, rows in (("tag", tag_rows), ("component", component_rows)):
+            for product_id, value in rows:
+                if value:
+                    features.setdefault(product_id, set()).add((kind, value.strip().lower()))
+
+        for product_id, product_features in features.items():
+            self._set_features(product_id, frozenset(product_features))
+        for product_id in self.features:
+            self._neighbours[product_id] = self._compute(product_id)
+
+    # === Lecture ===
+    def neighbours(self, product_id: int) -> tuple[tuple[int, float, int], ...]:
+
+        """Voisins de `product_id`, du plus similaire au moins similaire : ((id, score, nb de tags communs), ...)."""
+
+        return self._neighbours.get(product_id, ())
+
+    # === Mises à jour ===
+    def update_product(self, product_id: int, tags, components):
+
+        """Remplace les tags / composants d'un produit et recalcule les voisins des produits concernés."""
+
+        new = frozenset(chain(
+            (("tag", tag.strip().lower()) for tag in tags if tag),
+            (("component", component.strip().lower()) for component in components if component),
+        ))
+
+        with self._lock:
+            old = self.features.get(product_id, frozenset())
+            if new == old:
+                return
+
+            # Produits qui partageaient (ou vont partager) une colonne avec lui : leurs voisins peuvent changer
+            affected = set(chain.from_iterable(self.postings.get(feature, ()) for feature in old | new))
+            self._set_features(product_id, new)
+            affected.update(chain.from_iterable(self.postings.get(feature, ()) for feature in new))
+            affected.add(product_id)
+
+            for other in affected:
+                if other in self.features:
+                    self._neighbours[other] = self._compute(other)
+                else:
+                    self._neighbours.pop(other, None)
+
+    def remove_product(self, product_id: int):
+
+        """Retire un produit supprimé de l'index (et des voisins des autres produits)."""
+
+        self.update_product(product_id, (), ())
+
+    # === Calcul ===
+    def _set_features(self, product_id: int, new: frozenset):
+
+        for feature in self.features.get(product_id, frozenset()) - new:
+            owners = self.postings[feature]
+            owners.discard(product_id)
+            if not owners:
+                del self.postings[feature]
+        for feature in new:
+            self.postings.setdefault(feature, set()).add(product_id)
+
+        if new:
+            self.features[product_id] = new
+        else:
+            self.features.pop(product_id, None)
+
+    def _compute(self, product_id: int) -> tuple[tuple[int, float, int], ...]:
+
+        """Ligne `product_id` du produit A·Aᵀ (colonnes communes), convertie en scores, puis top K."""
+
+        features = self.features[product_id]
+        common = Counter(chain.from_iterable(self.postings[feature] for feature in features))
+        common_tags = Counter(chain.from_iterable(self.postings[feature] for feature in features if feature[0] == "tag"))
+        del common[product_id]
+
+        size = len(features)
+        if self.metric == "cosine":
+            scores = ((other, count / math.sqrt(size * len(self.features[other]))) for other, count in common.items())
+        else:
+            scores = ((other, count / (size + len(self.features[other]) - count)) for other, count in common.items())
+
+        best = heapq.nlargest(self.k, scores, key=lambda item: (item[1], -item[0]))
+
+        return tuple((other, score, common_tags.get(other, 0)) for other, score in best)
+
+
+_index: SimilarityIndex | None = None
+_index_generation = 0  # incrémenté à chaque modification, évite de publier un index construit avant une écriture
+_index_lock = threading.Lock()
+
+
+def build_similarity_index() -> SimilarityIndex:
+
+    """Construit l'index à partir des tables product_tags et product_components."""
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT product_id, tag FROM product_tags")
+        tag_rows = cursor.fetchall()
+        cursor.execute("SELECT product_id, component FROM product_components")
+        component_rows = cursor.fetchall()
+
+    return SimilarityIndex(tag_rows, component_rows)
+
+
+def get_similarity_index() -> SimilarityIndex:
+
+    """Retourne l'index partagé, construit au premier appel."""
+
+    global _index
+
+    index = _index
+    if index is None:
+        with _index_lock:
+            index = _index
+            if index is None:
+                generation = _index_generation
+                index = build_similarity_index()
+                if generation == _index_generation:
+                    _index = index
+
+    return index
+
+
+def refresh_product_similarity(product_id: int):
+
+    """
+    Met à jour un produit dans l'index après une écriture sur ses tags ou ses composants (ou sa suppression).
+    Sans effet si l'index n'est pas encore construit : il lira la base à jour.
+    """
+
+    global _index_generation
+    _index_generation += 1  # un index en cours de construction a pu lire l'ancien état : il ne sera pas publié
+
+    index = _index
+    if index is None:
+        return
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT tag FROM product_tags WHERE product_id = ?", (product_id,))
+        tags = [tag for (tag,) in cursor.fetchall()]
+        cursor.execute("SELECT component FROM product_components WHERE product_id = ?", (product_id,))
+        components = [component for (component,) in cursor.fetchall()]
+
+    index.update_product(product_id, tags, components)
@@ -1,9 +1,13 @@
+import os
 import sqlite3
 import pandas as pd
 from pathlib import Path
 import re
+from typing import Callable
 
-from app.services.users import get_panier
+from app.recommendations.interaction_events import record_interaction
+from app.services.db import get_connection, immediate_transaction
+from app.services.periodic import PeriodicTask
 
 
 DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
@@ -11,10 +15,6 @@ DB_FILE = DATA_DIR / 'data.db'
 NEED_RECREATE = False
 
 
-def get_connection():
-    return sqlite3.connect(DB_FILE)
-
-
 def init_interactions_table():
 
     """Initialise la table des interactions user/product."""
@@ -35,47 +35,77 @@ def init_interactions_table():
     print("✅ Table user_product_interactions initialisée.")
 
 
+PURCHASE_WEIGHT = 5  # poids d'une unité achetée, le même à la commande (checkout) et à la reconstruction
+
+# Sources de la reconstruction : (nom, requête SELECT user_id, product_id, poids)
+# Poids : panier = quantité * 2, visite = 1, achat = quantité * PURCHASE_WEIGHT
+INTERACTION_SOURCES = [
+    # 1. Panier ⚠️ que panier actuelle et non historique, DIFFERENT DU COMPORTEMENT EN RUN
+    ("panier", "SELECT user_id, product_id, quantity * 2 FROM panier"),
+    # 2. Historique navigation : URL de type /product/123 ou /product/123/itinerary (CAST garde le préfixe numérique)
+    ("historique", """
+        SELECT user_id, CAST(substr(page, 10) AS INTEGER), visits
+        FROM user_history
+        WHERE page GLOB '/product/[0-9]*'
+    """),
+    # 3. Achats
+    ("achats", f"SELECT h.user_id, o.product_id, o.qty * {PURCHASE_WEIGHT} FROM orders o JOIN order_headers h ON h.id = o.order_id"),
+]
+INTERACTIONS_REBUILD_INTERVAL = float(os.getenv("INTERACTIONS_REBUILD_INTERVAL", "0"))  # secondes entre deux reconstructions (0 = désactivé)
+
+
 # Attention : n'inclut que les visites et panier actuel pour l'instant
-def populate_interactions_from_db():
+def populate_interactions_from_db(progress: Callable[[str], None] = print) -> int:
 
     """
     Reconstruit entièrement la table user_product_interactions à partir des données actuelles :
     - Panier (poids = quantité * 2)
     - Historique navigation (poids = visites * 1)
-    - Achats (si table 'orders' existe : poids = quantité * 3)
+    - Achats (poids = quantité * PURCHASE_WEIGHT)
+
+    Chaque source est agrégée en une requête INSERT ... SELECT ... GROUP BY dans une table fantôme,
+    qui remplace ensuite l'ancienne (DROP + RENAME), le tout dans une seule transaction : les lecteurs
+    (WAL) voient l'ancienne table jusqu'au commit, puis la nouvelle, jamais une table à moitié remplie.
+    `progress` reçoit un message par étape. Retourne le nombre de couples (user, produit).
     """
 
-    with get_connection() as conn:
+    with immediate_transaction() as conn:
         cur = conn.cursor()
+        cur.execute("DROP TABLE IF EXISTS user_product_interactions_rebuild")
+        cur.execute("""
+            CREATE TABLE user_product_interactions_rebuild (
+                user_id INTEGER NOT NULL,
+                product_id INTEGER NOT NULL,
+                score INTEGER DEFAULT 0,
+                PRIMARY KEY (user_id, product_id),
+                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+                FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
+            )
+        """)
 
-        # ⚠️ On vide la table avant de recalculer
-        cur.execute("DELETE FROM user_product_interactions")
-        print("⚠️  Anciennes données supprimées")
-        conn.commit()
+        for step, (name, query) in enumerate(INTERACTION_SOURCES, start=1):
+            changes = conn.total_changes  # rowcount n'est pas renseigné pour une requête commençant par WITH
+            cur.execute(f"""
+                WITH source(user_id, product_id, weight) AS ({query})
+                INSERT INTO user_product_interactions_rebuild (user_id, product_id, score)
+                SELECT user_id, product_id, SUM(weight)
+                FROM source
+                WHERE true
+                GROUP BY user_id, product_id
+                ON CONFLICT(user_id, product_id) DO UPDATE SET score = score + excluded.score
+            """)
+            progress(f"⏳ {step}/{len(INTERACTION_SOURCES)} {name} : {conn.total_changes - changes} couples (user, produit) écrits")
+
+        count = cur.execute("SELECT COUNT(*) FROM user_product_interactions_rebuild").fetchone()[0]
+        cur.execute("DROP TABLE IF EXISTS user_product_interactions")
+        cur.execute("ALTER TABLE user_product_interactions_rebuild RENAME TO user_product_interactions")
 
-        # 1. Panier ⚠️ que panier actuelle et non historique, DIFFERENT DU COMPORTEMENT EN RUN
-        cur.execute("SELECT user_id, product_id, quantity FROM panier")
-        for user_id, product_id, qty in cur.fetchall():
-            update_interaction(user_id, product_id, qty * 2)
+    progress(f"✅ Table user_product_interactions reconstruite : {count} couples (user, produit).")
 
-        # 2. Historique navigation
-        cur.execute("SELECT user_id, page, visits FROM user_history")
-        for user_id, page, visits in cur.fetchall():
-            # On cherche un product_id dans les URL de type /product/123 ou /product/123/itinerary
-            match = re.match(r"^/product/(\d+)", page)
-            if match:
-                product_id = int(match.group(1))
-                update_interaction(user_id, product_id, visits * 1)
+    return count
 
-        # 3. Achats
-        try:
-            cur.execute("SELECT user_id, product_id, qty FROM orders WHERE product_id != 0")  # product_id 0 exclu car il s'agit des frais de livraison
-            for user_id, product_id, qty in cur.fetchall():
-                update_interaction(user_id, product_id, qty * 3)
-        except sqlite3.OperationalError:
-            print("⚠️  Pas de table 'orders', étape ignorée.")
 
-    print("✅ Table user_product_interactions remplie avec les données actuelles.")
+interactions_rebuild_task = PeriodicTask(populate_interactions_from_db, interval=INTERACTIONS_REBUILD_INTERVAL, name="interactions-rebuild")
 
 
 def update_interaction(user_id: int, product_id: int, qty: int = 1, increment: int = 1):
@@ -83,17 +113,10 @@ def update_interaction(user_id: int, product_id: int, qty: int = 1, increment: i
     """
     Met à jour le score d'interaction pour (user_id, product_id).
     Si le couple n'existe pas encore → il est créé.
+    L'écriture est différée (interaction_events) : l'appel ne touche pas la base.
     """
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO user_product_interactions (user_id, product_id, score)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id, product_id) DO UPDATE
-            SET score = score + excluded.score
-        """, (user_id, product_id, qty * increment))
-        conn.commit()
+    record_interaction(user_id, product_id, qty * increment)
 
 
 def update_with_page(user_id, page):
@@ -106,16 +129,6 @@ def update_with_page(user_id, page):
         update_interaction(user_id, product_id, 1)
 
 
-def update_with_panier(user_id: int):
-
-    """Update les interactions avec l'intégralité du panier de l'utilisateur au moment de la commande."""
-
-    panier = get_panier(user_id)
-    
-    for product_id, qty in panier.items():
-        update_interaction(user_id, product_id, qty, increment = 5)
-
-
 def build_interaction_matrix(db_path: str) -> pd.DataFrame:
 
     """
@@ -123,7 +136,7 @@ def build_interaction_matrix(db_path: str) -> pd.DataFrame:
     Le score est calculé comme suit: 
         - visit = + 1
         - clique d'ajout au panier (n'inclut pas les quantités) = + 5
-        - commande = qty * + 5
+        - commande = qty * PURCHASE_WEIGHT
     Retourne un DataFrame Pandas.
     """
 
@@ -1,12 +1,14 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
 
-from app.services.auth import get_current_user, sessions
+from app.services.user_context import get_user_context
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.users import get_user_info, get_connection
+from app.services.users import get_connection
+from app.services.catalog import refresh_catalog_prices
 from app.services.items import delete_pharmacy
+from app.services.distance import invalidate_pharmacy_index
 from app.translations.translations import t
 
 
@@ -18,14 +20,13 @@ def admin_pharmacies(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    
     # Vérification des droits admin
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         return RedirectResponse('/home')
     
@@ -195,6 +196,7 @@ def admin_pharmacies(request: Request):
                         ))
                         pid = cur.lastrowid
                         conn.commit()
+                        invalidate_pharmacy_index()
 
                         ui.notify(t("pharmacy_added", lang_cookie), color="positive")
                         # Recharge directement en mode edit
@@ -213,6 +215,7 @@ def admin_pharmacies(request: Request):
                             pid,
                         ))
                         conn.commit()
+                        invalidate_pharmacy_index()
 
                         ui.notify(t("pharmacy_updated", lang_cookie), color="positive")
                         load_pharmacies()
@@ -264,6 +267,7 @@ def admin_pharmacies(request: Request):
                                                 WHERE id=?
                                             """, (float(price_input.value), int(qty_input.value), row_id))
                                             conn.commit()
+                                        refresh_catalog_prices()
                                         ui.notify(t("product_updated", lang_cookie), color="positive")
                                     except Exception as e:
                                         print("Error update product:", e)
@@ -278,6 +282,7 @@ def admin_pharmacies(request: Request):
                                             cur = conn.cursor()
                                             cur.execute("DELETE FROM pharmacy_products WHERE id=?", (row_id,))
                                             conn.commit()
+                                        refresh_catalog_prices()
                                         ui.notify(t("product_removed", lang_cookie), color="warning")
                                         load_pharmacy_products()
                                     except Exception as e:
@@ -318,6 +323,7 @@ def admin_pharmacies(request: Request):
                                     VALUES (?, ?, ?, ?)
                                 """, (pid, product_select.value, float(price_input_new.value or 0), int(qty_input_new.value or 0)))
                                 conn.commit()
+                            refresh_catalog_prices()
                             ui.notify(t("product_added_or_updated", lang_cookie), color="positive")
                             load_pharmacy_products()
                         except Exception as e:
@@ -1,14 +1,16 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 import os
 from pathlib import Path
 from fastapi import Request
 
-from app.services.auth import get_current_user, sessions
+from app.services.user_context import get_user_context
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.users import get_user_info, get_connection
+from app.services.users import get_connection
 from app.services.items import delete_product
+from app.recommendations.similarity import refresh_product_similarity
+from app.services.catalog import invalidate_catalog
 from app.translations.translations import t
 
 IMAGES_DIR = Path("data/images")
@@ -23,14 +25,13 @@ def admin_products(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    
     # Vérification des droits admin
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         return RedirectResponse('/home')
     
@@ -258,6 +259,8 @@ def admin_products(request: Request):
                                 cur = conn.cursor()
                                 cur.execute("INSERT INTO product_components (product_id, component) VALUES (?, ?)", (pid, comp_input.value.strip()))
                                 conn.commit()
+                            invalidate_catalog()
+                            refresh_product_similarity(pid)
                             ui.notify(t("component_added", lang_cookie), color="positive")
                             dialog.close()
                             load_components()
@@ -277,6 +280,8 @@ def admin_products(request: Request):
                         cur = conn.cursor()
                         cur.execute("DELETE FROM product_components WHERE id = ?", (cid,))
                         conn.commit()
+                    invalidate_catalog()
+                    refresh_product_similarity(pid)
                     ui.notify(t("component_deleted", lang_cookie), color="warning")
                     load_components()
 
@@ -314,6 +319,8 @@ def admin_products(request: Request):
                                 cur = conn.cursor()
                                 cur.execute("INSERT INTO product_tags (product_id, tag) VALUES (?, ?)", (pid, tag_input.value.strip()))
                                 conn.commit()
+                            invalidate_catalog()
+                            refresh_product_similarity(pid)
                             ui.notify(t("tag_added", lang_cookie), color="positive")
                             dialog.close()
                             load_tags()
@@ -333,6 +340,8 @@ def admin_products(request: Request):
                         cur = conn.cursor()
                         cur.execute("DELETE FROM product_tags WHERE id = ?", (tid,))
                         conn.commit()
+                    invalidate_catalog()
+                    refresh_product_similarity(pid)
                     ui.notify(t("tag_deleted", lang_cookie), color="warning")
                     load_tags()
 
@@ -389,6 +398,7 @@ def admin_products(request: Request):
                             int(ordonnance.value),
                         ))
                         conn.commit()
+                    invalidate_catalog()
                     ui.notify(t("product_added", lang_cookie), color="positive")
 
                 else:  # mode edit
@@ -414,6 +424,7 @@ def admin_products(request: Request):
                             pid,
                         ))
                         conn.commit()
+                    invalidate_catalog()
                     ui.notify(t("product_updated", lang_cookie), color="positive")
 
                 load_products()
@@ -1,12 +1,13 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 import datetime
 from fastapi import Request
 
-from app.services.auth import get_current_user, sessions
+from app.services.user_context import get_user_context
+from app.recommendations.interaction_events import interaction_buffer
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.users import get_user_info, get_connection
+from app.services.users import get_connection, claim_metrics, CLAIMED, ALREADY_TAKEN, OVER_CAPACITY
 from app.services.settings import get_setting, set_setting
 from app.translations.translations import t
 
@@ -19,14 +20,13 @@ def admin_settings(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    
     # Vérification des droits admin
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         return RedirectResponse('/home')
     
@@ -141,9 +141,10 @@ def admin_settings(request: Request):
 
                     # Récupération des ventes par jour
                     cur.execute("""
-                        SELECT date(o.date) as day, SUM(o.qty) as total_sales
+                        SELECT date(h.date) as day, SUM(o.qty) as total_sales
                         FROM orders o
-                        WHERE date(o.date) >= ?
+                        JOIN order_headers h ON h.id = o.order_id
+                        WHERE h.date >= ?
                         GROUP BY day
                         ORDER BY day ASC
                     """, (start_date,))
@@ -225,6 +226,43 @@ def admin_settings(request: Request):
             ).classes("w-full h-64")
 
 
+        # === Prises en charge des commandes par les livreurs ===
+        with ui.card().classes("w-full max-w-6xl mx-auto p-6 bg-white shadow-md rounded-xl"):
+            ui.label(t("order_claims", lang_cookie)).classes("text-xl font-semibold mb-4")
+
+            claims = claim_metrics.snapshot()  # depuis le démarrage de l'application
+            latency = lambda ms: f"{ms:.2f} ms" if ms is not None else "—"
+
+            with ui.row().classes("w-full gap-6 flex-wrap justify-center"):
+                for label, value in [
+                    (t("claims_claimed", lang_cookie), claims["counts"].get(CLAIMED, 0)),
+                    (t("claims_conflicts", lang_cookie), claims["counts"].get(ALREADY_TAKEN, 0)),
+                    (t("claims_over_capacity", lang_cookie), claims["counts"].get(OVER_CAPACITY, 0)),
+                    (t("claim_latency_p50", lang_cookie), latency(claims["p50_ms"])),
+                    (t("claim_latency_p95", lang_cookie), latency(claims["p95_ms"])),
+                ]:
+                    with ui.card().classes("p-4 w-44 text-center bg-white shadow-sm rounded-xl"):
+                        ui.label(f"{value}").classes("text-2xl font-bold")
+                        ui.label(label).classes("text-gray-600 text-sm")
+
+        # === File des événements d'interaction (signaux de recommandation) ===
+        with ui.card().classes("w-full max-w-6xl mx-auto p-6 bg-white shadow-md rounded-xl"):
+            ui.label(t("interaction_events", lang_cookie)).classes("text-xl font-semibold mb-4")
+
+            events = interaction_buffer.stats()  # depuis le démarrage de l'application
+
+            with ui.row().classes("w-full gap-6 flex-wrap justify-center"):
+                for label, value in [
+                    (t("events_received", lang_cookie), events["added"]),
+                    (t("events_pending", lang_cookie), events["pending"]),
+                    (t("events_written", lang_cookie), events["flushed_keys"]),
+                    (t("events_backpressure", lang_cookie), events["backpressure"]),
+                    (t("events_dropped", lang_cookie), events["dropped"]),
+                ]:
+                    with ui.card().classes("p-4 w-44 text-center bg-white shadow-sm rounded-xl"):
+                        ui.label(f"{value}").classes("text-2xl font-bold")
+                        ui.label(label).classes("text-gray-600 text-sm")
+
         # === Paramètres administratifs ===
         with ui.card().classes("w-full p-6 bg-white shadow-md rounded-xl"):
             ui.label(t("site_settings", lang_cookie)).classes("text-xl font-semibold mb-4")
@@ -1,11 +1,10 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
 
-from app.services.auth import get_current_user, sessions
+from app.services.user_context import get_user_context
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.users import get_user_info
 from app.translations.translations import t
 
 
@@ -15,18 +14,13 @@ def admin_panel(request: Request):
     """Page d'administration pour les utilisateurs avec les droits admin."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    # user_id = get_current_user(request)
-    # if not user_id:
-    #     return RedirectResponse('/')
-    
     # Vérification des droits admin
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         return RedirectResponse('/home')
     
@@ -1,4 +1,4 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi import Request
 from fastapi.responses import RedirectResponse
 from datetime import datetime
@@ -6,9 +6,8 @@ import asyncio
 
 from app.components.theme import apply_background
 from app.components.navbar_delivery import navbar_delivery
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, get_all_pending_order, get_orders_for_delivery_person
-from app.services.distance import haversine_dist
+from app.services.user_context import get_user_context
+from app.services.users import get_all_pending_order, get_orders_for_delivery_person, pending_orders
 from app.translations.translations import t
 
 
@@ -18,15 +17,12 @@ async def delivery_home_page(request: Request):
     """Page d'accueil pour les livreurs — affichage des commandes à prendre."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
-        return RedirectResponse('/')
-
-    token = app.storage.browser.get('token')
-    user_id = sessions.get(token)
+    context = get_user_context(request)
+    user_id = context["user_id"]
     if not user_id:
         return RedirectResponse('/')
 
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         if not user_info.get('is_confirmed', False) or not user_info.get('is_delivery_person', False):
             return RedirectResponse('/')
@@ -35,6 +31,7 @@ async def delivery_home_page(request: Request):
     apply_background()
     navbar_delivery(request)
     lang_cookie = request.cookies.get("language", "fr")
+    distance_cookie = float(request.cookies.get("max_distance", "10"))
 
     # === Barre de titre ===
     with ui.column().classes("w-full items-center text-center py-8 px-4 fade-in hero"):
@@ -43,6 +40,10 @@ async def delivery_home_page(request: Request):
 
         with ui.row().classes("justify-center gap-4 mb-6"):
             ui.button(t("refresh", lang_cookie), on_click=lambda: refresh_orders.refresh()).props("flat").classes("btn-refresh")
+            ui.toggle(
+                {"date": t("sort_by_date", lang_cookie), "distance": t("sort_by_distance", lang_cookie)},
+                value="date", on_change=lambda e: change_sort(e.value)
+            ).props("flat")
             with ui.button(
                 t("my_deliveries", lang_cookie),
                 on_click=lambda: ui.navigate.to(f"/delivery/my?lat={user_position['lat']}&lng={user_position['lng']}")
@@ -60,6 +61,7 @@ async def delivery_home_page(request: Request):
         def __init__(self):
             self.current_page = 0
             self.items_per_page = 6
+            self.sort_by = "date"  # "date" (récentes d'abord) ou "distance" (plus proches d'abord)
 
     state = PaginationState()
 
@@ -73,9 +75,12 @@ async def delivery_home_page(request: Request):
     # === Fonction : charger commandes de manière asynchrone ===
     async def load_orders():
 
-        """Charge les commandes sans bloquer la boucle principale."""
+        """Commandes filtrées (max_distance du cookie) et triées côté serveur, sans bloquer la boucle principale
+        (le tableau en mémoire n'est lu en base qu'au premier accès)."""
 
-        return await asyncio.to_thread(get_all_pending_order)
+        return await asyncio.to_thread(
+            get_all_pending_order, user_position["lat"], user_position["lng"], distance_cookie, state.sort_by
+        )
 
     # === Fonction : géolocalisation asynchrone ===
     async def use_current_location():
@@ -114,6 +119,12 @@ async def delivery_home_page(request: Request):
         state.current_page = max(0, state.current_page + delta)
         refresh_orders.refresh()
 
+    def change_sort(sort_by: str):
+
+        state.sort_by = sort_by
+        state.current_page = 0
+        refresh_orders.refresh()
+
     # === Réservation commande ===
     def reserve_order(order_id: int):
 
@@ -139,15 +150,11 @@ async def delivery_home_page(request: Request):
             return
 
         total_pages = max(1, (len(available_orders) + state.items_per_page - 1) // state.items_per_page)
+        state.current_page = min(state.current_page, total_pages - 1)  # la page courante a pu se vider entre deux mises à jour
         start = state.current_page * state.items_per_page
         end = start + state.items_per_page
         paginated_orders = available_orders[start:end]
 
-        user_lat, user_lng = user_position["lat"], user_position["lng"]
-        if user_lat and user_lng:
-            for order in paginated_orders:
-                order["distance"] = haversine_dist(user_lat, user_lng, order["lat"], order["lng"])
-
         with orders_container:
             for order in paginated_orders:
 
@@ -196,6 +203,28 @@ async def delivery_home_page(request: Request):
 
         loading_spinner.classes(add="hidden")
 
+    # === Mises à jour poussées par le tableau des commandes en attente ===
+    # Le tableau prévient dans le thread qui l'a modifié : on repasse par la boucle de NiceGUI,
+    # et une rafale de changements ne donne qu'un seul rafraîchissement (envoyé par le websocket).
+    loop = asyncio.get_running_loop()
+    push = {"scheduled": False}
+
+    def push_refresh():
+
+        push["scheduled"] = False
+        if orders_container.is_deleted:  # page fermée : plus rien à mettre à jour
+            unsubscribe()
+            return
+        refresh_orders.refresh()
+
+    def on_board_change():
+
+        if not push["scheduled"]:
+            push["scheduled"] = True
+            loop.call_soon_threadsafe(push_refresh)
+
+    unsubscribe = pending_orders.subscribe(on_board_change)
+
     # === Affichage initial ===
     await refresh_orders()
 
@@ -5,10 +5,10 @@ import json
 
 from app.components.theme import apply_background
 from app.components.navbar_delivery import navbar_delivery
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, get_orders_for_delivery_person, cancel_order_delivery, get_order_details
+from app.services.user_context import get_user_context
+from app.services.users import get_orders_for_delivery_person, cancel_order_delivery
 from app.services.items import get_pharmacy
-from app.services.distance import optimize_route
+from app.services.delivery_planner import plan_deliveries
 from app.translations.translations import t
 
 from app.services.file_io import load_yaml
@@ -22,13 +22,12 @@ def delivery_order_page(request: Request):
     """ Page de gestion d'une commande réservée."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         if not user_info.get('is_confirmed', False) or not user_info.get('is_delivery_person', False):  # utilisateur non confirmé ou non livreur
             return RedirectResponse('/')
@@ -57,15 +56,6 @@ def delivery_order_page(request: Request):
         user_lat = float(params.get('lat'))
         user_lng = float(params.get('lng'))
 
-        # Initialisation si elle n'existe pas encore
-        if not hasattr(ui.state, "current_order"):
-            ui.state.current_order = in_progress_orders[0]["order_id"] if in_progress_orders else None
-
-        # Fonction pour mettre à jour
-        def update_current_order(order_id):
-            ui.state.current_order = order_id
-            ui.navigate.reload()  # recharge l'UI avec la nouvelle valeur
-
         with ui.row().classes('w-full lg:grid lg:grid-cols-12 gap-6 mt-6'):
 
             # === Colonne gauche : card commande ===
@@ -73,10 +63,7 @@ def delivery_order_page(request: Request):
                 for order in in_progress_orders:
                     order_id = order['order_id']
                     with ui.card().classes("w-full mt-4 hover:bg-gray-100 transition-colors duration-200"):
-                        clickable_zone = ui.element("div") \
-                            .classes("w-full cursor-pointer p-2 hover:bg-gray-50 rounded-lg transition-colors duration-150") \
-                            .on('click', lambda e, oid=order_id: update_current_order(oid))
-                        with clickable_zone:
+                        with ui.element("div").classes("w-full p-2 rounded-lg"):
                             ui.label(f"{t('commande_num', lang_cookie)}{order_id}").classes("font-bold")
                             ui.label(f"{t('client_name', lang_cookie)}{order['customer']}")
                             ui.label(f"{t('delivery_address', lang_cookie)}{order['address']}")
@@ -125,30 +112,33 @@ def delivery_order_page(request: Request):
             # === Colonne droite : itinéraire ===
             with ui.column().classes('w-full lg:col-span-8'):
 
-                order_details = get_order_details(ui.state.current_order)
-                
-                # === Récupération des pharmacies de la commande ===
-                items = order_details['items']
-                pharmacy_ids = []
-                for item in items:
-                    pharmacy_ids.append(item['pharmacy_id'])
-                pharmacy_ids = set(pharmacy_ids)
-
-                pharmacies = [
-                    {
-                        "name": get_pharmacy(pid)["name"],
-                        "lat": get_pharmacy(pid)["coords"]["lat"],
-                        "lng": get_pharmacy(pid)["coords"]["lng"]
-                    }
-                    for pid in pharmacy_ids
-                ]
+                # === Tournée groupée : toutes les commandes en cours, chaque ramassage avant sa livraison ===
+                plan = plan_deliveries(user_lat, user_lng, in_progress_orders)
 
-                if not pharmacies:
+                if not plan["stops"]:
                     ui.label(t("no_pharmacies_order", lang_cookie)).classes('text-red-500')
                     return
 
-                # === Réordonner l'ordre de visite pour minimiser la distance ===
-                pharmacies_ordered = optimize_route(user_lat, user_lng, pharmacies, order_details['lat'], order_details['lng'])
+                ui.label(f"{t('delivery_tour', lang_cookie)}{plan['distance_km']:.1f}{t('km', lang_cookie)}").classes("text-lg font-bold")
+                with ui.column().classes("w-full gap-1 mb-2"):
+                    for step, stop in enumerate(plan["stops"], start=1):
+                        orders_label = ", ".join(f"#{oid}" for oid in stop["order_ids"])
+                        if stop["type"] == "pickup":
+                            ui.label(f"{step}. 💊 {t('pickup', lang_cookie)}{stop['name']} ({orders_label})").classes("text-sm text-gray-700")
+                        else:
+                            ui.label(f"{step}. 📦 {t('dropoff', lang_cookie)}{stop['name']} — {stop['address']} ({orders_label})").classes("text-sm text-gray-700")
+
+                # Étapes affichées sur la carte, dans l'ordre de la tournée
+                pharmacies_ordered = [
+                    {
+                        "name": f"{'💊' if stop['type'] == 'pickup' else '📦'} {stop['name']}",
+                        "lat": stop["lat"],
+                        "lng": stop["lng"],
+                    }
+                    for stop in plan["stops"]
+                ]
+                # Noms saisis par les clients : JSON sans "<", ">" ni "/" littéraux pour ne pas fermer la balise <script>
+                stops_json = json.dumps(pharmacies_ordered).replace("<", "\\u003c").replace(">", "\\u003e").replace("/", "\\/")
 
                 # === Affichage de la carte interactive ===
                 with ui.element('div').props('id=map-container').classes('w-full').style(
@@ -221,10 +211,10 @@ def delivery_order_page(request: Request):
                             crossOrigin: true
                         }}).addTo(map);
 
-                        // --- Marqueurs pharmacies
-                        var pharmacies = {json.dumps(pharmacies_ordered)};
+                        // --- Marqueurs des étapes (pharmacies et clients)
+                        var pharmacies = {stops_json};
                         pharmacies.forEach(function(ph) {{
-                            L.marker([ph.lat, ph.lng]).addTo(map).bindPopup("💊 " + ph.name);
+                            L.marker([ph.lat, ph.lng]).addTo(map).bindPopup(document.createTextNode(ph.name));  // texte, jamais du HTML
                         }});
 
                         // --- Marqueur départ
@@ -5,8 +5,8 @@ import json
 
 from app.components.theme import apply_background
 from app.components.navbar_delivery import navbar_delivery
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, get_order_details, take_order, get_orders_for_delivery_person
+from app.services.user_context import get_user_context
+from app.services.users import get_order_details, claim_order, get_orders_for_delivery_person, CLAIMED, OVER_CAPACITY
 from app.services.items import get_pharmacy, get_product
 from app.services.distance import optimize_route
 from app.services.settings import get_setting
@@ -19,13 +19,12 @@ def delivery_order_page(request: Request, order_id: int):
     """ Page de gestion d'une commande réservée."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         if not user_info.get('is_confirmed', False) or not user_info.get('is_delivery_person', False):  # utilisateur non confirmé ou non livreur
             return RedirectResponse('/')
@@ -84,10 +83,13 @@ def delivery_order_page(request: Request, order_id: int):
 
                     max_order = int(get_setting('max_order_delivery', 2))
 
-                    if take_order(order_id, delivery_person_id=user_id, max_order=max_order):
+                    outcome = claim_order(order_id, delivery_person_id=user_id, max_order=max_order)
+                    if outcome == CLAIMED:
                         ui.notify(t("delivery_confirmed", lang_cookie), color="green")
-                    else:
+                    elif outcome == OVER_CAPACITY:
                         ui.notify(t("error_confirming_delivery", lang_cookie), color="red")
+                    else:
+                        ui.notify(t("order_already_taken", lang_cookie), color="red")
 
                 ui.button(t("confirm_delivery", lang_cookie), on_click=confirm_delivery) \
                     .classes("btn-primary w-full mt-4")
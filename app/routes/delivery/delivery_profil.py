@@ -1,11 +1,11 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi import Request
 from fastapi.responses import RedirectResponse
 
 from app.components.theme import apply_background
 from app.components.navbar_delivery import navbar_delivery
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, update_user, get_orders_for_delivery_person
+from app.services.user_context import get_user_context
+from app.services.users import update_user, get_orders_for_delivery_person
 from app.security.passwords import hash_password
 from app.translations.translations import t
 
@@ -16,13 +16,12 @@ def delivery_profil(request: Request):
     """ Page de profil du livreur."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_admin', False):
         if not user_info.get('is_confirmed', False) or not user_info.get('is_delivery_person', False):  # utilisateur non confirmé ou non livreur
             return RedirectResponse('/')
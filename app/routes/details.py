@@ -1,13 +1,14 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 from datetime import datetime
 from fastapi import Request
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
+from app.services.auth import get_current_user
+from app.services.user_context import get_user_context
 from app.services.reviews import get_average_rating, get_review_infos
-from app.services.users import record_visit, add_panier_item, get_connection, get_user_from_id, get_user_info
+from app.services.users import record_visit, add_panier_item, get_connection, get_user_from_id
 from app.services.items import get_tag_color, get_product, get_min_price_for_product
 from app.recommendations.recommendations import find_similar_products
 from app.recommendations.user_product_matrix import update_interaction, update_with_page
@@ -30,13 +31,12 @@ def product_detail(product_id: str, request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -391,7 +391,7 @@ def product_detail(product_id: str, request: Request):
                 with ui.card().classes('main-product-card w-full fade-in max-h-[80vh] overflow-y-auto').style("background-color: #EDE9FE"):
                     ui.label(t("similar_products", lang_cookie)).classes('text-xl font-bold mb-4')
 
-                    similar_products = find_similar_products(product['id'], min_common_tags=2)
+                    similar_products = find_similar_products(product['id'], min_common_tags=2, limit=3)
                     if similar_products:
                         for sp in similar_products[:3]:
                             with ui.card().classes(
@@ -1,15 +1,15 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 import random
 from fastapi import Request
 
 from app.components.theme import apply_background
 from app.components.navbar import navbar
-from app.services.auth import get_current_user, sessions
-from app.services.items import get_tag_color, search_filter_product, get_min_price_for_product, get_filter_options, count_products_in_price_range
+from app.services.user_context import get_user_context
+from app.services.items import get_tag_color, search_filter_product, get_min_prices, get_filter_options, count_products_by_price_range
 from app.services.reviews import get_average_rating, get_number_of_reviews
-from app.services.users import record_visit, add_panier_item, get_user_info
-from app.recommendations.recommendations import recommend_products
+from app.services.users import record_visit, add_panier_item
+from app.recommendations.recommendations import get_recommendations
 from app.recommendations.user_product_matrix import update_interaction
 from app.translations.translations import t
 
@@ -29,19 +29,12 @@ def home_page(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    # user_id = get_current_user(request)
-    # if not user_id:
-    #     print(request.cookies.get("session_token"))
-    #     print(sessions)
-    #     return RedirectResponse('/')
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
     
@@ -72,7 +65,7 @@ def home_page(request: Request):
 
         """Fonction de proposition de recommandation (aléatoire parmi les recommandations)"""
 
-        recommended_list = recommend_products(get_current_user())
+        recommended_list = get_recommendations(user_id)  # depuis le cache (recalculé après une activité importante)
         if not recommended_list:
             ui.notify(t("no_reco", lang_cookie), color='red')
             return
@@ -230,8 +223,9 @@ def home_page(request: Request):
                             # Prix
                             with ui.expansion(t("search_price", lang_cookie), value=expanded_state[3]).classes("font-semibold"):
                                 price_ranges = [("0-5", 0, 5), ("5-10", 5, 10), ("10-20", 10, 20), ("20+", 20, 1e6)]
+                                price_counts = count_products_by_price_range([(mn, mx) for _, mn, mx in price_ranges])
                                 for label, mn, mx in price_ranges:
-                                    count = count_products_in_price_range(mn, mx)
+                                    count = price_counts[(mn, mx)]
                                     ui.checkbox(
                                         f"{label} € ({count})",
                                         value=(mn, mx) in selected_filters["prices"],
@@ -292,7 +286,8 @@ def home_page(request: Request):
         # Pré-calcul des notes, reviews et prix pour accélérer
         ratings_cache = {p['id']: get_average_rating(p["id"]) for p in filtered_products}
         reviews_cache = {p['id']: get_number_of_reviews(p["id"]) for p in filtered_products}
-        prices_cache = {p['id']: get_min_price_for_product(p["id"]) for p in filtered_products}
+        min_prices = get_min_prices()
+        prices_cache = {p['id']: min_prices.get(p["id"]) for p in filtered_products}
 
         filtered_products.sort(
             key=lambda p: (
@@ -5,8 +5,8 @@ import json
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
-from app.services.users import record_visit, get_user_info, get_orders_for_customer, get_order_details
+from app.services.user_context import get_user_context
+from app.services.users import record_visit, get_orders_for_customer, get_order_details
 from app.services.items import get_pharmacy
 from app.services.distance import optimize_route
 from app.translations.translations import t
@@ -19,13 +19,12 @@ def orders_in_progress(request: Request):
 
     # === Setup initial ===
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
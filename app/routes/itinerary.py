@@ -1,34 +1,34 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
-import requests
 from urllib.parse import unquote
 import json
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
-from app.services.users import record_visit, get_user_info
-from app.services.distance import haversine_dist
-from app.services.items import get_product, get_pharmacies_with_product, get_pharmacy
+from app.services.user_context import get_user_context
+from app.services.users import record_visit
+from app.services.distance import get_pharmacy_index
+from app.services.geocoding import geocode_async
+from app.services.routing import best_route_async
+from app.services.items import get_product, get_pharmacies_with_product
 from app.translations.translations import t
 
 
 @ui.page('/product/{product_id}/itinerary')
-def product_itinerary(request: Request, product_id: str):
+async def product_itinerary(request: Request, product_id: str):
 
     """Page affichant l'itinéraire optimisé vers la pharmacie la plus proche pour un produit donné."""
 
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -67,20 +67,14 @@ def product_itinerary(request: Request, product_id: str):
     if address and not lat and not lng:
         address = unquote(address)
         try:
-            geo_resp = requests.get(
-                "https://nominatim.openstreetmap.org/search",   # Recherche des coordonnées pour cette adresse sur openstreetmap
-                params={"q": address, "format": "json", "limit": 1},
-                headers={"User-Agent": "AppPrototype"}
-            )
-            geo_data = geo_resp.json()
-            if geo_data:
-                lat = float(geo_data[0]['lat'])
-                lng = float(geo_data[0]['lon'])
+            coords = await geocode_async(address)   # cache local puis géocodeur (openstreetmap par défaut), sans bloquer la boucle
+            if coords:
+                lat, lng = coords
             else:
                 ui.label(t("no_addr_found", lang_cookie)).classes('text-red-500 text-lg italic')
                 return
         except Exception as e:
-            ui.label(f"{'error_geocoding', lang_cookie}{e}").classes('text-red-500')
+            ui.label(f"{t('error_geocoding', lang_cookie)}{e!r}").classes('text-red-500')
             return
 
     if not lat or not lng:
@@ -92,26 +86,27 @@ def product_itinerary(request: Request, product_id: str):
     lng = float(lng)
 
 
-    # === Trouver les pharmacies avec le produit ===
-    pharmacy_ids = get_pharmacies_with_product(int(product_id))
+    # === Trouver les pharmacies avec le produit, à moins de max_distance km (cookie) ===
+    pharmacy_ids = {pharmacie['id'] for pharmacie in get_pharmacies_with_product(int(product_id))}
+
+    if not pharmacy_ids:
+        ui.label(t("no_pharmacies", lang_cookie)).classes('text-red-500')
+        return
+
+    # Recherche dans l'index spatial : triées par distance croissante
+    pharmacies_in_range = get_pharmacy_index().within_radius(lat, lng, distance_cookie, pharmacy_ids)
 
     pharmacies_with_product = [
-        {
-            "name": get_pharmacy(pharmacie['id'])["name"],
-            "lat": get_pharmacy(pharmacie['id'])["coords"]["lat"],
-            "lng": get_pharmacy(pharmacie['id'])["coords"]["lng"]
-        }
-        for pharmacie in pharmacy_ids
+        {"name": pharmacie["name"], "lat": pharmacie["lat"], "lng": pharmacie["lng"]}
+        for pharmacie in pharmacies_in_range
     ]
 
     if not pharmacies_with_product:
-        ui.label(t("no_pharmacies", lang_cookie)).classes('text-red-500')
+        ui.label(f"{t('no_pharmacies_in_range', lang_cookie)}{distance_cookie:g}{t('km', lang_cookie)}").classes('text-red-500')
         return
-    
-    pharmacies_sorted = sorted(
-        pharmacies_with_product,
-        key=lambda ph: haversine_dist(lat, lng, ph["lat"], ph["lng"])
-    )[:3]  # Limiter aux 3 pharmacies les plus proches pour éviter trop de calculs
+
+    # Candidates pour le routage : les 3 plus proches à vol d'oiseau, départagées côté serveur au temps de trajet
+    candidates = pharmacies_in_range[:3]
 
 
     # === Conteneur carte + overlay ===
@@ -161,21 +156,22 @@ def product_itinerary(request: Request, product_id: str):
     """)
 
 
-    # === Charger Leaflet et Routing Machine ===
+    # === Charger Leaflet ===
     ui.add_head_html("""
         <link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css" />
-        <link rel="stylesheet" href="https://unpkg.com/leaflet-routing-machine@3.2.12/dist/leaflet-routing-machine.css" />
         <script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script>
-        <script src="https://unpkg.com/leaflet-routing-machine@3.2.12/dist/leaflet-routing-machine.js"></script>
     """)
 
+    route_label = ui.label().classes('text-lg font-semibold text-center mt-2')
+
 
-    #  === Script JS : calcule le trajet le plus rapide ===
+    #  === Script JS : carte et marqueurs (l'itinéraire est calculé côté serveur) ===
     starting_point_message = t("starting_point", lang_cookie)
 
     ui.run_javascript(f"""
         setTimeout(function() {{
             var map = L.map('map').setView([{lat}, {lng}], 14);
+            window.itineraryMap = map;
 
             L.tileLayer('https://{{s}}.tile.openstreetmap.org/{{z}}/{{x}}/{{y}}.png', {{
                 maxZoom: 19,
@@ -184,9 +180,6 @@ def product_itinerary(request: Request, product_id: str):
             }}).addTo(map);
 
             var pharmacies = {json.dumps(pharmacies_with_product)};
-            var pharmacies_search = {json.dumps(pharmacies_sorted)};
-            var shortestTime = Infinity;
-            var bestRoute = null;
 
             // Marqueurs pharmacies
             pharmacies.forEach(function(ph) {{
@@ -195,80 +188,37 @@ def product_itinerary(request: Request, product_id: str):
 
             // Marqueur départ
             L.marker([{lat}, {lng}]).addTo(map).bindPopup("{starting_point_message}").openPopup();
+        }}, 500);
+        """)
+
 
-            var overlay = document.getElementById("loading-overlay");
-            if (overlay) overlay.style.display = "flex";
+    # === Itinéraire vers la pharmacie la plus rapide (un seul appel matriciel au service de routage) ===
+    async def draw_best_route():
 
-            // Sécurité : timeout pour ne pas spinner indéfiniment (10s)
-            var spinnerTimeout = setTimeout(function() {{
-                console.warn("⏱️ Timeout itinéraire atteint — arrêt du spinner");
+        """Calcule l'itinéraire côté serveur puis envoie uniquement son tracé au navigateur."""
+
+        route = await best_route_async((lat, lng), candidates)
+
+        if route is None:
+            route_label.set_text(t("no_route_found", lang_cookie))
+            ui.run_javascript("var overlay = document.getElementById('loading-overlay'); if (overlay) overlay.style.display = 'none';")
+            return
+
+        minutes = route["duration"] / 60
+        route_label.set_text(
+            f"💊 {route['pharmacy']['name']} — {route['distance'] / 1000:.1f}{t('km', lang_cookie)}, {minutes:.0f}{t('mins', lang_cookie)}"
+        )
+        ui.run_javascript(f"""
+            (function drawRoute() {{
+                var map = window.itineraryMap;
+                if (!map) {{ setTimeout(drawRoute, 100); return; }}  // la carte n'est pas encore créée
+
+                var line = L.polyline({json.dumps(route["geometry"])}, {{color: '#3388ff', weight: 5}}).addTo(map);
+                map.fitBounds(line.getBounds(), {{padding: [30, 30]}});
+
+                var overlay = document.getElementById("loading-overlay");
                 if (overlay) overlay.style.display = "none";
-            }}, 10000);
-
-            function checkNextPharmacy(index) {{
-                if (index >= pharmacies_search.length) {{
-                    if (bestRoute) {{
-                        L.Routing.control({{
-                            waypoints: bestRoute,
-                            router: L.Routing.osrmv1({{
-                                serviceUrl: 'https://router.project-osrm.org/route/v1'
-                            }}),
-                            routeWhileDragging: false,
-                            addWaypoints: false,
-                            createMarker: function() {{ return null; }}
-                        }}).addTo(map);
-                        console.log("✅ Meilleur itinéraire trouvé :", bestRoute);
-                    }} else {{
-                        console.warn("⚠️ Aucun itinéraire valide trouvé");
-                    }}
-                    if (overlay) overlay.style.display = "none";
-                    clearTimeout(spinnerTimeout);
-                    return;
-                }}
-
-                var ph = pharmacies_search[index];
-                console.log("🧭 Calcul de l'itinéraire vers", ph.name);
-
-                var control = L.Routing.control({{
-                    waypoints: [
-                        L.latLng({lat}, {lng}),
-                        L.latLng(ph.lat, ph.lng)
-                    ],
-                    router: L.Routing.osrmv1({{
-                        serviceUrl: 'https://router.project-osrm.org/route/v1'
-                    }}),
-                    routeWhileDragging: false,
-                    addWaypoints: false,
-                    createMarker: function() {{ return null; }}
-                }})
-                .on('routesfound', function(e) {{
-                    var travelTime = e.routes[0].summary.totalTime;
-                    if (travelTime < shortestTime) {{
-                        shortestTime = travelTime;
-                        bestRoute = [
-                            L.latLng({lat}, {lng}),
-                            L.latLng(ph.lat, ph.lng)
-                        ];
-                    }}
-                    map.removeControl(control);
-                    checkNextPharmacy(index + 1);
-                }})
-                .on('routingerror', function(err) {{
-                    console.error("🚫 Erreur de routage vers", ph.name, err);
-                    map.removeControl(control);
-                    checkNextPharmacy(index + 1);
-                }})
-                .addTo(map);
-
-                try {{
-                    control.route();
-                }} catch (err) {{
-                    console.error("❌ Exception pendant le routage :", err);
-                    map.removeControl(control);
-                    checkNextPharmacy(index + 1);
-                }}
-            }}
-
-            checkNextPharmacy(0);
-        }}, 500);
-        """)
\ No newline at end of file
+            }})();
+        """)
+
+    ui.timer(0.1, draw_best_route, once=True)  # après la connexion du client, sans retarder le rendu de la page
@@ -1,6 +1,5 @@
 from nicegui import ui, app
 from fastapi.responses import RedirectResponse
-import uuid
 from fastapi import Request
 from urllib.parse import parse_qs, urlparse, quote, unquote
 from collections import defaultdict
@@ -323,8 +322,7 @@ def do_login(u: str, p: str, request: Request):
     if verify_password(p, row[1]):
         
         # Token crée avant le check de status confirmé (à améliorer)
-        token = str(uuid.uuid4())
-        sessions[token] = row[0]   # user_id stocké dans le token de session
+        token = sessions.create(row[0])   # user_id stocké dans le token de session
         app.storage.browser['token'] = token  # stockage local
         
         # Login des livreurs
@@ -1,12 +1,12 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 import json
 from fastapi import Request
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
-from app.services.users import record_visit, get_user_info
+from app.services.user_context import get_user_context
+from app.services.users import record_visit
 from app.services.items import get_product, get_pharmacy, get_pharmacies_with_product, get_min_price_for_product
 from app.translations.translations import t
 
@@ -19,13 +19,12 @@ def product_map(product_id: str, request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
-    
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
 
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -1,34 +1,33 @@
 from nicegui import ui, app
 from fastapi.responses import RedirectResponse
 from fastapi import Request
-import requests
 from urllib.parse import unquote
 import json
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
-from app.services.users import record_visit, get_panier, get_wallet_balance, add_wallet_balance, delete_panier, register_order, get_user_info
-from app.services.items import get_product, get_total_price_for_product, remove_stock_product, get_total_qty, get_pharmacy, get_total_price_for_product
-from app.recommendations.user_product_matrix import update_with_panier
+from app.services.user_context import get_user_context
+from app.services.users import record_visit, get_panier
+from app.services.items import get_product, get_total_price_for_product, get_pharmacy
+from app.services.checkout import checkout
 from app.services.distance import optimize_route
+from app.services.geocoding import geocode_async
 from app.translations.translations import t
 
             
 @ui.page('/order')
-def order(request: Request):
+async def order(request: Request):
 
     """Page de validation de la commande avec calcul du coût de livraison et itinéraire optimisé"""
 
     # === Setup initial ===
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -107,16 +106,11 @@ def order(request: Request):
 
         if address and not lat and not lng:
             try:
-                geo_resp = requests.get(
-                    "https://nominatim.openstreetmap.org/search",
-                    params={"q": unquote(address), "format": "json", "limit": 1},
-                    headers={"User-Agent": "AppPrototype"}
-                )
-                geo_data = geo_resp.json()
-                if geo_data:
-                    lat, lng = float(geo_data[0]['lat']), float(geo_data[0]['lon'])
+                coords = await geocode_async(unquote(address))  # souvent déjà en cache (adresse de livraison géocodée à l'enregistrement)
+                if coords:
+                    lat, lng = coords
             except Exception as e:
-                ui.label(f"Erreur de géocodage : {e}").classes('text-red-500')
+                ui.label(f"{t('error_geocoding', lang_cookie)}{e!r}").classes('text-red-500')
                 return
 
         if not lat or not lng:
@@ -127,82 +121,53 @@ def order(request: Request):
         
 
         # === Confirmation de la commande ===
-        def confirm_order():
+        def confirm_order(top_up: float = 0):
 
-            """Vérifie que la commande peut être effectuée et si oui, ajuste le wallet, vide le panier et ajuste les stocks"""
+            """Valide la commande en une transaction (stock, wallet, commande, panier), avec recharge préalable éventuelle du wallet."""
 
-            # === Vérification des stocks ===
-            for product_id, qty in panier_items.items():
-                total_dispo = get_total_qty(product_id)  # quantité totale disponible en stock
-                if qty > total_dispo:
-                    ui.notify(f"{t('insufficient_stock', lang_cookie)}{get_product(product_id)['name']} {t('dispo', lang_cookie)}{total_dispo}{t('requested', lang_cookie)}{qty})", color='negative')
-                    return
-                
-            def process_order():
-
-                """Exécute le processus complet de validation de commande."""
-                
-                # === Enregistrement de la commande ===
-                if address:
-                    register_order(user_id, ui.state.delivery_cost, lat, lng, address)
-                else:
-                    register_order(user_id, ui.state.delivery_cost, lat, lng)
-                update_with_panier(user_id)
-
-                # === Débiter le wallet ===
-                add_wallet_balance(user_id, ui.state.total_global_with_fee, request, is_expense=True)
+            result = checkout(user_id, ui.state.delivery_cost, lat, lng, address or None, top_up=top_up)
+
+            if result["success"]:
                 ui.notify(t("order_confirmed", lang_cookie), color='positive')
+                ui.navigate.to('/thanks')
+                return
+
+            # === Stock insuffisant ===
+            if result["error"] == "insufficient_stock":
+                product = get_product(result["product_id"]) or {"name": result["product_id"]}
+                ui.notify(f"{t('insufficient_stock', lang_cookie)}{product['name']} {t('dispo', lang_cookie)}{result['available']}{t('requested', lang_cookie)}{panier_items.get(result['product_id'])})", color='negative')
+                return
 
-                # === Vider le panier ===
-                delete_panier(user_id)
+            if result["error"] == "empty_panier":
+                ui.notify(t("empty_panier", lang_cookie), color='negative')
+                return
 
-                # === Mettre à jour les stocks ===
-                for product_id, qty in panier_items.items():
-                    product = get_product(product_id)
-                    if not product:  # cas produit inexistant
-                        continue
-                    remove_stock_product(product_id, qty)
+            # === Solde insuffisant : proposer de recharger le montant manquant ===
+            missing_amount = result["missing_amount"]
 
-                # === Redirection ===
-                ui.navigate.to('/thanks')
-            
             def handle_recharge_and_confirm(amount, popup):
 
-                """Recharge le wallet et relance la commande."""
+                """Recharge le wallet et relance la commande (dans la même transaction)."""
 
                 popup.close()
-                add_wallet_balance(user_id, amount, request, is_expense=False)
-                ui.notify(t("wallet_recharged_2", lang_cookie), color="green")
-                process_order()
-         
-            # === Vérification du solde de l'utilisateur ===
-            wallet_balance = get_wallet_balance(user_id)
-            total_cost = ui.state.total_global_with_fee
-
-            if wallet_balance < total_cost:
-                # Montant manquant
-                missing_amount = round(total_cost - wallet_balance, 2)
-
-                # Création du popup
-                with ui.dialog() as recharge_popup, ui.card():
-                    ui.label(t("insufficient_balance", lang_cookie)).classes("text-lg font-semibold mb-2")
-                    ui.label(f"{t('missing_amount', lang_cookie)} : {missing_amount:.2f} €").classes("text-gray-700 font-semibold mb-3")
-                    with ui.row().classes("justify-end gap-3"):
-                        ui.button(t("cancel", lang_cookie), on_click=recharge_popup.close).props("flat")
-                        ui.button(f"{t('recharge_now', lang_cookie)} : {missing_amount:.2f} €",
-                                on_click=lambda: handle_recharge_and_confirm(missing_amount, recharge_popup)) \
-                            .props("unelevated color='green'")
-
-                recharge_popup.open()
-                return
+                confirm_order(top_up=top_up + amount)
+
+            # Création du popup
+            with ui.dialog() as recharge_popup, ui.card():
+                ui.label(t("insufficient_balance", lang_cookie)).classes("text-lg font-semibold mb-2")
+                ui.label(f"{t('missing_amount', lang_cookie)} : {missing_amount:.2f} €").classes("text-gray-700 font-semibold mb-3")
+                with ui.row().classes("justify-end gap-3"):
+                    ui.button(t("cancel", lang_cookie), on_click=recharge_popup.close).props("flat")
+                    ui.button(f"{t('recharge_now', lang_cookie)} : {missing_amount:.2f} €",
+                            on_click=lambda: handle_recharge_and_confirm(missing_amount, recharge_popup)) \
+                        .props("unelevated color='green'")
 
-            # === Si solde suffisant, on traite normalement ===
-            process_order()
+            recharge_popup.open()
 
 
         # === Boutons Confirmer/Annuler ===
         with ui.row().classes('justify-center gap-4 mt-6'):
-            ui.button(t("confirm_order", lang_cookie), on_click=confirm_order) \
+            ui.button(t("confirm_order", lang_cookie), on_click=lambda: confirm_order()) \
                 .props('unelevated') \
                 .style('background-color:#2e7d32; color:white; font-weight:600; border-radius:6px; padding:8px 16px;') \
                 .classes('btn-primary')
@@ -1,12 +1,12 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 from fastapi import Request
 
 from app.components.navbar import navbar
 from app.components.theme import apply_background
-from app.services.auth import get_current_user, sessions
-from app.services.users import record_visit, get_panier, add_panier_item, remove_panier_item, get_user_info, update_user
-from app.services.items import get_product, get_total_price_for_product, get_total_qty
+from app.services.user_context import get_user_context
+from app.services.users import record_visit, get_panier, add_panier_item, remove_panier_item, update_user
+from app.services.items import get_product, get_total_price_for_product, get_price_summaries
 from app.translations.translations import t
 
 
@@ -17,13 +17,12 @@ def panier(request: Request):
 
     # === Setup initial ===
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -149,6 +148,7 @@ def panier(request: Request):
         total_label.text = f"{t('total_panier', lang_cookie)}{total:.2f} €"
 
         # === Affichage produits ===
+        summaries = get_price_summaries(panier_count)  # stock total de tous les produits du panier en une requête
         for pid, qty in panier_count.items():
             prod = get_product(pid)
             if not prod:
@@ -179,7 +179,7 @@ def panier(request: Request):
                                     .style('background-color:#d32f2f; color:white; width:32px; height:32px;')
                             ui.label(str(qty)).classes('text-lg font-bold')
 
-                            if qty <= get_total_qty(pid):  # S'assurer qu'il y a encore du stock
+                            if qty <= summaries.get(pid, {}).get("total_qty", 0):  # S'assurer qu'il y a encore du stock
                                 ui.button('+', on_click=lambda _, pid=pid: on_add_one(pid)) \
                                     .props('round unelevated') \
                                     .style('background-color:#388e3c; color:white; width:32px; height:32px;')
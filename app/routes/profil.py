@@ -9,8 +9,8 @@ import io
 
 from app.components.theme import apply_background
 from app.components.navbar import navbar
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, update_user, get_visit_history, get_user_from_id, get_order_history, get_order_details
+from app.services.user_context import get_user_context
+from app.services.users import update_user, get_visit_history, get_order_history, get_order_details
 from app.security.passwords import hash_password
 from app.translations.translations import t
 
@@ -20,12 +20,12 @@ def generate_order_pdf(order_id: int, request: Request):
 
     """Génère un PDF récapitulatif de la commande de l'utilisateur."""
 
-    token = app.storage.browser.get('token')
-    if not token or token not in sessions:
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    user_id = sessions[token]
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     lang_cookie = request.cookies.get("language", "fr")
 
     order_details = get_order_details(order_id)
@@ -80,13 +80,12 @@ def profile_page(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
-    
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    
-    user_info = get_user_info(user_id)
+
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
     
@@ -102,9 +101,7 @@ def profile_page(request: Request):
             .props('unelevated') \
             .classes('btn-back shadow-lg')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    username = get_user_from_id(user_id)
+    username = user_info["username"]
 
 
     # === Edition du profil ===
@@ -7,8 +7,8 @@ from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 import io
 
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_user_info, get_last_order
+from app.services.user_context import get_user_context
+from app.services.users import get_last_order
 from app.components.navbar import navbar
 from app.components.theme import apply_background
 from app.translations.translations import t
@@ -19,12 +19,12 @@ def generate_last_order_pdf(request: Request):
 
     """Génère un PDF récapitulatif de la dernière commande de l'utilisateur."""
 
-    token = app.storage.browser.get('token')
-    if not token or token not in sessions:
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    user_id = sessions[token]
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     lang_cookie = request.cookies.get("language", "fr")
 
     last_order = get_last_order(user_id)
@@ -79,13 +79,12 @@ def thanks(request: Request):
     """Page de remerciement après une commande réussie."""
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-    
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
     
@@ -1,10 +1,10 @@
-from nicegui import ui, app
+from nicegui import ui
 from fastapi.responses import RedirectResponse
 import asyncio
 from fastapi import Request
 
-from app.services.auth import get_current_user, sessions
-from app.services.users import get_wallet_balance, add_wallet_balance, get_wallet_history, get_user_info
+from app.services.user_context import get_user_context
+from app.services.wallet import WALLET_HISTORY_PAGE_SIZE, count_wallet_history, credit_wallet, get_wallet_balance, get_wallet_history
 from app.components.navbar import navbar
 from app.components.theme import apply_background
 from app.translations.translations import t
@@ -18,13 +18,12 @@ def wallet_page(request: Request):
     # === Setup initial ===
 
     # Récupération de l'utilisateur et application du style global, de la barre de navigation et des cookies
-    if not get_current_user():
+    context = get_user_context(request)
+    user_id = context["user_id"]
+    if not user_id:
         return RedirectResponse('/')
 
-    token = app.storage.browser.get('token')
-    user_id = sessions[token]
-
-    user_info = get_user_info(user_id)
+    user_info = context["user_info"]
     if not user_info.get('is_confirmed', False) and not user_info.get('is_admin', False):  # utilisateur non confirmé et non admin
         return RedirectResponse('/')
 
@@ -50,8 +49,10 @@ def wallet_page(request: Request):
 
         async def recharge(amount: float):  # async pour afficher la notification avant le reload de l'ui
 
-            add_wallet_balance(user_id, amount, request, is_expense=False)
-            balance_label.set_text(f"{t('current_balance', lang_cookie)}{get_wallet_balance(user_id):.2f} €")
+            if amount <= 0:
+                return
+            new_balance = credit_wallet(user_id, amount)
+            balance_label.set_text(f"{t('current_balance', lang_cookie)}{new_balance:.2f} €")
             ui.notify(f"{t('wallet_recharged', lang_cookie)}{amount:.2f} € 💳", color="positive")
             
             await asyncio.sleep(1)  # attend 1 seconde avant de reload
@@ -75,12 +76,13 @@ def wallet_page(request: Request):
             
         # === Historique ===
         ui.label(t("transactions_history", lang_cookie)).classes('text-lg font-semibold mt-6')
-        history = get_wallet_history(user_id)
+        history_count = count_wallet_history(user_id)
 
-        # === Etat pour la pagination ===
+        # === Etat pour la pagination (par clé : id de la dernière transaction de chaque page affichée) ===
         class WalletState:
             current_page = 0
-            items_per_page = 20
+            items_per_page = WALLET_HISTORY_PAGE_SIZE
+            page_cursors = [None]  # page_cursors[i] = before_id de la page i
 
         wallet_state = WalletState()
 
@@ -94,20 +96,20 @@ def wallet_page(request: Request):
             wallet_container.clear()
             wallet_pagination.clear()
 
-            if not history:
+            if not history_count:
                 with wallet_container:
                     ui.label(t("no_transaction", lang_cookie)).classes('text-gray-500')
                 return
 
             # === Pagination ===
-            total_pages = max(1, (len(history) + wallet_state.items_per_page - 1) // wallet_state.items_per_page)
-            start = wallet_state.current_page * wallet_state.items_per_page
-            end = start + wallet_state.items_per_page
-            paginated_history = history[start:end]
+            total_pages = max(1, (history_count + wallet_state.items_per_page - 1) // wallet_state.items_per_page)
+            paginated_history = get_wallet_history(user_id, wallet_state.page_cursors[wallet_state.current_page], wallet_state.items_per_page)
+            if paginated_history and len(wallet_state.page_cursors) == wallet_state.current_page + 1:
+                wallet_state.page_cursors.append(paginated_history[-1][0])  # curseur de la page suivante
 
             # === Affichage des transactions ===
             with wallet_container:
-                for date, amount, desc in paginated_history:
+                for _, date, amount, desc in paginated_history:
                     if amount > 0:
                         border_color = 'border-green-500'
                         text_color = 'text-green-700'
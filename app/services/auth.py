@@ -1,9 +1,184 @@
-from nicegui import ui, app
+from nicegui import app
 from fastapi.responses import RedirectResponse
+from collections import OrderedDict
 from typing import Optional
-from fastapi import Request
+import os
+import threading
+import time
+import uuid
 
-sessions = {}  # token -> username
+from app.services.db import get_connection
+
+
+# === Backends de sessions ===
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")             # "memory" (un seul process) ou "sqlite" (partagé)
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(7 * 24 * 3600)))     # durée de vie d'une session (secondes)
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))    # nb de tokens gardés en cache local
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "30"))      # délai max avant de revoir un logout fait par un autre process
+
+
+class MemorySessionBackend:
+
+    """Sessions en mémoire du process (comportement historique) : token -> (user_id, expiration)."""
+
+    def __init__(self):
+
+        self._sessions: dict[str, tuple[int, float]] = {}
+
+    def get(self, token: str) -> Optional[int]:
+
+        entry = self._sessions.get(token)
+        if entry is None:
+            return None
+        if entry[1] < time.time():
+            self._sessions.pop(token, None)
+            return None
+        return entry[0]
+
+    def set(self, token: str, user_id: int, ttl: int):
+
+        self._sessions[token] = (user_id, time.time() + ttl)
+
+    def delete(self, token: str):
+
+        self._sessions.pop(token, None)
+
+
+SESSION_GET_SQL = "SELECT user_id FROM sessions WHERE token = ? AND expires_at > ?"
+SESSION_PURGE_SQL = "DELETE FROM sessions WHERE expires_at <= ?"
+
+
+class SQLiteSessionBackend:
+
+    """Sessions dans la table `sessions` de data.db, partagées entre tous les process/workers de l'hôte."""
+
+    def get(self, token: str) -> Optional[int]:
+
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(SESSION_GET_SQL, (token, time.time()))
+            row = cur.fetchone()
+
+            return row[0] if row else None
+
+    def set(self, token: str, user_id: int, ttl: int):
+
+        now = time.time()
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(SESSION_PURGE_SQL, (now,))  # purge des sessions expirées
+            cur.execute(
+                "INSERT OR REPLACE INTO sessions (token, user_id, expires_at) VALUES (?, ?, ?)",
+                (token, user_id, now + ttl),
+            )
+            conn.commit()
+
+    def delete(self, token: str):
+
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM sessions WHERE token = ?", (token,))
+            conn.commit()
+
+
+class SessionStore:
+
+    """
+    Point d'accès unique aux sessions (token -> user_id), quel que soit le backend.
+    Pour un backend partagé, les lectures passent par un cache LRU local à durée courte
+    afin que get_current_user() reste sans accès base sur la plupart des pages.
+    S'utilise aussi comme un dict (`sessions[token]`, `token in sessions`, `sessions.get(token)`).
+    """
+
+    def __init__(self, backend, ttl: int = SESSION_TTL, cache_size: int = SESSION_CACHE_SIZE, cache_ttl: float = SESSION_CACHE_TTL):
+
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: OrderedDict[str, tuple[Optional[int], float]] = OrderedDict()  # token -> (user_id, fin de validité)
+        self._lock = threading.Lock()
+        self._use_cache = not isinstance(backend, MemorySessionBackend)  # inutile devant un dict
+
+    def get(self, token: Optional[str], default=None) -> Optional[int]:
+
+        """Retourne l'id de l'utilisateur associé au token, ou `default` si la session n'existe pas."""
+
+        if not token:
+            return default
+
+        if self._use_cache:
+            with self._lock:
+                cached = self._cache.get(token)
+                if cached is not None and cached[1] > time.monotonic():
+                    self._cache.move_to_end(token)
+                    return cached[0] if cached[0] is not None else default
+
+        user_id = self.backend.get(token)
+
+        if self._use_cache:
+            with self._lock:
+                self._cache[token] = (user_id, time.monotonic() + self.cache_ttl)
+                self._cache.move_to_end(token)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        return user_id if user_id is not None else default
+
+    def create(self, user_id: int) -> str:
+
+        """Crée une session pour l'utilisateur et retourne son token."""
+
+        token = str(uuid.uuid4())
+        self.backend.set(token, user_id, self.ttl)
+        with self._lock:
+            self._cache.pop(token, None)
+        return token
+
+    def delete(self, token: Optional[str]):
+
+        """Supprime une session (logout)."""
+
+        if not token:
+            return
+        self.backend.delete(token)
+        with self._lock:
+            self._cache.pop(token, None)
+
+    def __getitem__(self, token: str) -> int:
+
+        user_id = self.get(token)
+        if user_id is None:
+            raise KeyError(token)
+        return user_id
+
+    def __setitem__(self, token: str, user_id: int):
+
+        self.backend.set(token, user_id, self.ttl)
+        with self._lock:
+            self._cache.pop(token, None)
+
+    def __delitem__(self, token: str):
+
+        self.delete(token)
+
+    def __contains__(self, token) -> bool:
+
+        return self.get(token) is not None
+
+
+def _make_backend(name: str):
+
+    """Instancie le backend de sessions demandé par SESSION_BACKEND."""
+
+    if name == "sqlite":
+        return SQLiteSessionBackend()
+    if name != "memory":
+        print(f"⚠️ SESSION_BACKEND inconnu '{name}', utilisation des sessions en mémoire.")
+    return MemorySessionBackend()
+
+
+sessions = SessionStore(_make_backend(SESSION_BACKEND))  # token -> user_id
 
 # def get_current_user(request: Optional[Request] = None) -> Optional[int]:
 
@@ -32,8 +207,7 @@ def logout():
     """Déconnecte l'utilisateur et redirige vers la page de connexion."""
 
     token = app.storage.browser.get('token')
-    if token in sessions:
-        del sessions[token]
+    sessions.delete(token)
     app.storage.browser['token'] = None
 
-    return RedirectResponse('/')  # Retour à la page racine de l'app
\ No newline at end of file
+    return RedirectResponse('/')  # Retour à la page racine de l'app
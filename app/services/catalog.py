@@ -0,0 +1,206 @@
+import os
+import threading
+import time
+
+from app.services.db import get_change_counter, get_connection
+
+
+# Les écritures des autres workers sont vues via les compteurs "catalog" et "prices" de change_counters
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "1"))  # secondes entre deux relectures des compteurs
+
+
+class ProductRecord:
+
+    """Produit du catalogue en mémoire (immuable par convention : tags et composants en tuples)."""
+
+    __slots__ = ("id", "name", "provider", "image", "description", "reference", "category", "age_group",
+                 "allow_reviews", "display_price", "allow_order", "display_recommendations", "ordonnance",
+                 "components", "tags")
+
+    def __init__(self, row: tuple, components: tuple = (), tags: tuple = ()):
+
+        (self.id, self.name, self.provider, self.image, self.description, self.reference, self.category, self.age_group,
+         allow_reviews, display_price, allow_order, display_recommendations, ordonnance) = row
+        self.allow_reviews = bool(allow_reviews)
+        self.display_price = bool(display_price)
+        self.allow_order = bool(allow_order)
+        self.display_recommendations = bool(display_recommendations)
+        self.ordonnance = bool(ordonnance)
+        self.components = components
+        self.tags = tags
+
+    def to_dict(self) -> dict:
+
+        """Nouveau dict au format de items.get_product (modifiable par l'appelant sans toucher au catalogue)."""
+
+        return {
+            "id": self.id,
+            "name": self.name,
+            "provider": self.provider,
+            "image": self.image,
+            "description": self.description,
+            "reference": self.reference,
+            "component": list(self.components),
+            "tags": list(self.tags),
+            "category": self.category,
+            "age_group": self.age_group,
+            "allow_reviews": self.allow_reviews,
+            "display_price": self.display_price,
+            "allow_order": self.allow_order,
+            "display_recommendations": self.display_recommendations,
+            "ordonnance": self.ordonnance,
+        }
+
+
+class PriceRecord:
+
+    """Ligne de product_price_summary (min_price et pharmacie à None si le produit n'est disponible nulle part)."""
+
+    __slots__ = ("min_price", "pharmacy_id", "pharmacy_name", "total_qty", "pharmacy_count")
+
+    def __init__(self, min_price, pharmacy_id, pharmacy_name, total_qty, pharmacy_count):
+
+        self.min_price = min_price
+        self.pharmacy_id = pharmacy_id
+        self.pharmacy_name = pharmacy_name
+        self.total_qty = total_qty or 0
+        self.pharmacy_count = pharmacy_count or 0
+
+
+class CatalogSnapshot:
+
+    """
+    Photo immuable du catalogue : produits (avec tags et composants) et résumés prix/stock.
+    Une écriture ne la modifie jamais : elle publie une nouvelle photo (copie sur écriture),
+    les lecteurs qui tiennent l'ancienne continuent de l'utiliser sans verrou.
+
+    - version : change quand les produits, tags ou composants changent (clé pour les caches dérivés, ex : search_index) ;
+    - price_version : change quand les prix ou les stocks changent ;
+    - catalog_counter / prices_counter : compteurs partagés lus avant le chargement des produits / des prix.
+    """
+
+    __slots__ = ("products", "prices", "version", "price_version", "catalog_counter", "prices_counter")
+
+    def __init__(self, products: dict[int, ProductRecord], prices: dict[int, PriceRecord], version: int, price_version: int,
+                 catalog_counter: int, prices_counter: int):
+
+        self.products = products  # trié par id
+        self.prices = prices
+        self.version = version
+        self.price_version = price_version
+        self.catalog_counter = catalog_counter
+        self.prices_counter = prices_counter
+
+
+# Chargements complets (une lecture séquentielle par table, sans tri temporaire)
+CATALOG_PRODUCTS_SQL = """
+    SELECT id, name, provider, image, description, reference, category, age_group, allow_reviews, display_price, allow_order, display_recommendations, ordonnance
+    FROM products
+    ORDER BY id
+"""
+CATALOG_COMPONENTS_SQL = "SELECT product_id, component FROM product_components ORDER BY id"
+CATALOG_TAGS_SQL = "SELECT product_id, tag FROM product_tags ORDER BY id"
+CATALOG_PRICES_SQL = """
+    SELECT s.product_id, s.min_price, s.min_price_pharmacy_id, p.name, s.total_qty, s.pharmacy_count
+    FROM product_price_summary s
+    LEFT JOIN pharmacies p ON p.id = s.min_price_pharmacy_id
+"""
+
+
+def _load_products() -> dict[int, ProductRecord]:
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(CATALOG_PRODUCTS_SQL)
+        rows = cursor.fetchall()
+
+        components: dict[int, list[str]] = {}
+        for product_id, component in cursor.execute(CATALOG_COMPONENTS_SQL):
+            components.setdefault(product_id, []).append(component)
+
+        tags: dict[int, list[str]] = {}
+        for product_id, tag in cursor.execute(CATALOG_TAGS_SQL):
+            tags.setdefault(product_id, []).append(tag)
+
+    return {row[0]: ProductRecord(row, tuple(components.get(row[0], ())), tuple(tags.get(row[0], ()))) for row in rows}
+
+
+def _load_prices() -> dict[int, PriceRecord]:
+
+    with get_connection() as conn:
+        rows = conn.execute(CATALOG_PRICES_SQL).fetchall()
+
+    return {row[0]: PriceRecord(*row[1:]) for row in rows}
+
+
+_snapshot: CatalogSnapshot | None = None
+_version = 0            # version des produits (tags, composants)
+_price_version = 0      # version des prix et stocks
+_lock = threading.Lock()  # une construction / publication / invalidation à la fois
+_next_check = 0.0       # prochaine relecture des compteurs partagés (time.monotonic)
+
+
+def get_catalog() -> CatalogSnapshot:
+
+    """
+    Retourne la photo courante du catalogue, construite au premier appel (ou après une invalidation).
+    Au plus toutes les CATALOG_CHECK_INTERVAL secondes, les compteurs partagés sont relus : si un autre
+    worker a modifié les produits ou les prix, la photo est reconstruite ou ses prix relus.
+    """
+
+    global _snapshot, _next_check
+
+    snapshot = _snapshot
+    if snapshot is not None and time.monotonic() >= _next_check:
+        _next_check = time.monotonic() + CATALOG_CHECK_INTERVAL
+        if get_change_counter("catalog") != snapshot.catalog_counter:
+            invalidate_catalog()
+        elif get_change_counter("prices") != snapshot.prices_counter:
+            refresh_catalog_prices()
+        snapshot = _snapshot
+
+    if snapshot is None:
+        with _lock:
+            snapshot = _snapshot
+            if snapshot is None:
+                counters = get_change_counter("catalog"), get_change_counter("prices")  # lus avant les données
+                snapshot = _snapshot = CatalogSnapshot(_load_products(), _load_prices(), _version, _price_version, *counters)
+
+    return snapshot
+
+
+def catalog_version() -> int:
+
+    """Version courante des produits du catalogue (change à chaque invalidate_catalog)."""
+
+    return _version
+
+
+def invalidate_catalog():
+
+    """À appeler après une écriture sur products, product_tags ou product_components : la photo sera reconstruite."""
+
+    global _snapshot, _version
+
+    with _lock:
+        _version += 1
+        _snapshot = None
+
+
+def refresh_catalog_prices():
+
+    """
+    À appeler après une écriture sur les prix ou les stocks (pharmacy_products, pharmacies) :
+    publie une nouvelle photo qui reprend les produits de la précédente avec des résumés prix/stock relus.
+    """
+
+    global _snapshot, _price_version
+
+    with _lock:
+        _price_version += 1
+        snapshot = _snapshot
+        if snapshot is None:
+            return  # la prochaine construction lira les prix à jour
+        prices_counter = get_change_counter("prices")
+        _snapshot = CatalogSnapshot(snapshot.products, _load_prices(), snapshot.version, _price_version,
+                                    snapshot.catalog_counter, prices_counter)
@@ -0,0 +1,147 @@
+from datetime import datetime
+
+from app.recommendations.user_product_matrix import PURCHASE_WEIGHT, update_interaction
+from app.services.catalog import refresh_catalog_prices
+from app.services.db import immediate_transaction
+from app.services.users import GET_PANIER_SQL, pending_orders
+from app.services.wallet import credit, debit
+
+
+class CheckoutError(Exception):
+
+    """Commande refusée : annule toute la transaction (stock, wallet, commande, panier)."""
+
+    def __init__(self, error: str, **details):
+
+        super().__init__(error)
+        self.error = error
+        self.details = details
+
+
+def _allocate_stock(cur, product_id: int, qty: int) -> list[dict]:
+
+    """
+    Réserve `qty` unités d'un produit dans les pharmacies les moins chères (dans la transaction en cours).
+    Chaque retrait est un UPDATE conditionnel (qty >= retrait) : le stock ne peut jamais devenir négatif.
+    """
+
+    cur.execute("""
+        SELECT pharmacy_id, price, qty
+        FROM pharmacy_products
+        WHERE product_id = ? AND qty > 0
+        ORDER BY price ASC
+    """, (product_id,))
+    rows = cur.fetchall()
+
+    available = sum(stock for _, _, stock in rows)
+    if available < qty:
+        raise CheckoutError("insufficient_stock", product_id=product_id, available=available)
+
+    allocations = []
+    remaining = qty
+    for pharmacy_id, price, stock in rows:
+        if remaining <= 0:
+            break
+        take = min(stock, remaining)
+        cur.execute("""
+            UPDATE pharmacy_products
+            SET qty = qty - ?
+            WHERE product_id = ? AND pharmacy_id = ? AND qty >= ?
+        """, (take, product_id, pharmacy_id, take))
+        if cur.rowcount != 1:  # ne peut arriver que si le stock a changé malgré le verrou
+            raise CheckoutError("insufficient_stock", product_id=product_id, available=available - (qty - remaining))
+        allocations.append({"pharmacy_id": pharmacy_id, "unit_price": price, "qty": take})
+        remaining -= take
+
+    return allocations
+
+
+def checkout(user_id: int, delivery_fee: float = 0, lat: float | None = None, lng: float | None = None,
+             address: str | None = None, top_up: float = 0) -> dict:
+
+    """
+    Valide le panier d'un utilisateur en une seule transaction BEGIN IMMEDIATE :
+    recharge éventuelle du wallet (`top_up`), retrait du stock, débit du wallet,
+    enregistrement de la commande (une ligne par produit et par pharmacie) et vidage du panier.
+    Tout est appliqué ou rien : deux validations simultanées ne peuvent ni survendre le stock
+    ni perdre une mise à jour du solde.
+
+    Retourne :
+    {
+        "success": bool,
+        "error": None | "empty_panier" | "insufficient_stock" | "insufficient_balance",
+        "order_id": int | None,
+        "total": float,                 # produits + frais de livraison
+        "balance": float | None,        # solde après la commande (None en cas d'échec)
+        "missing_amount": float,        # montant manquant si solde insuffisant
+        "product_id": int | None,       # produit en rupture si stock insuffisant
+        "available": int | None,        # quantité disponible de ce produit
+    }
+    """
+
+    result = {
+        "success": False, "error": None, "order_id": None, "total": 0.0, "balance": None,
+        "missing_amount": 0.0, "product_id": None, "available": None,
+    }
+    today = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        with immediate_transaction() as conn:
+            cur = conn.cursor()
+
+            cur.execute(GET_PANIER_SQL, (user_id,))
+            panier = dict(cur.fetchall())
+            if not panier:
+                raise CheckoutError("empty_panier")
+
+            # === Stock ===
+            allocations = {product_id: _allocate_stock(cur, product_id, qty) for product_id, qty in panier.items()}
+            products_total = sum(a["unit_price"] * a["qty"] for allocs in allocations.values() for a in allocs)
+            total = round(products_total + (delivery_fee or 0), 2)
+            result["total"] = total
+
+            # === Wallet ===
+            if top_up > 0:
+                credit(cur, user_id, top_up, "Recharge", today)
+
+            balance = debit(cur, user_id, total, "Dépense", today)
+            if balance is None:
+                cur.execute("SELECT balance FROM wallets WHERE user_id = ?", (user_id,))
+                row = cur.fetchone()
+                raise CheckoutError("insufficient_balance", missing_amount=round(total - (row[0] if row else 0.0), 2))
+            result["balance"] = balance
+
+            # === Commande ===
+            # Identifiant attribué par order_headers (AUTOINCREMENT), puis une ligne par produit et par pharmacie
+            cur.execute("""
+                INSERT INTO order_headers (user_id, status, date, latitude, longitude, address, delivery_fee, total)
+                VALUES (?, 'pending', ?, ?, ?, ?, ?, ?)
+            """, (user_id, today, lat, lng, address, delivery_fee or 0, total))
+            order_id = cur.lastrowid
+            cur.executemany("""
+                INSERT INTO orders (order_id, product_id, qty, total_price, pharmacy_id)
+                VALUES (?, ?, ?, ?, ?)
+            """, [
+                (order_id, product_id, a["qty"], a["unit_price"] * a["qty"], a["pharmacy_id"])
+                for product_id, allocs in allocations.items()
+                for a in allocs
+            ])
+
+            # === Panier ===
+            cur.execute("DELETE FROM panier WHERE user_id = ?", (user_id,))
+
+    except CheckoutError as e:
+        result["error"] = e.error
+        result.update(e.details)
+        return result
+
+    refresh_catalog_prices()  # stocks décrémentés : résumés prix/stock relus dans la photo du catalogue
+
+    # Interactions de recommandation : hors transaction, la commande est déjà validée
+    for product_id, qty in panier.items():
+        update_interaction(user_id, product_id, qty, increment=PURCHASE_WEIGHT)
+
+    pending_orders.refresh_order(order_id)  # visible tout de suite par les livreurs connectés
+    result.update(success=True, order_id=order_id)
+
+    return result
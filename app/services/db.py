@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
+DB_PATH = DATA_DIR / 'data.db'
+
+# Réglages appliqués une seule fois à l'ouverture de chaque connexion
+BUSY_TIMEOUT_MS = 5000               # attente max (ms) si la base est verrouillée par un autre writer
+MMAP_SIZE = 64 * 1024 * 1024         # taille du mapping mémoire pour les lectures (64 Mo)
+
+# Pool : une connexion par thread, thread ident -> (thread, connexion, chemin de la base)
+_pool: dict[int, tuple[threading.Thread, sqlite3.Connection, Path]] = {}
+_pool_lock = threading.Lock()
+
+
+def _configure(conn: sqlite3.Connection):
+
+    """Applique les PRAGMA de performance à une connexion fraîchement ouverte."""
+
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    cur.execute("PRAGMA journal_mode = WAL")        # lecteurs et writer ne se bloquent plus mutuellement
+    cur.execute("PRAGMA synchronous = NORMAL")      # suffisant en WAL, évite un fsync par commit
+    cur.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    cur.close()
+
+
+def _prune_dead_threads():
+
+    """Ferme les connexions des threads terminés (ex : workers de asyncio.to_thread recyclés)."""
+
+    for ident, (thread, conn, _) in list(_pool.items()):
+        if not thread.is_alive():
+            conn.close()
+            del _pool[ident]
+
+
+def get_connection() -> sqlite3.Connection:
+
+    """
+    Retourne la connexion SQLite partagée du thread courant (créée et configurée au premier appel).
+    S'utilise comme avant avec `with get_connection() as conn:` : le bloc commit/rollback
+    la transaction mais ne ferme pas la connexion, qui est réutilisée par les appels suivants.
+    """
+
+    thread = threading.current_thread()
+    entry = _pool.get(thread.ident)
+    if entry is not None and entry[0] is thread and entry[2] == DB_PATH:
+        return entry[1]
+
+    # check_same_thread=False : la connexion n'est utilisée que par son thread, mais doit pouvoir
+    # être fermée depuis un autre (nettoyage des threads morts, arrêt de l'application)
+    conn = sqlite3.connect(DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    _configure(conn)
+
+    with _pool_lock:
+        if entry is not None:  # DB_PATH a changé (scripts, tests) ou ident recyclé → on remplace
+            entry[1].close()
+        _prune_dead_threads()
+        _pool[thread.ident] = (thread, conn, DB_PATH)
+
+    return conn
+
+
+def close_connection():
+
+    """Ferme la connexion du thread courant (si elle existe)."""
+
+    with _pool_lock:
+        entry = _pool.pop(threading.get_ident(), None)
+    if entry is not None:
+        entry[1].close()
+
+
+def close_all_connections():
+
+    """Ferme toutes les connexions ouvertes par le pool (appelé à l'arrêt de l'application)."""
+
+    with _pool_lock:
+        for _, conn, _ in _pool.values():
+            conn.close()
+        _pool.clear()
+
+
+CHANGE_COUNTER_SQL = "SELECT version FROM change_counters WHERE name = ?"
+
+
+def get_change_counter(name: str) -> int:
+
+    """
+    Version courante du compteur `name` de change_counters (incrémenté par trigger à chaque écriture,
+    quel que soit le processus). Un cache en mémoire qui la voit changer doit se recharger.
+    """
+
+    with get_connection() as conn:
+        row = conn.execute(CHANGE_COUNTER_SQL, (name,)).fetchone()
+
+    return row[0] if row else 0
+
+
+@contextmanager
+def immediate_transaction():
+
+    """
+    Transaction d'écriture exclusive sur la connexion du thread courant :
+    `with immediate_transaction() as conn:` ouvre un BEGIN IMMEDIATE (le verrou d'écriture est pris
+    dès le début, avant les lectures), commit à la sortie du bloc et rollback en cas d'exception.
+    Les autres writers attendent (busy_timeout) au lieu d'entrelacer leurs écritures.
+    """
+
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
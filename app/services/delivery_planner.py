@@ -0,0 +1,75 @@
+from app.services.distance import haversine_matrix
+from app.services.items import get_pharmacy
+from app.services.route_optimizer import DEFAULT_TIME_BUDGET, open_path_matrix, path_length, solve_path_with_precedence
+
+
+def build_delivery_stops(orders: list[dict]) -> tuple[list[dict], dict[int, set[int]]]:
+
+    """
+    Construit les étapes d'une tournée à partir de commandes (format de get_orders_for_delivery_person) :
+    un ramassage par pharmacie (partagé entre les commandes qui y ont des produits) et une livraison par commande.
+    Retourne (étapes, précédences) où précédences[i] = indices (base 1) des ramassages à faire avant l'étape i.
+    """
+
+    stops = []
+    pickup_index: dict[int, int] = {}  # pharmacy_id -> indice de l'étape de ramassage
+    predecessors: dict[int, set[int]] = {}
+
+    for order in orders:
+        pharmacy_ids = list(dict.fromkeys(item["pharmacy_id"] for item in order["items"] if item.get("pharmacy_id") is not None))
+
+        for pharmacy_id in pharmacy_ids:
+            if pharmacy_id in pickup_index:
+                stops[pickup_index[pharmacy_id] - 1]["order_ids"].append(order["order_id"])
+                continue
+            pharmacy = get_pharmacy(pharmacy_id)
+            if not pharmacy or pharmacy["coords"]["lat"] is None or pharmacy["coords"]["lng"] is None:
+                continue
+            stops.append({
+                "type": "pickup",
+                "pharmacy_id": pharmacy_id,
+                "name": pharmacy["name"],
+                "address": pharmacy["address"],
+                "lat": pharmacy["coords"]["lat"],
+                "lng": pharmacy["coords"]["lng"],
+                "order_ids": [order["order_id"]],
+            })
+            pickup_index[pharmacy_id] = len(stops)
+
+        if order.get("lat") is None or order.get("lng") is None:
+            continue  # adresse non géolocalisée : la livraison ne peut pas être placée sur la carte
+        stops.append({
+            "type": "dropoff",
+            "name": order["customer"],
+            "address": order["address"],
+            "lat": order["lat"],
+            "lng": order["lng"],
+            "order_ids": [order["order_id"]],
+        })
+        predecessors[len(stops)] = {pickup_index[pid] for pid in pharmacy_ids if pid in pickup_index}
+
+    return stops, predecessors
+
+
+def plan_deliveries(start_lat: float, start_lng: float, orders: list[dict], time_budget: float = DEFAULT_TIME_BUDGET) -> dict:
+
+    """
+    Planifie une tournée unique pour toutes les commandes d'un livreur : chaque commande est livrée
+    après le passage dans toutes ses pharmacies. La tournée se termine à la dernière livraison.
+    Retourne {"stops": étapes ordonnées, "distance_km": longueur à vol d'oiseau}.
+    """
+
+    stops, predecessors = build_delivery_stops(orders)
+    if not stops:
+        return {"stops": [], "distance_km": 0.0}
+
+    lats = [start_lat, *(stop["lat"] for stop in stops)]
+    lngs = [start_lng, *(stop["lng"] for stop in stops)]
+    matrix = open_path_matrix(haversine_matrix(lats, lngs, lats, lngs))
+
+    order = solve_path_with_precedence(matrix, predecessors, time_budget)
+
+    return {
+        "stops": [stops[node - 1] for node in order],
+        "distance_km": path_length(matrix, order),
+    }
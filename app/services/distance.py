@@ -1,10 +1,20 @@
 import math
+import threading
+import numpy as np
+
+from app.services.db import get_connection
+from app.services.route_optimizer import DEFAULT_TIME_BUDGET, open_path_matrix, solve_path
+
+
+EARTH_RADIUS_KM = 6371  # Rayon de la Terre en km
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180  # ~111.2 km par degré de latitude
+
 
 def haversine_dist(lat1: float, lon1: float, lat2: float, lon2: float):
 
     """Retourne la distance à vol d'oiseau en kilomètres"""
 
-    R = 6371  # Rayon de la Terre en km
+    R = EARTH_RADIUS_KM
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
     dlambda = math.radians(lon2 - lon1)
@@ -13,21 +23,183 @@ def haversine_dist(lat1: float, lon1: float, lat2: float, lon2: float):
     return 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
 
 
-def optimize_route(start_lat, start_lng, pharmacies, end_lat=None, end_lng=None):
+# === Versions vectorisées (NumPy) ===
+def haversine_many(lat: float, lng: float, lats, lngs) -> np.ndarray:
+
+    """Distances (km) entre un point et un ensemble de points : un seul calcul NumPy au lieu d'une boucle Python."""
+
+    phi1 = np.radians(lat)
+    phi2 = np.radians(np.asarray(lats, dtype=float))
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lngs, dtype=float) - lng)
+    a = np.sin(dphi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2)**2
+
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def haversine_matrix(lats1, lngs1, lats2, lngs2) -> np.ndarray:
+
+    """Matrice des distances (km) : résultat[i, j] = distance entre le point i du premier ensemble et le point j du second."""
+
+    phi1 = np.radians(np.asarray(lats1, dtype=float))[:, None]
+    phi2 = np.radians(np.asarray(lats2, dtype=float))[None, :]
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.asarray(lngs2, dtype=float)[None, :] - np.asarray(lngs1, dtype=float)[:, None])
+    a = np.sin(dphi / 2)**2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2)**2
+
+    return 2 * EARTH_RADIUS_KM * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+# === Index spatial des pharmacies ===
+class PharmacyIndex:
+
+    """
+    Index spatial en grille sur les coordonnées des pharmacies.
+    Chaque pharmacie est rangée dans une cellule de `cell_deg` degrés : une recherche par rayon
+    ne calcule les distances (vectorisées) que pour les cellules qui recoupent le cercle.
+    """
+
+    def __init__(self, rows, cell_deg: float = 0.1):
+
+        """rows : itérable de (pharmacy_id, name, latitude, longitude) ; les pharmacies sans coordonnées sont ignorées."""
+
+        rows = [row for row in rows if row[2] is not None and row[3] is not None]
+
+        self.cell_deg = cell_deg
+        self.ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self.names = [row[1] for row in rows]
+        self.lats = np.array([row[2] for row in rows], dtype=float)
+        self.lngs = np.array([row[3] for row in rows], dtype=float)
+
+        # cellule (i, j) -> indices des pharmacies qu'elle contient
+        cells: dict[tuple[int, int], list[int]] = {}
+        for position, key in enumerate(zip(self._cell(self.lats), self._cell(self.lngs))):
+            cells.setdefault(key, []).append(position)
+        self.cells = {key: np.array(positions, dtype=np.int64) for key, positions in cells.items()}
+
+    def _cell(self, degrees):
+
+        return np.floor(np.asarray(degrees) / self.cell_deg).astype(np.int64).tolist()
+
+    def _candidates(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+
+        """Indices des pharmacies dont la cellule recoupe la boîte englobante du cercle."""
+
+        dlat = radius_km / KM_PER_DEGREE
+        cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90.0)))
+        if lat + dlat >= 90 or lat - dlat <= -90 or cos_lat < 1e-6 or dlat / cos_lat >= 180:
+            return np.arange(len(self.ids))  # cercle trop grand ou proche d'un pôle : tout est candidat
+        dlng = dlat / cos_lat
+        if lng - dlng < -180 or lng + dlng > 180:
+            return np.arange(len(self.ids))  # le cercle traverse l'antiméridien
+
+        i_min, i_max = self._cell([lat - dlat, lat + dlat])
+        j_min, j_max = self._cell([lng - dlng, lng + dlng])
+        if (i_max - i_min + 1) * (j_max - j_min + 1) > len(self.cells):  # moins coûteux de parcourir les cellules existantes
+            hits = [positions for (i, j), positions in self.cells.items() if i_min <= i <= i_max and j_min <= j <= j_max]
+        else:
+            hits = [self.cells[key] for key in ((i, j) for i in range(i_min, i_max + 1) for j in range(j_min, j_max + 1)) if key in self.cells]
+
+        return np.concatenate(hits) if hits else np.empty(0, dtype=np.int64)
+
+    def _restrict(self, positions: np.ndarray, pharmacy_ids) -> np.ndarray:
+
+        if pharmacy_ids is None:
+            return positions
+        return positions[np.isin(self.ids[positions], np.fromiter(pharmacy_ids, dtype=np.int64))]
+
+    def _results(self, positions: np.ndarray, distances: np.ndarray) -> list[dict]:
+
+        order = np.argsort(distances, kind="stable")
+        return [
+            {
+                "id": int(self.ids[p]),
+                "name": self.names[p],
+                "lat": float(self.lats[p]),
+                "lng": float(self.lngs[p]),
+                "distance": float(d),
+            }
+            for p, d in zip(positions[order], distances[order])
+        ]
+
+    def within_radius(self, lat: float, lng: float, radius_km: float, pharmacy_ids=None) -> list[dict]:
+
+        """Pharmacies à moins de `radius_km` du point, triées par distance croissante (optionnellement parmi `pharmacy_ids`)."""
+
+        positions = self._restrict(self._candidates(lat, lng, radius_km), pharmacy_ids)
+        distances = haversine_many(lat, lng, self.lats[positions], self.lngs[positions])
+        inside = distances <= radius_km
+
+        return self._results(positions[inside], distances[inside])
+
+    def nearest(self, lat: float, lng: float, k: int = 1, pharmacy_ids=None, max_distance: float | None = None) -> list[dict]:
+
+        """Les `k` pharmacies les plus proches du point (optionnellement parmi `pharmacy_ids` et à moins de `max_distance` km)."""
+
+        radius = self.cell_deg * KM_PER_DEGREE
+        while True:
+            if max_distance is not None:
+                radius = min(radius, max_distance)
+            found = self.within_radius(lat, lng, radius, pharmacy_ids)
+            # Les k plus proches sont forcément dans le rayon dès qu'il en contient k
+            if len(found) >= k or radius >= math.pi * EARTH_RADIUS_KM or radius == max_distance:
+                return found[:k]
+            radius *= 2
+
+
+_index: PharmacyIndex | None = None
+_index_generation = 0  # incrémenté à chaque invalidation, évite de publier un index construit avant une écriture
+_index_lock = threading.Lock()
+
+
+def get_pharmacy_index() -> PharmacyIndex:
+
+    """Retourne l'index spatial partagé, construit au premier appel (ou après une invalidation)."""
+
+    global _index
+
+    index = _index
+    if index is None:
+        with _index_lock:
+            index = _index
+            if index is None:
+                generation = _index_generation
+                with get_connection() as conn:
+                    rows = conn.execute("SELECT id, name, latitude, longitude FROM pharmacies").fetchall()
+                index = PharmacyIndex(rows)
+                if generation == _index_generation:
+                    _index = index
+
+    return index
+
+
+def invalidate_pharmacy_index():
+
+    """Marque l'index comme obsolète (à appeler après un ajout, une modification ou une suppression de pharmacie)."""
+
+    global _index, _index_generation
+    _index_generation += 1
+    _index = None
+
+
+def optimize_route(start_lat, start_lng, pharmacies, end_lat=None, end_lng=None, time_budget: float = DEFAULT_TIME_BUDGET):
+
+    """
+    Retourne une liste ordonnée de pharmacies pour minimiser la distance totale parcourue
+    (départ -> pharmacies -> destination finale si elle est fournie), voir app.services.route_optimizer.
+    """
 
-    """Retourne une liste ordonnée de pharmacies pour minimiser la distance totale parcourue"""
+    has_end = end_lat is not None and end_lng is not None
 
-    unvisited = pharmacies[:]
-    ordered = []
-    current = {"lat": start_lat, "lng": start_lng}
+    lats = [start_lat, *(ph["lat"] for ph in pharmacies)] + ([end_lat] if has_end else [])
+    lngs = [start_lng, *(ph["lng"] for ph in pharmacies)] + ([end_lng] if has_end else [])
+    matrix = haversine_matrix(lats, lngs, lats, lngs)  # matrice calculée une seule fois
+    if not has_end:
+        matrix = open_path_matrix(matrix)
 
-    while unvisited:
-        next_ph = min(unvisited, key=lambda ph: haversine_dist(current["lat"], current["lng"], ph["lat"], ph["lng"]))
-        ordered.append(next_ph)
-        unvisited.remove(next_ph)
-        current = next_ph
+    ordered = [pharmacies[node - 1] for node in solve_path(matrix, time_budget)]
 
-    if end_lat is not None and end_lng is not None:
+    if has_end:
         ordered.append({"lat": end_lat, "lng": end_lng, "name": "Destination finale"})
 
-    return ordered
\ No newline at end of file
+    return ordered
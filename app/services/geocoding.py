@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+import requests
+
+from app.services.db import get_connection
+
+
+# === Paramètres ===
+GEOCODER_BACKEND = os.getenv("GEOCODER_BACKEND", "nominatim")          # "nominatim" ou "static" (hors ligne / tests)
+GEOCODER_STATIC_FILE = os.getenv("GEOCODER_STATIC_FILE", "")           # JSON {adresse: [lat, lng]} pour le backend static
+GEOCODER_TIMEOUT = float(os.getenv("GEOCODER_TIMEOUT", "2.5"))         # secondes (reste sous le délai de réponse d'une page)
+GEOCODE_CACHE_SIZE = int(os.getenv("GEOCODE_CACHE_SIZE", "2048"))      # entrées gardées dans le LRU en mémoire
+GEOCODE_NOT_FOUND_TTL = 24 * 3600                                      # une adresse introuvable est retentée après 1 jour
+
+Coords = tuple[float, float]
+
+
+def normalize_address(address: str) -> str:
+
+    """Clé de cache d'une adresse : sans accents, en minuscules, espaces et ponctuation homogènes."""
+
+    text = unicodedata.normalize("NFKD", address)
+    text = "".join(c for c in text if not unicodedata.combining(c)).casefold()
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\s+", " ", text)
+
+    return text.strip(" ,")
+
+
+# === Backends ===
+class NominatimGeocoder:
+
+    """Géocodage via l'API publique Nominatim (OpenStreetMap)."""
+
+    def __init__(self, url: str = "https://nominatim.openstreetmap.org/search", timeout: float = GEOCODER_TIMEOUT):
+
+        self.url = url
+        self.timeout = timeout
+
+    def geocode(self, address: str) -> Optional[Coords]:
+
+        response = requests.get(
+            self.url,
+            params={"q": address, "format": "json", "limit": 1},
+            headers={"User-Agent": "AppPrototype"},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+
+        return (float(data[0]["lat"]), float(data[0]["lon"])) if data else None
+
+
+class StaticGeocoder:
+
+    """Géocodeur local sans réseau (tests, déploiements hors ligne) : table adresse -> coordonnées."""
+
+    def __init__(self, entries: dict[str, Coords] | None = None):
+
+        self.entries = {normalize_address(address): tuple(coords) for address, coords in (entries or {}).items()}
+
+    @classmethod
+    def from_file(cls, path: str) -> "StaticGeocoder":
+
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def geocode(self, address: str) -> Optional[Coords]:
+
+        return self.entries.get(normalize_address(address))
+
+
+def _make_backend(name: str):
+
+    """Instancie le backend demandé par GEOCODER_BACKEND."""
+
+    if name == "static":
+        return StaticGeocoder.from_file(GEOCODER_STATIC_FILE) if GEOCODER_STATIC_FILE else StaticGeocoder()
+    if name != "nominatim":
+        print(f"⚠️ GEOCODER_BACKEND inconnu '{name}', utilisation de Nominatim.")
+    return NominatimGeocoder()
+
+
+_backend = _make_backend(GEOCODER_BACKEND)
+
+
+def set_geocoder(backend):
+
+    """Remplace le backend de géocodage (objet exposant geocode(adresse) -> (lat, lng) | None) et vide le LRU."""
+
+    global _backend
+    _backend = backend
+    with _lock:
+        _memory.clear()
+
+
+# === Caches ===
+_memory: OrderedDict[str, Optional[Coords]] = OrderedDict()     # LRU : clé normalisée -> coordonnées (None = introuvable)
+_in_flight: dict[str, Future] = {}                               # recherches en cours, partagées entre appelants
+_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="geocoding")
+
+
+def _remember(key: str, coords: Optional[Coords]):
+
+    with _lock:
+        _memory[key] = coords
+        _memory.move_to_end(key)
+        while len(_memory) > GEOCODE_CACHE_SIZE:
+            _memory.popitem(last=False)
+
+
+GEOCODE_CACHE_READ_SQL = "SELECT lat, lng, updated_at FROM geocode_cache WHERE address_key = ?"
+
+
+def _read_cache(key: str) -> tuple[bool, Optional[Coords]]:
+
+    """Lit la table geocode_cache. Retourne (trouvé dans le cache ?, coordonnées)."""
+
+    with get_connection() as conn:
+        row = conn.execute(GEOCODE_CACHE_READ_SQL, (key,)).fetchone()
+
+    if row is None:
+        return False, None
+    if row[0] is None:  # adresse introuvable mémorisée : valable GEOCODE_NOT_FOUND_TTL
+        return time.time() - row[2] < GEOCODE_NOT_FOUND_TTL, None
+    return True, (row[0], row[1])
+
+
+def _write_cache(key: str, address: str, coords: Optional[Coords]):
+
+    lat, lng = coords if coords else (None, None)
+    with get_connection() as conn:
+        conn.execute("""
+            INSERT INTO geocode_cache (address_key, address, lat, lng, updated_at) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(address_key) DO UPDATE SET address = excluded.address, lat = excluded.lat,
+                                                   lng = excluded.lng, updated_at = excluded.updated_at
+        """, (key, address, lat, lng, time.time()))
+        conn.commit()
+
+
+def _resolve(key: str, address: str) -> Optional[Coords]:
+
+    """Cache SQLite puis backend ; le résultat (même négatif) est mémorisé dans les deux niveaux de cache."""
+
+    found, coords = _read_cache(key)
+    if not found:
+        coords = _backend.geocode(address)
+        _write_cache(key, address, coords)
+    _remember(key, coords)
+
+    return coords
+
+
+def _submit(address: str) -> Future:
+
+    """Retourne le Future de la recherche de `address`, en réutilisant celle déjà en cours pour la même adresse."""
+
+    key = normalize_address(address)
+    with _lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            future = Future()
+            future.set_result(_memory[key])
+            return future
+
+        future = _in_flight.get(key)
+        if future is None:
+            future = _executor.submit(_resolve, key, address.strip())
+            _in_flight[key] = future
+            future.add_done_callback(lambda _, key=key: _forget_in_flight(key))
+
+    return future
+
+
+def _forget_in_flight(key: str):
+
+    with _lock:
+        _in_flight.pop(key, None)
+
+
+# === API ===
+def geocode(address: str, timeout: float = GEOCODER_TIMEOUT) -> Optional[Coords]:
+
+    """Coordonnées (lat, lng) d'une adresse, ou None si elle est introuvable. Lève une exception si le backend échoue."""
+
+    return _submit(address).result(timeout=timeout)
+
+
+async def geocode_async(address: str, timeout: float = GEOCODER_TIMEOUT) -> Optional[Coords]:
+
+    """Version asynchrone de geocode() : n'occupe pas la boucle d'événements pendant la requête réseau."""
+
+    # shield : le délai dépassé d'un appelant ne doit pas annuler la recherche partagée avec les autres
+    return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(_submit(address))), timeout)
+
+
+def prefetch_address(address: str | None):
+
+    """Lance le géocodage d'une adresse en arrière-plan (ex : adresse de livraison enregistrée) pour remplir le cache."""
+
+    if address and address.strip():
+        _submit(address).add_done_callback(_log_prefetch_error)
+
+
+def _log_prefetch_error(future: Future):
+
+    if future.exception() is not None:
+        print(f"⚠️ Géocodage anticipé impossible : {future.exception()}")
@@ -1,64 +1,24 @@
-import sqlite3
-from pathlib import Path
-from rapidfuzz import fuzz
-
+from app.services.catalog import get_catalog, invalidate_catalog, refresh_catalog_prices
+from app.services.db import get_connection
 from app.services.file_io import load_json
-
-DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
-DB_PATH = DATA_DIR / 'data.db'
-
-
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+from app.recommendations.interaction_events import interaction_buffer
+from app.recommendations.similarity import refresh_product_similarity
+from app.services.distance import invalidate_pharmacy_index
+from app.services.search_index import get_search_index
 
 
 # === Gestion des produits ===
 def get_product(product_id: int) -> dict | None:
 
-    """Récupérer un produit (et ses composants/tags) depuis la base SQLite."""
+    """Récupérer un produit (et ses composants/tags) depuis la photo en mémoire du catalogue."""
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        # === Table Produit principale ===
-        cursor.execute("""
-            SELECT id, name, provider, image, description, reference, category, age_group, allow_reviews, display_price, allow_order, display_recommendations, ordonnance
-            FROM products
-            WHERE id = ?
-        """, (product_id,))
-        row = cursor.fetchone()
-
-        if not row:
-            return None  # produit inexistant
-
-        product = {
-            "id": row[0], 
-            "name": row[1],
-            "provider": row[2],
-            "image": row[3],
-            "description": row[4],
-            "reference": row[5],
-            "component": [],
-            "tags": [],
-            "category": row[6],
-            "age_group": row[7],
-            "allow_reviews": bool(row[8]),
-            "display_price": bool(row[9]),
-            "allow_order": bool(row[10]),
-            "display_recommendations": bool(row[11]),
-            "ordonnance": bool(row[12])
-        }
+    record = get_catalog().products.get(int(product_id))  # ids du catalogue en int (les routes passent parfois un str)
 
-        # === Récupérer les composants ===
-        cursor.execute("SELECT component FROM product_components WHERE product_id = ?", (product_id,))
-        product["component"] = [comp for (comp,) in cursor.fetchall()]
+    return record.to_dict() if record else None  # None : produit inexistant
+    
 
-        # === Récupérer les tags ===
-        cursor.execute("SELECT tag FROM product_tags WHERE product_id = ?", (product_id,))
-        product["tags"] = [tag for (tag,) in cursor.fetchall()]
+DELETE_PRODUCT_ROWS_SQL = "DELETE FROM {table} WHERE product_id = ?"
 
-        return product
-    
 
 def delete_product(product_id: int) -> bool:
 
@@ -74,27 +34,72 @@ def delete_product(product_id: int) -> bool:
         "product_components",
         "product_tags",
         "pharmacy_products",
+        "product_price_summary",  # après pharmacy_products, dont les triggers réécrivent la ligne
         "user_product_interactions",
+        "user_recommendations",
     ]
 
     try:
         with get_connection() as conn:
             cur = conn.cursor()
 
-            # Supprimer les références dans toutes les tables listées
+            # Oublier les interactions pas encore écrites, puis supprimer les références dans toutes les tables listées
+            interaction_buffer.discard(lambda key: key[1] == product_id)
             for table in tables_to_clean:
-                cur.execute(f"DELETE FROM {table} WHERE product_id = ?", (product_id,))
+                cur.execute(DELETE_PRODUCT_ROWS_SQL.format(table=table), (product_id,))
 
             # Supprimer le produit lui-même
             cur.execute("DELETE FROM products WHERE id = ?", (product_id,))
             
             conn.commit()
+        invalidate_catalog()  # produit, stock et résumé prix supprimés (search_index suit la version du catalogue)
+        refresh_product_similarity(product_id)  # n'a plus ni tags ni composants : retiré de l'index
         return True
     except Exception as e:
         print("Erreur suppression produit:", e)
         return False
     
 
+def get_products(product_ids=None) -> dict[int, dict]:
+
+    """
+    Récupérer plusieurs produits (et leurs composants/tags) depuis la photo en mémoire du catalogue.
+    Si product_ids est None, tout le catalogue est retourné.
+    Retourne un dict {product_id: produit} dans l'ordre des ids, avec le même format que get_product.
+    """
+
+    products = get_catalog().products
+    if product_ids is None:
+        return {pid: record.to_dict() for pid, record in products.items()}
+
+    return {pid: products[pid].to_dict() for pid in sorted({int(pid) for pid in product_ids}) if pid in products}
+
+
+def get_min_prices() -> dict[int, dict]:
+
+    """
+    Retourne le prix le plus bas (quantité > 0) de chaque produit disponible, depuis la photo du catalogue.
+    Même format que get_min_price_for_product : {product_id: {"pharmacy_id", "pharmacy_name", "price"}}
+    """
+
+    return {
+        product_id: {"pharmacy_id": price.pharmacy_id, "pharmacy_name": price.pharmacy_name, "price": price.min_price}
+        for product_id, price in get_catalog().prices.items()
+        if price.min_price is not None
+    }
+
+
+def _ids_with_values(products: dict[int, dict], key: str, values) -> set[int]:
+
+    """Retourne l'ensemble des ids de produits dont la colonne `key` fait partie de `values`."""
+
+    index = {}
+    for pid, product in products.items():
+        index.setdefault(product[key], set()).add(pid)
+
+    return set().union(*(index.get(value, set()) for value in values))
+
+
 def search_filter_product(query: str = "", 
                           selected_tags: list[str] | None = None,
                           selected_filters: dict | None = None,
@@ -107,6 +112,10 @@ def search_filter_product(query: str = "",
       - un ensemble de tags sélectionnés (tous doivent être présents)
       - un dictionnaire de filtres { "categories", "ages", "providers", "prices" }
 
+    Le catalogue est chargé en quelques requêtes groupées, les filtres sont appliqués
+    comme des intersections d'ensembles d'ids, et la recherche floue passe par
+    l'index précalculé de search_index.
+
     Retourne une liste de produits (dicts) correspondant.
     """
 
@@ -119,99 +128,36 @@ def search_filter_product(query: str = "",
         "prices": set(),
     }
 
-    results = []
+    products = get_products()
+    candidates = set(products)
+
+    # === Tags sélectionnés (tous doivent être présents) ===
+    if selected_tags:
+        tag_index = {}
+        for pid, product in products.items():
+            for tag in product["tags"]:
+                tag_index.setdefault(tag, set()).add(pid)
+        for tag in selected_tags:
+            candidates &= tag_index.get(tag, set())
+
+    # === Catégories, tranches d’âge et fournisseurs (au moins une valeur doit correspondre) ===
+    for filter_name, column in (("categories", "category"), ("ages", "age_group"), ("providers", "provider")):
+        if selected_filters[filter_name] and candidates:
+            candidates &= _ids_with_values(products, column, selected_filters[filter_name])
+
+    # === Prix : le prix minimum doit être dans au moins une des tranches (produit indisponible exclu) ===
+    if selected_filters["prices"] and candidates:
+        min_prices = get_min_prices()
+        candidates &= {
+            pid for pid, info in min_prices.items()
+            if any(mn <= info["price"] < mx for (mn, mx) in selected_filters["prices"])
+        }
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM products")
-        for (pid,) in cursor.fetchall():
-            product = get_product(pid)
-            if not product:
-                continue
-
-            # # === Recherche par texte ===
-            # matches_search = (
-            #     (query in product["name"].lower()) or
-            #     any(query in t.lower() for t in product.get("tags", []))
-            # ) if query else True
-
-            # === Recherche par texte (fuzzy) ===
-            matches_search = True
-            if query:
-                # Comparaison du nom
-                name_score = fuzz.partial_ratio(query, product["name"].lower())
-                
-                # Comparaison des tags
-                tags_score = max([fuzz.partial_ratio(query, t.lower()) for t in product.get("tags", [])], default=0)
-                
-                # On accepte si le score minimal est atteint
-                matches_search = max(name_score, tags_score) >= min_score
-
-            if not matches_search:
-                continue
-
-            # === Tags sélectionnés ===
-            matches_tags = (
-                all(t in product.get("tags", []) for t in selected_tags)
-                if selected_tags else True
-            )
-
-            if not matches_tags:
-                continue
-
-            # === Catégories ===
-            matches_category = (
-                product["category"] in selected_filters["categories"]
-                if selected_filters["categories"] else True
-            )
-
-            if not matches_category:
-                continue
-
-            # === Tranches d’âge ===
-            matches_age = (
-                product["age_group"] in selected_filters["ages"]
-                if selected_filters["ages"] else True
-            )
-
-            if not matches_age:
-                continue
-
-            # === Fournisseurs ===
-            matches_provider = (
-                product["provider"] in selected_filters["providers"]
-                if selected_filters["providers"] else True
-            )
-
-            if not matches_provider:
-                continue
-
-            # === Prix ===
-            matches_price = True
-            if selected_filters["prices"]:
-                min_price_found = None
-                price_info = get_min_price_for_product(product["id"])
-                if price_info:
-                    min_price_found = price_info["price"]
-
-                # Si on a trouvé un prix, vérifier qu’il est dans au moins une des tranches sélectionnées
-                if min_price_found is not None:
-                    matches_price = any(
-                        (mn <= min_price_found < mx)
-                        for (mn, mx) in selected_filters["prices"]
-                    )
-                else:
-                    matches_price = False  # produit non disponible
-
-            if not matches_price:
-                continue
-
-            # === Vérification finale ===
-            if all([matches_search, matches_tags, matches_category,
-                    matches_age, matches_provider, matches_price]):
-                results.append(product)
-
-    return results
+    # === Recherche par texte (fuzzy) via l'index précalculé ===
+    if query and candidates:
+        candidates &= get_search_index().match(query, min_score)
+
+    return [product for pid, product in products.items() if pid in candidates]
 
 
 def get_filter_options(column):
@@ -228,18 +174,36 @@ def get_filter_options(column):
 def count_products_in_price_range(min_price, max_price):
 
     """Compte le nombre de produits dont le prix minimum est dans une certaine fourchette."""
-    
+
+    return count_products_by_price_range([(min_price, max_price)])[(min_price, max_price)]
+
+
+def count_products_by_price_range(price_ranges: list[tuple]) -> dict[tuple, int]:
+
+    """
+    Compte en une seule requête (GROUP BY) le nombre de produits dont le prix minimum est dans chaque fourchette.
+    price_ranges : liste de (min, max) ; retourne {(min, max): count}.
+    """
+
+    if not price_ranges:
+        return {}
+
+    # Chaque produit est rangé dans la première fourchette [min, max[ qui contient son prix minimum
+    cases = " ".join(f"WHEN min_price >= ? AND min_price < ? THEN {i}" for i in range(len(price_ranges)))
+    params = [bound for price_range in price_ranges for bound in price_range]
+
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM products")
-        product_ids = [row[0] for row in cursor.fetchall()]
-        count = 0
-        for pid in product_ids:
-            price_info = get_min_price_for_product(pid)
-            if price_info and min_price <= price_info['price'] < max_price:
-                count += 1
-
-        return count
+        cursor.execute(f"""
+            SELECT CASE {cases} END AS bucket, COUNT(*)
+            FROM product_price_summary s
+            JOIN products p ON p.id = s.product_id
+            WHERE s.min_price IS NOT NULL
+            GROUP BY bucket
+        """, params)
+        counts = dict(cursor.fetchall())
+
+    return {price_range: counts.get(i, 0) for i, price_range in enumerate(price_ranges)}
     
 
 def get_pharmacy(pharmacy_id: int) -> dict | None:
@@ -302,6 +266,8 @@ def delete_pharmacy(pharmacy_id: int) -> bool:
             cur.execute("DELETE FROM pharmacies WHERE id = ?", (pharmacy_id,))
 
             conn.commit()
+        invalidate_pharmacy_index()
+        refresh_catalog_prices()
         return True
 
     except Exception as e:
@@ -380,44 +346,52 @@ def get_min_price_for_product(product_id: int) -> dict | None:
     Ex: {"pharmacy_id": 2, "pharmacy_name": "Pharmacie Centrale", "price": 2.99}
     """
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("""
-            SELECT p.id, p.name, pp.price, pp.qty
-            FROM pharmacies p
-            JOIN pharmacy_products pp ON p.id = pp.pharmacy_id
-            WHERE pp.product_id = ? AND pp.qty > 0
-            ORDER BY pp.price ASC
-            LIMIT 1
-        """, (product_id,))
-
-        row = cursor.fetchone()
-        if not row:
-            return None  # produit indisponible dans toutes les pharmacies
+    price = get_catalog().prices.get(int(product_id))
+    if price is None or price.min_price is None:
+        return None  # produit indisponible dans toutes les pharmacies
 
-        return {
-            "pharmacy_id": row[0],
-            "pharmacy_name": row[1],
-            "price": row[2]
-        }
+    return {
+        "pharmacy_id": price.pharmacy_id,
+        "pharmacy_name": price.pharmacy_name,
+        "price": price.min_price
+    }
 
 
 def get_total_qty(product_id: int) -> int:
 
     """Retourne la quantité totale disponible pour un produit dans toutes les pharmacies."""
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT SUM(qty) 
-            FROM pharmacy_products
-            WHERE product_id = ?
-        """, (product_id,))
-        row = cursor.fetchone()
-        return row[0] or 0
+    price = get_catalog().prices.get(int(product_id))
+
+    return price.total_qty if price else 0
+
+
+def get_price_summaries(product_ids=None) -> dict[int, dict]:
+
+    """
+    Retourne le résumé prix/stock de plusieurs produits depuis la photo du catalogue (tous si product_ids est None) :
+    {product_id: {"min_price", "pharmacy_id", "total_qty", "pharmacy_count"}}
+    """
+
+    prices = get_catalog().prices
+    ids = prices.keys() if product_ids is None else [int(pid) for pid in dict.fromkeys(product_ids) if int(pid) in prices]
+
+    return {
+        pid: {"min_price": prices[pid].min_price, "pharmacy_id": prices[pid].pharmacy_id,
+              "total_qty": prices[pid].total_qty, "pharmacy_count": prices[pid].pharmacy_count}
+        for pid in ids
+    }
     
 
+TOTAL_PRICE_FOR_PRODUCT_SQL = """
+    SELECT p.id, p.name, pp.price, pp.qty
+    FROM pharmacies p
+    JOIN pharmacy_products pp ON p.id = pp.pharmacy_id
+    WHERE pp.product_id = ? AND pp.qty > 0
+    ORDER BY pp.price ASC
+"""
+
+
 def get_total_price_for_product(product_id: int, quantity: int) -> dict:
 
     """
@@ -439,13 +413,7 @@ def get_total_price_for_product(product_id: int, quantity: int) -> dict:
         cursor = conn.cursor()
 
         # Récupérer toutes les pharmacies qui ont ce produit, triées par prix croissant
-        cursor.execute("""
-            SELECT p.id, p.name, pp.price, pp.qty
-            FROM pharmacies p
-            JOIN pharmacy_products pp ON p.id = pp.pharmacy_id
-            WHERE pp.product_id = ? AND pp.qty > 0
-            ORDER BY pp.price ASC
-        """, (product_id,))
+        cursor.execute(TOTAL_PRICE_FOR_PRODUCT_SQL, (product_id,))
 
         rows = cursor.fetchall()
 
@@ -479,72 +447,6 @@ def get_total_price_for_product(product_id: int, quantity: int) -> dict:
         }
 
 
-def remove_stock_product(product_id: int, qty: int) -> dict:
-
-    """
-    Retire une certaine quantité d'un produit (répartie sur les pharmacies les moins chères).
-    Ne descend jamais sous 0.
-
-    Retourne un dict avec le détail du retrait :
-    {
-        "success": bool,             # True si toute la quantité a pu être retirée
-        "removed_qty": int,          # quantité effectivement retirée
-        "missing_qty": int,          # quantité manquante si stock insuffisant
-        "details": [                 # détail par pharmacie
-            {"pharmacy_id": 1, "removed": 3},
-            {"pharmacy_id": 2, "removed": 2}
-        ]
-    }
-    """
-
-    with get_connection() as conn:
-        cursor = conn.cursor()
-
-        remaining = qty
-        details = []
-        removed_total = 0
-
-        # Récupérer les pharmacies classées par prix croissant
-        cursor.execute("""
-            SELECT pharmacy_id, price, qty
-            FROM pharmacy_products
-            WHERE product_id = ?
-            ORDER BY price ASC
-        """, (product_id,))
-
-        pharmacies = cursor.fetchall()
-
-        for pharmacy_id, price, stock_qty in pharmacies:
-            if remaining <= 0:
-                break
-
-            if stock_qty <= 0:
-                continue
-
-            # Quantité à retirer dans cette pharmacie
-            to_remove = min(stock_qty, remaining)
-
-            # Mise à jour du stock
-            cursor.execute("""
-                UPDATE pharmacy_products
-                SET qty = qty - ?
-                WHERE product_id = ? AND pharmacy_id = ?
-            """, (to_remove, product_id, pharmacy_id))
-
-            details.append({"pharmacy_id": pharmacy_id, "removed": to_remove})
-            removed_total += to_remove
-            remaining -= to_remove
-
-        conn.commit()
-
-    return {
-        "success": remaining == 0,
-        "removed_qty": removed_total,
-        "missing_qty": remaining,
-        "details": details
-    }
-
-
 # === Gestion des tags ===
 tag_colors = load_json("data/tags.json")
 
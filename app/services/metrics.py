@@ -0,0 +1,53 @@
+import math
+import threading
+from collections import deque
+
+
+class OperationMetrics:
+
+    """
+    Compteurs par résultat et latences d'une opération (ex : prise en charge des commandes), en mémoire.
+
+    - record(outcome, seconds) compte un appel et garde sa durée (les `window` dernières seulement).
+    - snapshot() retourne {"total", "counts": {résultat: n}, "p50_ms", "p95_ms", "max_ms"} pour l'affichage.
+    Les compteurs repartent de zéro au redémarrage de l'application.
+    """
+
+    def __init__(self, name: str, window: int = 1000):
+
+        self.name = name
+
+        self._counts: dict[str, int] = {}
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str, seconds: float):
+
+        with self._lock:
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+            self._latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+
+        with self._lock:
+            counts = dict(self._counts)
+            latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float | None:
+            if not latencies:
+                return None
+            return latencies[max(0, math.ceil(p * len(latencies)) - 1)] * 1000  # rang le plus proche
+
+        return {
+            "total": sum(counts.values()),
+            "counts": counts,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+        }
+
+    def reset(self):
+
+        with self._lock:
+            self._counts.clear()
+            self._latencies.clear()
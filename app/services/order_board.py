@@ -0,0 +1,171 @@
+import threading
+from typing import Callable, Iterable
+
+from app.services.distance import haversine_many
+
+
+class PendingOrderBoard:
+
+    """
+    Tableau en mémoire des commandes en attente, tenu à jour à chaque création, prise en charge
+    ou annulation de commande (au lieu de relire toutes les commandes à chaque affichage).
+
+    - load_fn(order_id) retourne les résumés des commandes en attente ({"id", "lat", "lng", "date", ...}) :
+      toutes si order_id est None, sinon au plus celle-ci (liste vide si elle n'est plus en attente).
+    - refresh_order(order_id) / remove(order_id) mettent à jour une seule commande puis préviennent les abonnés.
+    - orders(lat, lng, ...) retourne les commandes avec leur distance, filtrées et triées côté serveur.
+    - subscribe(callback) : callback() est appelé (dans le thread qui a modifié le tableau) après chaque changement.
+    - changes_fn(after) (optionnel) lit un journal des écritures sur les commandes, quel que soit le processus :
+      retourne (dernier numéro, commandes modifiées après le numéro `after`), ou (dernier numéro, None) si elles
+      ne peuvent pas être connues. sync() (appelé à chaque lecture, après chaque changement local et
+      périodiquement) ne relit que ces commandes, pour voir celles créées ou prises en charge par les autres workers.
+    """
+
+    SYNC_MAX_ORDERS = 50  # au-delà, le tableau est rechargé entièrement plutôt que commande par commande
+
+    def __init__(self, load_fn: Callable[[int | None], list[dict]],
+                 changes_fn: Callable[[int | None], tuple[int, list[int] | None]] | None = None):
+
+        self.load_fn = load_fn
+        self.changes_fn = changes_fn
+        self.version = 0                           # incrémenté à chaque changement
+
+        self._seen_change: int | None = None         # dernier numéro du journal pris en compte
+
+        self._orders: dict[int, dict] | None = None  # chargé au premier accès
+        self._lock = threading.Lock()
+        self._subscribers: list[Callable[[], object]] = []
+
+    # === Lecture ===
+    def _snapshot(self) -> list[dict]:
+
+        with self._lock:
+            if self._orders is not None:
+                return list(self._orders.values())
+            version = self.version
+
+        orders = {order["id"]: order for order in self.load_fn(None)}
+        with self._lock:
+            if self._orders is None and version == self.version:  # pas de changement pendant le chargement
+                self._orders = orders
+            return list((self._orders if self._orders is not None else orders).values())
+
+    def orders(self, lat: float | None = None, lng: float | None = None, max_distance: float | None = None,
+               sort_by: str = "date") -> list[dict]:
+
+        """
+        Commandes en attente (copies), avec "distance" (km, None si position inconnue) depuis (lat, lng).
+        max_distance écarte les commandes géolocalisées trop lointaines ; sort_by : "date" (récentes d'abord) ou "distance".
+        """
+
+        self.sync()
+        orders = [dict(order, distance=None) for order in self._snapshot()]
+
+        if lat is not None and lng is not None:
+            located = [order for order in orders if order["lat"] is not None and order["lng"] is not None]
+            if located:
+                distances = haversine_many(lat, lng, [order["lat"] for order in located], [order["lng"] for order in located])
+                for order, distance in zip(located, distances):
+                    order["distance"] = float(distance)
+            if max_distance is not None:
+                orders = [order for order in orders if order["distance"] is None or order["distance"] <= max_distance]
+
+        orders.sort(key=lambda order: (order["date"] or "", order["id"]), reverse=True)
+        if sort_by == "distance":
+            orders.sort(key=lambda order: (order["distance"] is None, order["distance"] or 0.0))  # tri stable : à distance égale, récentes d'abord
+
+        return orders
+
+    # === Mises à jour ===
+    def refresh_order(self, order_id: int):
+
+        """Relit une commande : ajoutée / mise à jour si elle est en attente, retirée sinon."""
+
+        self.sync((order_id,))
+
+    def remove(self, order_id: int):
+
+        """Retire une commande qui n'est plus en attente (ex : prise en charge par un livreur)."""
+
+        self.sync(removed=(order_id,))
+
+    def invalidate(self):
+
+        """Oublie le tableau (rechargé entièrement au prochain accès), ex : après une modification en masse."""
+
+        with self._lock:
+            self._orders = None
+            self._seen_change = None  # numéro du journal relu avec le rechargement
+            self.version += 1
+        self._notify()
+
+    def sync(self, order_ids: Iterable[int] = (), removed: Iterable[int] = ()) -> bool:
+
+        """
+        Met le tableau à jour : relit les commandes `order_ids` et celles modifiées (par ce processus ou un autre)
+        depuis le dernier numéro du journal vu, retire `removed`, puis retient le nouveau numéro. Un journal
+        incomplet ou trop de commandes modifiées font oublier le tableau (rechargé au prochain accès).
+        Les abonnés sont prévenus s'il y a eu un changement ; retourne True dans ce cas.
+        """
+
+        removed = set(removed)
+        changed: set[int] | None = set(order_ids)
+        last_change = None
+        if self.changes_fn is not None:
+            with self._lock:
+                seen = self._seen_change
+            # Journal lu avant les commandes : toute écriture qu'il contient est vue par la relecture
+            last_change, logged = self.changes_fn(seen)
+            changed = None if logged is None else changed | set(logged)
+            if changed is not None and len(changed) > self.SYNC_MAX_ORDERS:
+                changed = None
+
+        if changed is not None and not changed and not removed:
+            return False
+
+        with self._lock:
+            loaded = self._orders is not None
+        rows = {order_id: self.load_fn(order_id) for order_id in changed} if changed and loaded else {}
+
+        with self._lock:
+            if last_change is not None and (self._seen_change is None or last_change > self._seen_change):
+                self._seen_change = last_change
+            if changed is None:
+                self._orders = None
+            elif self._orders is not None:
+                for order_id in removed - rows.keys():
+                    self._orders.pop(order_id, None)
+                for order_id, found in rows.items():
+                    if found:
+                        self._orders[order_id] = found[0]
+                    else:
+                        self._orders.pop(order_id, None)
+            self.version += 1
+        self._notify()
+
+        return True
+
+    # === Abonnements ===
+    def subscribe(self, callback: Callable[[], object]) -> Callable[[], None]:
+
+        """Abonne `callback` aux changements. Retourne la fonction de désabonnement."""
+
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def _notify(self):
+
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️ Abonné du tableau des commandes en erreur : {e!r}")
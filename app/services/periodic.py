@@ -0,0 +1,54 @@
+import threading
+import traceback
+from typing import Callable
+
+
+class PeriodicTask:
+
+    """
+    Exécute `fn()` dans un thread de fond toutes les `interval` secondes (tâches de maintenance).
+
+    - start() démarre le thread (sans effet s'il tourne déjà), stop() l'arrête.
+    - run_now() exécute la tâche immédiatement dans le thread appelant.
+    Une exception dans `fn` est affichée et n'arrête pas les exécutions suivantes.
+    """
+
+    def __init__(self, fn: Callable[[], object], interval: float, name: str = "periodic"):
+
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def run_now(self):
+
+        try:
+            return self.fn()
+        except Exception:
+            print(f"Erreur de la tâche périodique {self.name} :")
+            traceback.print_exc()
+
+    def start(self):
+
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+
+        self._stopped.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+
+    def _run(self):
+
+        while not self._stopped.wait(self.interval):
+            self.run_now()
@@ -1,11 +1,13 @@
-import sqlite3
-from pathlib import Path
+from app.services.db import get_connection
 
-DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
-DB_PATH = DATA_DIR / 'data.db'
 
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+AVERAGE_RATING_SQL = "SELECT AVG(rating) FROM reviews WHERE product_id = ?"
+REVIEWS_SQL = """
+    SELECT user_id, rating, comment, date, modified
+    FROM reviews
+    WHERE product_id = ?
+    ORDER BY date DESC
+"""
 
 
 def get_review_infos(review_id: int) -> dict | None:
@@ -44,9 +46,7 @@ def get_average_rating(product_id: int):
 
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT AVG(rating) FROM reviews WHERE product_id = ?", (product_id,)
-        )
+        cursor.execute(AVERAGE_RATING_SQL, (product_id,))
         row = cursor.fetchone()
 
         return row[0] if row and row[0] is not None else None
@@ -72,15 +72,7 @@ def get_reviews(product_id: int):
 
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            """
-            SELECT user_id, rating, comment, date, modified
-            FROM reviews
-            WHERE product_id = ?
-            ORDER BY date DESC
-            """,
-            (product_id,),
-        )
+        cursor.execute(REVIEWS_SQL, (product_id,))
         rows = cursor.fetchall()
 
         reviews = []
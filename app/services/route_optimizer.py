@@ -0,0 +1,327 @@
+import time
+import numpy as np
+
+
+HELD_KARP_MAX_STOPS = 10       # au-delà, l'exact (O(2^n · n²)) devient trop coûteux → heuristique + recherche locale
+DEFAULT_TIME_BUDGET = 0.2      # temps max (secondes) accordé à la recherche locale 2-opt / Or-opt
+OR_OPT_MAX_SEGMENT = 3         # taille max des segments déplacés par Or-opt
+
+
+# === Chemins sur une matrice de distances ===
+# Convention : nœud 0 = départ, nœuds 1..n = étapes, nœud n + 1 = arrivée (fixe).
+# Un chemin est la liste des étapes dans l'ordre de visite (départ et arrivée implicites).
+
+def path_length(matrix, order: list[int]) -> float:
+
+    """Longueur totale départ -> étapes dans l'ordre -> arrivée."""
+
+    end = len(matrix) - 1
+    nodes = [0, *order, end]
+
+    return float(sum(matrix[a][b] for a, b in zip(nodes, nodes[1:])))
+
+
+def greedy_order(matrix) -> list[int]:
+
+    """Plus proche voisin depuis le départ, sans tenir compte de l'arrivée (ancienne méthode, gardée comme référence)."""
+
+    unvisited = list(range(1, len(matrix) - 1))
+    order = []
+    current = 0
+    while unvisited:
+        nxt = min(unvisited, key=lambda node: matrix[current][node])
+        unvisited.remove(nxt)
+        order.append(nxt)
+        current = nxt
+
+    return order
+
+
+def cheapest_insertion_order(matrix) -> list[int]:
+
+    """
+    Construction tenant compte de l'arrivée : on part du trajet direct départ -> arrivée
+    et on insère à chaque tour l'étape dont l'insertion (à sa meilleure position) coûte le moins.
+    """
+
+    end = len(matrix) - 1
+    nodes = [0, end]
+    remaining = set(range(1, end))
+
+    while remaining:
+        best = None
+        for node in remaining:
+            for position in range(1, len(nodes)):
+                a, b = nodes[position - 1], nodes[position]
+                delta = matrix[a][node] + matrix[node][b] - matrix[a][b]
+                if best is None or delta < best[0]:
+                    best = (delta, node, position)
+        _, node, position = best
+        nodes.insert(position, node)
+        remaining.remove(node)
+
+    return nodes[1:-1]
+
+
+def held_karp_order(matrix) -> list[int]:
+
+    """Ordre optimal exact par programmation dynamique sur les sous-ensembles d'étapes (Held-Karp)."""
+
+    d = np.asarray(matrix, dtype=float)
+    n = len(d) - 2
+    if n <= 1:
+        return list(range(1, n + 1))
+
+    stops = d[1:n + 1, 1:n + 1]          # distances entre étapes (indices 0..n-1)
+    full = (1 << n) - 1
+
+    # cost[mask, j] : plus court chemin depuis le départ visitant exactement `mask` et finissant en j
+    cost = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int64)
+    for j in range(n):
+        cost[1 << j, j] = d[0, j + 1]
+
+    bits = np.arange(n)
+    for mask in range(1, full + 1):
+        if mask & (mask - 1) == 0:  # un seul élément : déjà initialisé
+            continue
+        js = bits[(mask >> bits) & 1 == 1]
+        # candidates[a, k] : arriver en js[a] depuis k, après avoir visité mask sans js[a]
+        candidates = cost[mask ^ (1 << js)] + stops[:, js].T
+        best = np.argmin(candidates, axis=1)
+        cost[mask, js] = candidates[np.arange(len(js)), best]
+        parent[mask, js] = best
+
+    last = int(np.argmin(cost[full] + d[1:n + 1, n + 1]))
+    order, mask = [], full
+    while last != -1:
+        order.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+
+    return order[::-1]
+
+
+def two_opt(matrix, order: list[int], deadline: float) -> tuple[list[int], bool]:
+
+    """Inverse des segments du chemin tant que cela le raccourcit. Retourne (chemin, amélioré ?)."""
+
+    nodes = [0, *order, len(matrix) - 1]
+    improved_any = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(1, len(nodes) - 2):
+            a, b = nodes[i - 1], nodes[i]
+            for j in range(i + 1, len(nodes) - 1):
+                c, e = nodes[j], nodes[j + 1]
+                if matrix[a][c] + matrix[b][e] < matrix[a][b] + matrix[c][e] - 1e-9:
+                    nodes[i:j + 1] = nodes[i:j + 1][::-1]
+                    b = nodes[i]
+                    improved = improved_any = True
+
+    return nodes[1:-1], improved_any
+
+
+def or_opt(matrix, order: list[int], deadline: float) -> tuple[list[int], bool]:
+
+    """Déplace des segments de 1 à OR_OPT_MAX_SEGMENT étapes (éventuellement inversés) à une meilleure place."""
+
+    nodes = [0, *order, len(matrix) - 1]
+    improved_any = False
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for size in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for i in range(1, len(nodes) - size):
+                segment = nodes[i:i + size]
+                prev, nxt = nodes[i - 1], nodes[i + size]
+                removal_gain = matrix[prev][segment[0]] + matrix[segment[-1]][nxt] - matrix[prev][nxt]
+                rest = nodes[:i] + nodes[i + size:]
+
+                best = None
+                for position in range(1, len(rest)):
+                    a, b = rest[position - 1], rest[position]
+                    for candidate in (segment, segment[::-1]):
+                        delta = matrix[a][candidate[0]] + matrix[candidate[-1]][b] - matrix[a][b] - removal_gain
+                        if delta < -1e-9 and (best is None or delta < best[0]):
+                            best = (delta, position, candidate)
+
+                if best is not None:
+                    _, position, candidate = best
+                    nodes = rest[:position] + candidate + rest[position:]
+                    improved = improved_any = True
+                    break
+            if improved:
+                break
+
+    return nodes[1:-1], improved_any
+
+
+def solve_path(matrix, time_budget: float = DEFAULT_TIME_BUDGET) -> list[int]:
+
+    """
+    Ordre de visite des étapes minimisant la longueur départ -> étapes -> arrivée.
+    Exact (Held-Karp) jusqu'à HELD_KARP_MAX_STOPS étapes, sinon insertion la moins coûteuse
+    puis alternance 2-opt / Or-opt jusqu'à ce qu'aucun mouvement n'améliore ou que le budget soit épuisé.
+    """
+
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix) - 2
+    if n <= HELD_KARP_MAX_STOPS:
+        return held_karp_order(matrix)
+
+    deadline = time.perf_counter() + time_budget
+    rows = matrix.tolist()  # accès scalaire bien plus rapide sur des listes que sur un tableau NumPy
+    order = cheapest_insertion_order(rows)
+    while time.perf_counter() < deadline:
+        order, improved_2opt = two_opt(rows, order, deadline)
+        order, improved_oropt = or_opt(rows, order, deadline)
+        if not improved_2opt and not improved_oropt:
+            break
+
+    return order
+
+
+def open_path_matrix(matrix) -> np.ndarray:
+
+    """Ajoute une arrivée fictive à distance nulle de tous les nœuds (chemin sans point d'arrivée imposé)."""
+
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix)
+    extended = np.zeros((n + 1, n + 1))
+    extended[:n, :n] = matrix
+
+    return extended
+
+
+# === Chemins avec contraintes de précédence (ramassage avant livraison) ===
+PRECEDENCE_EXACT_MAX_STOPS = 12   # programmation dynamique exacte jusqu'à ce nombre d'étapes
+
+
+def _respects_precedence(nodes: list[int], predecessors: dict[int, set[int]]) -> bool:
+
+    """Vrai si chaque étape du chemin apparaît après toutes ses étapes préalables."""
+
+    position = {node: index for index, node in enumerate(nodes)}
+
+    return all(position[before] < position[node] for node, befores in predecessors.items() for before in befores)
+
+
+def held_karp_precedence_order(matrix, predecessors: dict[int, set[int]]) -> list[int]:
+
+    """Held-Karp restreint aux ordres où chaque étape suit ses étapes préalables (`predecessors[étape]`)."""
+
+    d = np.asarray(matrix, dtype=float)
+    n = len(d) - 2
+    if n == 0:
+        return []
+
+    stops = d[1:n + 1, 1:n + 1]
+    full = (1 << n) - 1
+    required = np.zeros(n, dtype=np.int64)  # masque des étapes à avoir visitées avant chaque étape
+    for node, befores in predecessors.items():
+        for before in befores:
+            required[node - 1] |= 1 << (before - 1)
+
+    cost = np.full((1 << n, n), np.inf)
+    parent = np.full((1 << n, n), -1, dtype=np.int64)
+    for j in range(n):
+        if required[j] == 0:
+            cost[1 << j, j] = d[0, j + 1]
+
+    bits = np.arange(n)
+    for mask in range(1, full + 1):
+        if mask & (mask - 1) == 0:
+            continue
+        js = bits[(mask >> bits) & 1 == 1]
+        previous = mask ^ (1 << js)
+        allowed = (required[js] & previous) == required[js]  # étapes préalables déjà visitées
+        js, previous = js[allowed], previous[allowed]
+        if not len(js):
+            continue
+        candidates = cost[previous] + stops[:, js].T
+        best = np.argmin(candidates, axis=1)
+        cost[mask, js] = candidates[np.arange(len(js)), best]
+        parent[mask, js] = best
+
+    last = int(np.argmin(cost[full] + d[1:n + 1, n + 1]))
+    order, mask = [], full
+    while last != -1:
+        order.append(last + 1)
+        mask, last = mask ^ (1 << last), int(parent[mask, last])
+
+    return order[::-1]
+
+
+def precedence_insertion_order(matrix, predecessors: dict[int, set[int]]) -> list[int]:
+
+    """Insertion la moins coûteuse, en n'insérant une étape qu'après toutes ses étapes préalables."""
+
+    end = len(matrix) - 1
+    nodes = [0, end]
+    remaining = set(range(1, end))
+
+    while remaining:
+        best = None
+        for node in remaining:
+            befores = predecessors.get(node, set())
+            if befores & remaining:
+                continue  # une étape préalable n'est pas encore placée
+            first = max((nodes.index(before) for before in befores), default=0) + 1
+            for position in range(first, len(nodes)):
+                a, b = nodes[position - 1], nodes[position]
+                delta = matrix[a][node] + matrix[node][b] - matrix[a][b]
+                if best is None or delta < best[0]:
+                    best = (delta, node, position)
+        _, node, position = best
+        nodes.insert(position, node)
+        remaining.remove(node)
+
+    return nodes[1:-1]
+
+
+def precedence_local_search(matrix, order: list[int], predecessors: dict[int, set[int]], deadline: float) -> list[int]:
+
+    """2-opt et déplacements de segments (Or-opt) en ne gardant que les mouvements qui respectent les précédences."""
+
+    best, best_length = order, path_length(matrix, order)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        n = len(best)
+        moves = [best[:i] + best[i:j + 1][::-1] + best[j + 1:] for i in range(n - 1) for j in range(i + 1, n)]
+        for size in range(1, OR_OPT_MAX_SEGMENT + 1):
+            for i in range(n - size + 1):
+                rest = best[:i] + best[i + size:]
+                segment = best[i:i + size]
+                moves.extend(rest[:p] + segment + rest[p:] for p in range(len(rest) + 1) if p != i)
+
+        for candidate in moves:
+            length = path_length(matrix, candidate)
+            if length < best_length - 1e-9 and _respects_precedence(candidate, predecessors):
+                best, best_length = candidate, length
+                improved = True
+                break
+            if time.perf_counter() >= deadline:
+                break
+
+    return best
+
+
+def solve_path_with_precedence(matrix, predecessors: dict[int, set[int]], time_budget: float = DEFAULT_TIME_BUDGET) -> list[int]:
+
+    """
+    Comme solve_path, avec des contraintes « l'étape b après les étapes predecessors[b] »
+    (ex : livraison d'une commande après le ramassage dans chacune de ses pharmacies).
+    """
+
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix) - 2
+    if n <= PRECEDENCE_EXACT_MAX_STOPS:
+        return held_karp_precedence_order(matrix, predecessors)
+
+    deadline = time.perf_counter() + time_budget
+    rows = matrix.tolist()
+    order = precedence_insertion_order(rows, predecessors)
+
+    return precedence_local_search(rows, order, predecessors, deadline)
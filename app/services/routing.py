@@ -0,0 +1,204 @@
+import asyncio
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from typing import Optional
+import requests
+
+from app.services.distance import haversine_dist, haversine_many
+
+
+# === Paramètres ===
+ROUTING_BACKEND = os.getenv("ROUTING_BACKEND", "osrm")                          # "osrm" ou "local" (hors ligne / tests)
+OSRM_URL = os.getenv("OSRM_URL", "https://router.project-osrm.org")             # serveur compatible OSRM (public ou auto-hébergé)
+ROUTING_TIMEOUT = float(os.getenv("ROUTING_TIMEOUT", "4"))                      # secondes par requête HTTP
+TRAVEL_TIME_CELL_DEG = 0.005        # taille de la cellule d'origine (~500 m) pour le cache des temps de trajet
+TRAVEL_TIME_CACHE_SIZE = 10_000     # nb de couples (cellule d'origine, pharmacie) gardés en mémoire
+TRAVEL_TIME_CACHE_TTL = 3600        # secondes
+
+Coords = tuple[float, float]
+
+
+# === Backends ===
+class OSRMRouter:
+
+    """Routage via l'API HTTP OSRM (services `table` et `route`)."""
+
+    def __init__(self, base_url: str = OSRM_URL, profile: str = "driving", timeout: float = ROUTING_TIMEOUT):
+
+        self.base_url = base_url.rstrip("/")
+        self.profile = profile
+        self.timeout = timeout
+
+    def _get(self, service: str, points: list[Coords], **params) -> dict:
+
+        coordinates = ";".join(f"{lng},{lat}" for lat, lng in points)  # OSRM attend lng,lat
+        response = requests.get(f"{self.base_url}/{service}/v1/{self.profile}/{coordinates}", params=params, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.json()
+        if data.get("code") != "Ok":
+            raise RuntimeError(f"OSRM {service} : {data.get('code')} {data.get('message', '')}")
+
+        return data
+
+    def travel_times(self, origin: Coords, destinations: list[Coords]) -> list[Optional[float]]:
+
+        """Durées (s) de l'origine vers chaque destination, en une seule requête `table`."""
+
+        data = self._get("table", [origin, *destinations], sources="0", annotations="duration")
+
+        return data["durations"][0][1:]
+
+    def route(self, origin: Coords, destination: Coords) -> Optional[dict]:
+
+        """Itinéraire détaillé : {"duration": s, "distance": m, "geometry": [[lat, lng], ...]}."""
+
+        data = self._get("route", [origin, destination], overview="full", geometries="geojson")
+        if not data.get("routes"):
+            return None
+        route = data["routes"][0]
+
+        return {
+            "duration": route["duration"],
+            "distance": route["distance"],
+            "geometry": [[lat, lng] for lng, lat in route["geometry"]["coordinates"]],
+        }
+
+
+class LocalRouter:
+
+    """Routage approché sans réseau : ligne droite, distance allongée d'un facteur de détour, vitesse moyenne fixe."""
+
+    def __init__(self, speed_kmh: float = 30.0, detour_factor: float = 1.3):
+
+        self.speed_kmh = speed_kmh
+        self.detour_factor = detour_factor
+
+    def travel_times(self, origin: Coords, destinations: list[Coords]) -> list[Optional[float]]:
+
+        if not destinations:
+            return []
+        distances = haversine_many(origin[0], origin[1], [d[0] for d in destinations], [d[1] for d in destinations])
+
+        return [float(km * self.detour_factor / self.speed_kmh * 3600) for km in distances]
+
+    def route(self, origin: Coords, destination: Coords) -> Optional[dict]:
+
+        km = haversine_dist(*origin, *destination) * self.detour_factor
+
+        return {
+            "duration": km / self.speed_kmh * 3600,
+            "distance": km * 1000,
+            "geometry": [list(origin), list(destination)],
+        }
+
+
+def _make_backend(name: str):
+
+    """Instancie le backend demandé par ROUTING_BACKEND."""
+
+    if name == "local":
+        return LocalRouter()
+    if name != "osrm":
+        print(f"⚠️ ROUTING_BACKEND inconnu '{name}', utilisation d'OSRM.")
+    return OSRMRouter()
+
+
+_backend = _make_backend(ROUTING_BACKEND)
+_fallback = LocalRouter()  # utilisé si le backend ne répond pas, pour toujours proposer un trajet
+
+
+def set_router(backend):
+
+    """Remplace le backend de routage (objet exposant travel_times() et route()) et vide le cache."""
+
+    global _backend
+    _backend = backend
+    with _lock:
+        _travel_times.clear()
+
+
+# === Cache des temps de trajet ===
+# (cellule d'origine, pharmacy_id) -> (durée en s ou None si pas de route, instant du calcul)
+_travel_times: OrderedDict[tuple[int, int, int], tuple[Optional[float], float]] = OrderedDict()
+_lock = threading.Lock()
+
+
+def _origin_cell(origin: Coords) -> tuple[int, int]:
+
+    return round(origin[0] / TRAVEL_TIME_CELL_DEG), round(origin[1] / TRAVEL_TIME_CELL_DEG)
+
+
+def get_travel_times(origin: Coords, pharmacies: list[dict]) -> dict[int, Optional[float]]:
+
+    """
+    Durées (s) depuis `origin` vers chaque pharmacie ({"id", "lat", "lng"}), None si aucune route.
+    Les couples déjà connus pour la même cellule d'origine viennent du cache ; les autres sont
+    demandés au backend en une seule requête matricielle.
+    """
+
+    cell = _origin_cell(origin)
+    now = time.time()
+    times, missing = {}, []
+
+    with _lock:
+        for pharmacy in pharmacies:
+            cached = _travel_times.get((*cell, pharmacy["id"]))
+            if cached is not None and now - cached[1] < TRAVEL_TIME_CACHE_TTL:
+                times[pharmacy["id"]] = cached[0]
+            else:
+                missing.append(pharmacy)
+
+    if missing:
+        destinations = [(pharmacy["lat"], pharmacy["lng"]) for pharmacy in missing]
+        try:
+            durations = _backend.travel_times(origin, destinations)
+        except Exception:
+            print("Erreur du service de routage, estimation locale des temps de trajet :")
+            traceback.print_exc()
+            durations = _fallback.travel_times(origin, destinations)
+        else:
+            with _lock:
+                for pharmacy, duration in zip(missing, durations):
+                    _travel_times[(*cell, pharmacy["id"])] = (duration, now)
+                    _travel_times.move_to_end((*cell, pharmacy["id"]))
+                while len(_travel_times) > TRAVEL_TIME_CACHE_SIZE:
+                    _travel_times.popitem(last=False)
+        times.update({pharmacy["id"]: duration for pharmacy, duration in zip(missing, durations)})
+
+    return times
+
+
+def best_route(origin: Coords, pharmacies: list[dict]) -> Optional[dict]:
+
+    """
+    Choisit la pharmacie la plus rapide à rejoindre et calcule son itinéraire.
+    Retourne {"pharmacy", "duration", "distance", "geometry"} ou None si aucune n'est joignable.
+    """
+
+    times = get_travel_times(origin, pharmacies)
+    reachable = [pharmacy for pharmacy in pharmacies if times.get(pharmacy["id"]) is not None]
+    if not reachable:
+        return None
+
+    pharmacy = min(reachable, key=lambda pharmacy: times[pharmacy["id"]])
+    destination = (pharmacy["lat"], pharmacy["lng"])
+    try:
+        route = _backend.route(origin, destination)
+    except Exception:
+        print("Erreur du service de routage, itinéraire approché :")
+        traceback.print_exc()
+        route = _fallback.route(origin, destination)
+    if route is None:
+        return None
+
+    return {"pharmacy": pharmacy, **route}
+
+
+async def best_route_async(origin: Coords, pharmacies: list[dict]) -> Optional[dict]:
+
+    """Version asynchrone de best_route() : les appels HTTP tournent dans un thread."""
+
+    return await asyncio.to_thread(best_route, origin, pharmacies)
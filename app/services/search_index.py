@@ -0,0 +1,73 @@
+import threading
+from rapidfuzz import fuzz, process
+
+from app.services.catalog import CatalogSnapshot, catalog_version, get_catalog
+
+
+class SearchIndex:
+
+    """
+    Index de recherche floue sur les noms et les tags des produits.
+    Chaque chaîne distincte (en minuscules) n'apparaît qu'une fois dans la liste des choix,
+    associée à l'ensemble des produits qui la portent : un tag partagé par 500 produits
+    n'est donc scoré qu'une seule fois par recherche.
+    """
+
+    def __init__(self, product_rows, tag_rows):
+
+        """product_rows : itérable de (product_id, name) ; tag_rows : itérable de (product_id, tag)."""
+
+        owners: dict[str, set[int]] = {}
+        for product_id, text in (*product_rows, *tag_rows):
+            if text:
+                owners.setdefault(text.lower(), set()).add(product_id)
+
+        self.version = -1                      # version du catalogue indexée (voir get_search_index)
+        self.choices = list(owners)            # chaînes distinctes pré-normalisées
+        self.owners = list(owners.values())    # owners[i] = ids des produits portant choices[i]
+
+    def match(self, query: str, min_score: int = 80) -> set[int]:
+
+        """Retourne les ids des produits dont le nom ou un tag atteint `min_score` (partial_ratio) pour la requête."""
+
+        query = query.lower().strip() if query else ""
+        if not query:
+            return set().union(*self.owners)
+
+        # Un seul appel rapidfuzz (boucle en C) pour toutes les chaînes distinctes
+        matches = process.extract(query, self.choices, scorer=fuzz.partial_ratio, score_cutoff=min_score, limit=None)
+
+        return set().union(*(self.owners[index] for _, _, index in matches))
+
+
+_index: SearchIndex | None = None
+_index_lock = threading.Lock()
+
+
+def build_search_index(catalog: CatalogSnapshot) -> SearchIndex:
+
+    """Construit l'index à partir des noms et des tags de la photo du catalogue."""
+
+    product_rows = [(product.id, product.name) for product in catalog.products.values()]
+    tag_rows = [(product.id, tag) for product in catalog.products.values() for tag in product.tags]
+
+    return SearchIndex(product_rows, tag_rows)
+
+
+def get_search_index() -> SearchIndex:
+
+    """Retourne l'index partagé, reconstruit quand la version du catalogue a changé."""
+
+    global _index
+
+    index = _index
+    if index is None or index.version != catalog_version():
+        with _index_lock:
+            index = _index
+            if index is None or index.version != catalog_version():
+                catalog = get_catalog()
+                index = build_search_index(catalog)
+                index.version = catalog.version
+                _index = index
+
+    return index
@@ -1,11 +1,4 @@
-import sqlite3
-from pathlib import Path
-
-DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
-DB_PATH = DATA_DIR / 'data.db'
-
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+from app.services.db import get_connection
 
 
 def get_setting(key, default=None):
@@ -0,0 +1,75 @@
+from fastapi import Request
+
+from app.services.auth import get_current_user
+from app.services.db import get_connection
+from app.services.users import USER_INFO_COLUMNS, user_info_from_row
+
+
+# Une seule requête pour tout ce dont une page et sa barre de navigation ont besoin
+_CONTEXT_QUERY = f"""
+    SELECT
+        {USER_INFO_COLUMNS},
+        (SELECT balance FROM wallets WHERE user_id = u.id),
+        (SELECT SUM(quantity) FROM panier WHERE user_id = u.id),
+        (SELECT COUNT(*) FROM order_headers WHERE user_id = u.id AND status IN ('in_progress', 'pending')),
+        (SELECT value FROM settings WHERE key = 'site_name')
+    FROM users u
+    WHERE u.id = ?
+"""
+
+
+def _load_user_context(user_id: int | None) -> dict:
+
+    """Charge en une requête le contexte d'un utilisateur (infos, wallet, panier, commandes en cours, nom du site)."""
+
+    context = {
+        "user_id": None,
+        "user_info": None,
+        "wallet_balance": 0.0,
+        "panier_count": 0,
+        "orders_in_progress": 0,
+        "site_name": None,
+    }
+
+    with get_connection() as conn:
+        cursor = conn.cursor()
+
+        row = None
+        if user_id:
+            cursor.execute(_CONTEXT_QUERY, (user_id,))
+            row = cursor.fetchone()
+
+        if not row:  # visiteur non connecté (ou utilisateur supprimé) : seul le nom du site est utile
+            cursor.execute("SELECT value FROM settings WHERE key = 'site_name'")
+            site = cursor.fetchone()
+            context["site_name"] = site[0] if site else None
+            return context
+
+    context.update({
+        "user_id": user_id,
+        "user_info": user_info_from_row(row),
+        "wallet_balance": row[10] if row[10] is not None else 0.0,
+        "panier_count": row[11] or 0,
+        "orders_in_progress": row[12] or 0,
+        "site_name": row[13],
+    })
+
+    return context
+
+
+def get_user_context(request: Request) -> dict:
+
+    """
+    Retourne le contexte de l'utilisateur courant pour la requête en cours (utilisateur, wallet, panier,
+    commandes en cours, nom du site). Chargé au premier appel puis mémorisé dans request.state : la page
+    et la navbar partagent le même résultat au lieu de refaire chacune leurs requêtes. Une page qui modifie
+    le wallet ou le panier se recharge (ui.navigate.reload) : la nouvelle requête relit le contexte.
+    """
+
+    context = getattr(request.state, "user_context", None)
+    if context is None:
+        context = _load_user_context(get_current_user())
+        request.state.user_context = context
+
+    return context
+
@@ -1,30 +1,34 @@
-import sqlite3
 from datetime import datetime, timedelta
-from pathlib import Path
+from functools import lru_cache
 from nicegui import ui
+import os
 import re
+import time
 from fastapi import Request
 
+from app.recommendations.interaction_events import interaction_buffer
 from app.security.passwords import hash_password
-from app.services.items import get_total_price_for_product, get_product
+from app.services.db import get_connection, immediate_transaction
+from app.services.geocoding import prefetch_address
+from app.services.items import get_product
+from app.services.metrics import OperationMetrics
+from app.services.order_board import PendingOrderBoard
+from app.services.periodic import PeriodicTask
+from app.services.write_buffer import WriteBehindBuffer
 from app.translations.translations import t
 
-DATA_DIR = Path(__file__).resolve().parents[1] / 'data'
-DB_PATH = DATA_DIR / 'data.db'
 
-
-def get_connection():
-    return sqlite3.connect(DB_PATH)
+# === Gestion des utilisateurs ===
+GET_ID_FROM_USERNAME_SQL = "SELECT id FROM users WHERE username = ?"
 
 
-# === Gestion des utilisateurs ===
 def get_id_from_username(username: str) -> int | None:
 
     """Retourne l'ID d'un utilisateur à partir de son username."""
 
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        cursor.execute(GET_ID_FROM_USERNAME_SQL, (username,))
         row = cursor.fetchone()
 
         return row[0] if row else None
@@ -42,36 +46,43 @@ def get_user_from_id(user_id: int) -> str | None:
         return row[0] if row else None
 
 
-def get_user_info(user_id: int) -> tuple | None:
+# Colonnes de users exposées par get_user_info (partagées avec le contexte utilisateur de requête)
+USER_INFO_COLUMNS = "username, email, password, is_delivery_person, is_admin, is_confirmed, allow_comments, confirmation_code, code_expiration_date, delivery_address"
+
+
+def user_info_from_row(row) -> dict:
+
+    """Construit le dict d'informations utilisateur à partir d'une ligne SELECT USER_INFO_COLUMNS."""
+
+    return {
+        "username": row[0],
+        "email": row[1],
+        "password": row[2],
+        "is_delivery_person": bool(row[3]),
+        "is_admin": bool(row[4]),
+        "is_confirmed": bool(row[5]),
+        "allow_comments": bool(row[6]),
+        "confirmation_code": row[7],
+        "code_expiration_date": row[8],
+        "delivery_address": row[9]
+    }
+
+
+def get_user_info(user_id: int) -> dict | None:
 
     """Retourne les informations disponibles pour un utilisateur, ou None s'il n'existe pas."""
 
     with get_connection() as conn:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT username, email, password, is_delivery_person, is_admin, is_confirmed, allow_comments, confirmation_code, code_expiration_date, delivery_address FROM users WHERE id = ?", (user_id,)
-        )
+        cursor.execute(f"SELECT {USER_INFO_COLUMNS} FROM users WHERE id = ?", (user_id,))
 
         row = cursor.fetchone()  # -> tuple avec les infos ou None
 
         if not row:
             return None  # utilisateur inexistant
-        
-        user = {
-            "username": row[0],
-            "email": row[1],
-            "password": row[2],
-            "is_delivery_person": bool(row[3]),
-            "is_admin": bool(row[4]),
-            "is_confirmed": bool(row[5]),
-            "allow_comments": bool(row[6]),
-            "confirmation_code": row[7],
-            "code_expiration_date": row[8],
-            "delivery_address": row[9]
-        }
-        
-        return user
-    
+
+        return user_info_from_row(row)
+
 
 def add_user(username: str, password: str, email: str) -> list[bool, bool]:
 
@@ -227,6 +238,9 @@ def update_user(user_id: int, email: str | None, password: str | None, address:
         cursor = conn.cursor()
         cursor.execute(query, tuple(values))
         conn.commit()
+
+    if address:
+        prefetch_address(address)  # adresse de livraison géocodée à l'avance, prête pour la page de commande
     
     # """Met à jour l'email, le mot de passe et/ou l'adresse d'un utilisateur."""
     
@@ -270,53 +284,83 @@ def delete_user(user_id: int) -> bool:
                 "panier",
                 "wallet_history",
                 "wallets",
-                "orders",
-                "user_product_interactions"
+                "user_product_interactions",
+                "user_recommendations"
             ]
             for table in tables_with_user_id:
                 cur.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
 
+            # Commandes : lignes puis en-têtes
+            cur.execute("DELETE FROM orders WHERE order_id IN (SELECT id FROM order_headers WHERE user_id = ?)", (user_id,))
+            cur.execute("DELETE FROM order_headers WHERE user_id = ?", (user_id,))
+
+            # Oublier les visites et interactions pas encore écrites
+            visit_buffer.discard(lambda key: key[0] == user_id)
+            interaction_buffer.discard(lambda key: key[0] == user_id)
+
             # Enfin supprimer l'utilisateur
             cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
 
             conn.commit()
-            return True
+
+        pending_orders.invalidate()  # ses commandes en attente disparaissent du tableau
+        return True
     except Exception as e:
         print(f"Erreur suppression utilisateur {user_id}: {e}")
         return False
 
 
 # === Gestion des  visites ===
-def record_visit(user_id: int, page_path: str):
+# Les visites sont comptées en mémoire puis écrites par lots (un upsert executemany) par un thread de fond,
+# pour ne pas payer une écriture + commit sur chaque chargement de page.
+VISIT_FLUSH_INTERVAL = float(os.getenv("VISIT_FLUSH_INTERVAL", "5"))    # secondes entre deux écritures
+VISIT_BUFFER_MAX_SIZE = int(os.getenv("VISIT_BUFFER_MAX_SIZE", "1000"))  # nb de (user, page) déclenchant une écriture anticipée
+
+
+@lru_cache(maxsize=4096)
+def _cached_display_page(page: str) -> str:
+
+    """get_display_page mis en cache (les noms de produits ne sont pas modifiables)."""
 
-    """Incrémente le compteur de visites pour une page donnée."""
+    return get_display_page(page)
 
-    display_page = get_display_page(page_path)
+
+def _display_page_or_raw(page: str) -> str:
+
+    """get_display_page, ou le chemin brut (jamais mis en cache) si la page est celle d'un produit supprimé."""
+
+    match = re.match(PRODUCT_PAGE_PATTERN, page)
+    if match and get_product(match.group(1)) is None:
+        return page
+
+    return _cached_display_page(page)
+
+
+VISIT_FLUSH_SQL = """
+    INSERT INTO user_history (user_id, page, display_page, visits) VALUES (?, ?, ?, ?)
+    ON CONFLICT(user_id, page) DO UPDATE SET visits = visits + excluded.visits
+"""
+VISIT_HISTORY_SQL = "SELECT page, display_page, visits FROM user_history WHERE user_id = ?"
+
+
+def _flush_visits(visits: dict[tuple[int, str], int]):
+
+    """Écrit un lot de visites {(user_id, page): nombre} en une seule requête upsert."""
+
+    rows = [(user_id, page, _display_page_or_raw(page), count) for (user_id, page), count in visits.items()]
 
     with get_connection() as conn:
-        cursor = conn.cursor()
+        conn.executemany(VISIT_FLUSH_SQL, rows)
 
-        # Vérifier si une ligne existe déjà pour ce user et cette page brute
-        cursor.execute(
-            "SELECT visits FROM user_history WHERE user_id = ? AND page = ?",
-            (user_id, page_path),
-        )
-        row = cursor.fetchone()
 
-        if row:
-            # Incrémenter simplement le compteur
-            cursor.execute(
-                "UPDATE user_history SET visits = visits + 1 WHERE user_id = ? AND page = ?",
-                (user_id, page_path),
-            )
-        else:
-            # Insère une nouvelle ligne avec page brute + display page
-            cursor.execute(
-                "INSERT INTO user_history (user_id, page, display_page, visits) VALUES (?, ?, ?, ?)",
-                (user_id, page_path, display_page, 1),
-            )
+visit_buffer = WriteBehindBuffer(_flush_visits, interval=VISIT_FLUSH_INTERVAL, max_size=VISIT_BUFFER_MAX_SIZE, name="visits")
 
-        conn.commit()
+
+def record_visit(user_id: int, page_path: str):
+
+    """Incrémente le compteur de visites pour une page donnée (écrit en base de manière différée)."""
+
+    visit_buffer.add((user_id, page_path))
 
 
 def get_visit_history(user_id: int):
@@ -327,20 +371,25 @@ def get_visit_history(user_id: int):
         cursor = conn.cursor()
 
         # Récupérer l'historique
-        cursor.execute(
-            "SELECT page, display_page, visits FROM user_history WHERE user_id = ?", (user_id,)
-        )
+        cursor.execute(VISIT_HISTORY_SQL, (user_id,))
+        history = {page: (display_page, count) for page, display_page, count in cursor.fetchall()}
 
-        return {page: (display_page, count) for page, display_page, count in cursor.fetchall()}
+    # Ajouter les visites pas encore écrites en base
+    for (_, page), count in visit_buffer.pending(lambda key: key[0] == user_id).items():
+        display_page, visits = history.get(page) or (_display_page_or_raw(page), 0)
+        history[page] = (display_page, visits + count)
+
+    return history
     
 
+PRODUCT_PAGE_PATTERN = r"^/product/(\d+)(/.*|\?.*)?$"
+
+
 def get_display_page(page: str):
 
     """Retourne le nom de la page à partir d'un chemin"""
 
-    pattern = r"^/product/(\d+)(/.*|\?.*)?$"
-
-    match = re.match(pattern, page)
+    match = re.match(PRODUCT_PAGE_PATTERN, page)
     
     if match:
         product_id = match.group(1)
@@ -433,6 +482,9 @@ def remove_panier_item(user_id: int, product_id: str, request: Request, remove_a
             ui.navigate.reload()
 
 
+GET_PANIER_SQL = "SELECT product_id, quantity FROM panier WHERE user_id = ?"
+
+
 def get_panier(user_id: int):
 
     """
@@ -444,11 +496,7 @@ def get_panier(user_id: int):
         cursor = conn.cursor()
 
         # Récupération des produits + quantités
-        cursor.execute("""
-            SELECT product_id, quantity
-            FROM panier
-            WHERE user_id = ?
-        """, (user_id,))
+        cursor.execute(GET_PANIER_SQL, (user_id,))
         
         return {r[0]: r[1] for r in cursor.fetchall()}
     
@@ -486,260 +534,187 @@ def delete_panier(user_id: int):
         conn.commit()
 
 
-# === Gestion du wallet ===
-def get_wallet_balance(user_id: int) -> float:
+# === Gestion des commandes ===
+def get_order_history(user_id: int):
 
-    """Retourne le solde du wallet d'un utilisateur."""
+    """Récupère les commandes passées par un utilisateur sous forme {order_id: (date, total_amount, items)}, incluant les frais de livraison."""
 
     with get_connection() as conn:
-        cursor = conn.cursor()
-
-        cursor.execute("SELECT balance FROM wallets WHERE user_id = ?", (user_id,))
-        row = cursor.fetchone()
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT 
+                h.id,
+                h.date,
+                h.total AS total_amount,
+                GROUP_CONCAT(p.name || ' x' || o.qty, ', ')
+                    || CASE WHEN h.delivery_fee > 0 THEN ', Frais de livraison' ELSE '' END AS items
+            FROM order_headers h
+            LEFT JOIN orders o ON o.order_id = h.id
+            LEFT JOIN products p ON o.product_id = p.id
+            WHERE h.user_id = ?
+            GROUP BY h.id
+            ORDER BY h.date DESC
+        """, (user_id,))
 
-        return row[0] if row else 0.0
+        return cur.fetchall()
 
+        
 
-def add_wallet_balance(user_id: int, amount: float, request: Request, is_expense: bool = False):
+# Requête de _load_orders et conditions (sur order_headers) passées par les fonctions ci-dessous
+ORDERS_SQL = """
+    SELECT h.id, o.product_id, o.qty, o.total_price, o.pharmacy_id, h.date, h.address, h.latitude, h.longitude,
+           h.status, h.delivery_fee, h.total, cu.username, dp.username, COALESCE(p.name, 'Inconnu')
+    FROM order_headers h
+    LEFT JOIN orders o ON o.order_id = h.id
+    LEFT JOIN products p ON p.id = o.product_id
+    LEFT JOIN users cu ON cu.id = h.user_id
+    LEFT JOIN users dp ON dp.id = h.delivery_person_id
+    WHERE h.id IN (SELECT id FROM order_headers WHERE {order_filter})
+    ORDER BY h.date DESC, h.id DESC, o.id
+"""
+ORDER_FILTER_ID = "id = ?"
+ORDER_FILTER_LAST = "id = (SELECT id FROM order_headers WHERE user_id = ? ORDER BY date DESC, id DESC LIMIT 1)"
+ORDER_FILTER_PENDING = "status = 'pending'"
+ORDER_FILTER_PENDING_ID = "id = ? AND status = 'pending'"
+ORDER_FILTER_DELIVERY_PERSON = "status = ? AND delivery_person_id = ?"
+ORDER_FILTER_CUSTOMER = "status = ? AND user_id = ?"
+
+
+def _load_orders(order_filter: str, params: tuple = ()) -> list[dict]:
 
-    """Ajoute ou retire de l'argent du wallet d'un utilisateur."""
+    """
+    Charge en une seule requête (jointure order_headers / orders / products / users) toutes les commandes
+    dont l'en-tête satisfait `order_filter` (condition SQL sur la table order_headers, ex : "status = ? AND user_id = ?").
 
-    lang_cookie = request.cookies.get("language", "fr")
+    Retourne une liste de commandes, les plus récentes en premier :
+    {
+        "order_id", "customer", "delivery_person", "status", "date", "address", "lat", "lng",
+        "delivery_cost", "total",
+        "items": [{"product_id", "pharmacy_id", "name", "qty", "price"}, ...]
+    }
+    """
 
     with get_connection() as conn:
-        cursor = conn.cursor()
-
-        current_balance = get_wallet_balance(user_id)
-        today = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-        if is_expense:
-            if current_balance < amount:
-                ui.notify(t("insufficient_balance_2", lang_cookie), color="negative")
-                return
-            new_balance = current_balance - amount
-            cursor.execute(
-                "INSERT INTO wallet_history (user_id, date, amount, description) VALUES (?, ?, ?, ?)",
-                (user_id, today, -amount, "Dépense"),
-            )
-        else:
-            new_balance = current_balance + amount
-            cursor.execute(
-                "INSERT INTO wallet_history (user_id, date, amount, description) VALUES (?, ?, ?, ?)",
-                (user_id, today, amount, "Recharge"),
-            )
-
-        # Mettre à jour ou insérer le solde
-        cursor.execute(
-            "INSERT INTO wallets (user_id, balance) VALUES (?, ?) "
-            "ON CONFLICT(user_id) DO UPDATE SET balance = ?",
-            (user_id, new_balance, new_balance),
-        )
-
-        conn.commit()
-
+        cur = conn.cursor()
+        cur.execute(ORDERS_SQL.format(order_filter=order_filter), params)
+        rows = cur.fetchall()
 
-def get_wallet_history(user_id: int):
+    orders = {}
+    for order_id, product_id, qty, total_price, pharmacy_id, date, address, lat, lng, status, delivery_fee, total, customer, delivery_person, name in rows:
+        order = orders.get(order_id)
+        if order is None:
+            order = orders[order_id] = {
+                "order_id": order_id,
+                "customer": customer,
+                "delivery_person": delivery_person,
+                "status": status,
+                "date": date,
+                "address": address,
+                "lat": lat,
+                "lng": lng,
+                "delivery_cost": delivery_fee,
+                "total": total,
+                "items": []
+            }
 
-    """Retourne l'historique des transactions du wallet d'un utilisateur."""
+        if product_id is not None:  # None : commande sans ligne produit
+            order["items"].append({
+                "product_id": product_id,
+                "pharmacy_id": pharmacy_id,
+                "name": name,
+                "qty": qty,
+                "price": total_price / qty if qty > 0 else total_price
+            })
 
-    with get_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT date, amount, description FROM wallet_history WHERE user_id = ? ORDER BY date DESC",
-            (user_id,),
-        )
+    return list(orders.values())
 
-        return cursor.fetchall()
-    
 
-# === Gestion des commandes ===
-def register_order(user_id: int, delivery_fee: float = 0, lat: float | None = None, lng: float | None = None, address: str | None = None):
+def get_order_details(order_id: int):
 
-    """
-    Crée une nouvelle commande pour l'utilisateur :
-    - récupère son panier
-    - calcule le total pour chaque produit
-    - insère chaque produit dans la table orders avec un order_id unique par commande
-    """
-    
-    today = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    panier = get_panier(user_id)
-    if not panier:
-        print("⚠️ Le panier est vide.")
-        return
+    """Récupère les détails d'une commande spécifique."""
 
-    with get_connection() as conn:
-        cur = conn.cursor()
+    orders = _load_orders(ORDER_FILTER_ID, (order_id,))
 
-        # Générer un nouvel order_id unique
-        cur.execute("SELECT MAX(order_id) FROM orders")
-        row = cur.fetchone()
-        new_order_id = (row[0] or 0) + 1
-
-        for product_id, qty in panier.items():
-            details = get_total_price_for_product(product_id, qty)['details']
-            for pharma_product in details:
-                pharmacy_id = pharma_product['pharmacy_id']
-                total_price = pharma_product['unit_price'] * pharma_product['taken_qty']
-
-            cur.execute("""
-                INSERT INTO orders (order_id, user_id, product_id, qty, total_price, pharmacy_id, date, status, latitude, longitude, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (new_order_id, user_id, product_id, qty, total_price, pharmacy_id, today, "pending", lat, lng, address))
+    return orders[0] if orders else None
         
-        if delivery_fee:
-            cur.execute("""
-                INSERT INTO orders (order_id, user_id, product_id, qty, total_price, date, status, latitude, longitude, address)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (new_order_id, user_id, 0, 0, delivery_fee, today, "pending", lat, lng, address))  # product_id 0 = frais de livraison
 
-        conn.commit()
+def get_last_order(user_id: int):
 
+    """Récupère la dernière commande complète d'un utilisateur."""
 
-def get_order_history(user_id: int):
+    orders = _load_orders(ORDER_FILTER_LAST, (user_id,))
 
-    """Récupère les commandes passées par un utilisateur sous forme {order_id: (date, total_amount, items)}, incluant les frais de livraison."""
+    return orders[0] if orders else None  # None si aucun historique de commande
+    
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT 
-                o.order_id,
-                o.date,
-                SUM(o.total_price) AS total_amount,
-                GROUP_CONCAT(
-                    CASE 
-                        WHEN o.product_id = 0 THEN 'Frais de livraison'
-                        ELSE p.name || ' x' || o.qty
-                    END,
-                    ', '
-                ) AS items
-            FROM orders o
-            LEFT JOIN products p ON o.product_id = p.id
-            WHERE o.user_id = ?
-            GROUP BY o.order_id, o.date
-            ORDER BY o.date DESC
-        """, (user_id,))
+def _load_pending_orders(order_id: int | None = None) -> list[dict]:
 
-        return cur.fetchall()
+    """Résumés des commandes en attente (toutes, ou seulement `order_id` si elle est encore en attente)."""
 
-        
+    if order_id is None:
+        orders = _load_orders(ORDER_FILTER_PENDING)
+    else:
+        orders = _load_orders(ORDER_FILTER_PENDING_ID, (order_id,))
 
-def get_order_details(order_id: int):
+    pending = []
+    for order in orders:
+        items = {}
+        for item in order["items"]:
+            items[item["name"]] = items.get(item["name"], 0) + item["qty"]
 
-    """Récupère les détails d'une commande spécifique."""
+        pending.append({
+            "id": order["order_id"],
+            "customer": order["customer"],
+            "items": items,
+            "total": order["total"],
+            "delivery_cost": order["delivery_cost"],
+            "date": order["date"],
+            "lat": order["lat"],
+            "lng": order["lng"],
+            "address": order["address"]
+        })
 
-    with get_connection() as conn:
-        cur = conn.cursor()
+    return pending
 
-        cur.execute("""
-                SELECT product_id, qty, total_price, user_id, pharmacy_id, date, address, latitude, longitude, status
-                FROM orders
-                WHERE order_id = ?
-            """, (order_id,))
-        rows = cur.fetchall()
 
-        if not rows:
-            return None
-
-        items = []
-        total = 0.0
-
-        for product_id, qty, total_price, user_id, pharmacy_id, date, address, latitude, longitude, status in rows:
-
-            if product_id != 0:
-                product = get_product(product_id)
-                items.append({
-                    "product_id": product_id,
-                    "pharmacy_id": pharmacy_id,
-                    "name": product.get("name", "Inconnu") if product else "Inconnu",
-                    "qty": qty,
-                    "price": total_price / qty if qty > 0 else total_price
-                })
-                total += total_price
-            else:  # product id 0 = frais de livraison
-                delivery_cost = total_price
-
-        return {
-            "order_id": order_id,
-            "customer": get_user_from_id(rows[0][3]),
-            "date": rows[0][5],
-            "address": rows[0][6],
-            "lat": rows[0][7],
-            "lng": rows[0][8],
-            "status": rows[0][9],
-            "delivery_cost": delivery_cost,
-            "total": total + delivery_cost,
-            "items": items
-        }
-        
+ORDER_CHANGES_SQL = "SELECT seq, order_id FROM order_changes WHERE seq > ? ORDER BY seq"
+LAST_ORDER_CHANGE_SQL = "SELECT MAX(seq) FROM order_changes"
 
-def get_last_order(user_id: int):
 
-    """Récupère la dernière commande complète d'un utilisateur."""
+def _order_changes(after: int | None) -> tuple[int, list[int] | None]:
+
+    """
+    Lit le journal order_changes (rempli par trigger à chaque écriture sur order_headers, quel que soit le worker).
+    Retourne (dernier numéro, commandes modifiées après `after`) ; None à la place des commandes si elles ne
+    peuvent pas être connues (premier appel, ou lignes déjà purgées du journal).
+    """
 
     with get_connection() as conn:
-        cur = conn.cursor()
+        if after is not None:
+            rows = conn.execute(ORDER_CHANGES_SQL, (after,)).fetchall()
+            if not rows:
+                return after, []
+            if rows[0][0] == after + 1:  # journal complet depuis `after`
+                return rows[-1][0], [order_id for _, order_id in rows]
+        last = conn.execute(LAST_ORDER_CHANGE_SQL).fetchone()[0]
 
-        # Étape 1 : trouver le dernier order_id de l'utilisateur
-        cur.execute("""
-            SELECT order_id, MAX(date)
-            FROM orders
-            WHERE user_id = ?
-        """, (user_id,))
-        last_order = cur.fetchone()
+    return last or 0, None
 
-        if not last_order or not last_order[0]:
-            return None  # aucun historique de commande
 
-        order_id = last_order[0]
+# Commandes en attente gardées en mémoire et mises à jour à chaque création / prise en charge / annulation.
+# Les écritures des autres workers sont lues dans le journal order_changes (à chaque lecture et périodiquement,
+# pour prévenir les pages abonnées) : seules les commandes modifiées sont relues.
+ORDER_BOARD_SYNC_INTERVAL = float(os.getenv("ORDER_BOARD_SYNC_INTERVAL", "2"))  # secondes entre deux vérifications (0 = désactivé)
 
-        # Étape 2 : récupérer les détails de la commande
-        cur.execute("""
-            SELECT product_id, qty, total_price, pharmacy_id, date, address, latitude, longitude
-            FROM orders
-            WHERE user_id = ? AND order_id = ?
-        """, (user_id, order_id))
-        rows = cur.fetchall()
+pending_orders = PendingOrderBoard(_load_pending_orders, changes_fn=_order_changes)
+pending_orders_sync_task = PeriodicTask(pending_orders.sync, interval=ORDER_BOARD_SYNC_INTERVAL, name="order-board-sync")
 
-        if not rows:
-            return None
-
-        # Étape 3 : formater la commande
-        items = []
-        total = 0.0
-
-        for product_id, qty, total_price, pharmacy_id, date, address, latitude, longitude in rows:
-
-            if product_id != 0:
-                product = get_product(product_id)
-                items.append({
-                    "product_id": product_id,
-                    "pharmacy_id": pharmacy_id,
-                    "name": product.get("name", "Inconnu") if product else "Inconnu",
-                    "qty": qty,
-                    "price": total_price / qty if qty > 0 else total_price
-                })
-                total += total_price
-            else:  # product id 0 = frais de livraison
-                delivery_cost = total_price
-
-        return {
-            "order_id": order_id,
-            "date": rows[0][4],
-            "address": rows[0][5],
-            "lat": rows[0][6],
-            "lng": rows[0][7],
-            "delivery_cost": delivery_cost,
-            "total": total + delivery_cost,
-            "items": items
-        }
-    
 
-def get_all_pending_order():
+def get_all_pending_order(lat: float | None = None, lng: float | None = None, max_distance: float | None = None, sort_by: str = "date"):
     
-    """ Récupère toutes les commandes en attente de tous les utilisateurs en commençant par les plus récents.
-    Inclut aussi les frais de livraison (product_id = 0) dans le total.
+    """ Récupère toutes les commandes en attente de tous les utilisateurs en commençant par les plus récents
+    (ou les plus proches de (lat, lng) si sort_by="distance"), depuis le tableau en mémoire pending_orders.
+    Inclut aussi les frais de livraison (order_headers.delivery_fee) dans le total.
 
     Renvoie une liste de dictionnaires :
     {
@@ -750,219 +725,78 @@ def get_all_pending_order():
         "date": date,
         "lat": latitude (optionnel),
         "lng": longitude (optionnel),
-        "address": address (optionnel)
+        "address": address (optionnel),
+        "distance": km depuis (lat, lng) ou None
     } """
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT o.order_id, u.username, o.product_id, p.name, o.qty, o.total_price, o.date, o.latitude, o.longitude, o.address
-            FROM orders o
-            JOIN users u ON o.user_id = u.id
-            LEFT JOIN products p ON o.product_id = p.id
-            WHERE o.status = 'pending'
-            ORDER BY o.date DESC
-        """)
-        rows = cur.fetchall()
+    return pending_orders.orders(lat, lng, max_distance, sort_by)
 
-    # Regrouper les données par order_id
-    orders = {}
-    for order_id, username, product_id, product_name, qty, total_price, date, lat, lng, address in rows:
-        if order_id not in orders:
-            orders[order_id] = {
-                "id": order_id,
-                "customer": username,
-                "items": {},
-                "total": 0.0,
-                "delivery_cost": 0.0,
-                "date": date,
-                "lat": lat,
-                "lng": lng,
-                "address": address
-            }
 
-        # Si product_id = 0 → frais de livraison donc pas ajouter dans la liste des produits
-        if product_id != 0:
-            if product_name in orders[order_id]["items"]:
-                orders[order_id]["items"][product_name] += qty
-            else:
-                orders[order_id]["items"][product_name] = qty
-        else:
-            orders[order_id]["delivery_cost"] += total_price or 0.0
+# Résultats de claim_order
+CLAIMED = "claimed"              # commande attribuée au livreur
+ALREADY_TAKEN = "already_taken"  # plus en attente (prise par un autre livreur, annulée ou introuvable)
+OVER_CAPACITY = "over_capacity"  # le livreur a déjà max_order livraisons en cours
 
-        # Ajouter le coût total (inclut les frais de livraison)
-        orders[order_id]["total"] += total_price or 0.0
+# Résultats et latences des prises en charge (affichés dans les paramètres admin)
+claim_metrics = OperationMetrics("order-claims")
 
-    return list(orders.values())
+CLAIM_ORDER_SQL = """
+    UPDATE order_headers
+    SET status = 'in_progress',
+        delivery_person_id = ?
+    WHERE id = ? AND status = 'pending'
+      AND (SELECT COUNT(*) FROM order_headers
+           WHERE delivery_person_id = ? AND status = 'in_progress') < ?
+"""
+CLAIM_STATUS_SQL = "SELECT status FROM order_headers WHERE id = ?"
 
 
-def take_order(order_id: int, delivery_person_id: int, max_order: int) -> bool:
+def claim_order(order_id: int, delivery_person_id: int, max_order: int) -> str:
 
-    """ Marque une commande comme prise en charge par un livreur si le livreur n'a pas atteint la max de livraison en cours. """
+    """
+    Attribue une commande en attente à un livreur, en une seule écriture conditionnelle : la commande doit être
+    toujours en attente ET le livreur avoir moins de `max_order` livraisons en cours. Le tout se fait dans une
+    transaction BEGIN IMMEDIATE : deux livreurs ne peuvent pas prendre la même commande, ni un livreur dépasser sa limite.
 
-    with get_connection() as conn:
-        cur = conn.cursor()
+    Retourne CLAIMED, ALREADY_TAKEN ou OVER_CAPACITY.
+    """
 
-       # Vérifier combien de commandes en cours le livreur a déjà
-        cur.execute("""
-            SELECT COUNT(DISTINCT order_id)
-            FROM orders
-            WHERE delivery_person_id = ? AND status = 'in_progress'
-        """, (delivery_person_id,))
-        current_orders = cur.fetchone()[0]
-
-        if current_orders >= max_order:
-            return False  # Trop de commandes déjà prises
-
-        # Verifier que la commande est toujours en attente
-        cur.execute("SELECT status FROM orders WHERE order_id = ?", (order_id,))
-        row = cur.fetchone()
-        if not row or row[0] != 'pending':
-            return False  # commande introuvable ou déjà prise
-
-        # Mettre à jour le statut de toutes les lignes de la commande
-        cur.execute("""
-            UPDATE orders
-            SET status = 'in_progress',
-                delivery_person_id = ?
-            WHERE order_id = ? AND status = 'pending'
-        """, (delivery_person_id, order_id))
-        conn.commit()
-        return True
-    
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with immediate_transaction() as conn:
+            cur = conn.cursor()
+            cur.execute(CLAIM_ORDER_SQL, (delivery_person_id, order_id, delivery_person_id, max_order))
 
-def get_orders_for_delivery_person(delivery_person_id: int, status: str='in_progress'):
+            if cur.rowcount == 1:
+                outcome = CLAIMED
+            else:
+                # Refus : on relit la commande dans la même transaction pour en donner la raison
+                row = cur.execute(CLAIM_STATUS_SQL, (order_id,)).fetchone()
+                outcome = OVER_CAPACITY if row and row[0] == "pending" else ALREADY_TAKEN
+    finally:
+        claim_metrics.record(outcome, time.perf_counter() - start)
 
-    """Récupère toutes les commandes en cours pour un livreur donné et un status donné."""
+    if outcome == CLAIMED:
+        pending_orders.remove(order_id)
+    elif outcome == ALREADY_TAKEN:
+        pending_orders.refresh_order(order_id)  # corrige un tableau qui l'afficherait encore comme disponible
 
-    with get_connection() as conn:
-        cur = conn.cursor()
+    return outcome
 
-        # Sélection des commandes correspondantes
-        cur.execute("""
-            SELECT DISTINCT order_id
-            FROM orders
-            WHERE status = ?
-              AND delivery_person_id = ?
-            ORDER BY date DESC
-        """, (status, delivery_person_id,))
-        order_rows = cur.fetchall()
-
-        if not order_rows:
-            return []
-
-        orders = []
-
-        # Pour chaque commande trouvée, on récupère ses détails complets
-        for (order_id,) in order_rows:
-            cur.execute("""
-                SELECT product_id, qty, total_price, user_id, pharmacy_id, date, address, latitude, longitude
-                FROM orders
-                WHERE order_id = ?
-            """, (order_id,))
-            rows = cur.fetchall()
 
-            if not rows:
-                continue
-
-            items = []
-            total = 0.0
-            delivery_cost = 0.0
-
-            for product_id, qty, total_price, user_id, pharmacy_id, date, address, latitude, longitude in rows:
-                if product_id != 0:
-                    product = get_product(product_id)
-                    items.append({
-                        "product_id": product_id,
-                        "pharmacy_id": pharmacy_id,
-                        "name": product.get("name", "Inconnu") if product else "Inconnu",
-                        "qty": qty,
-                        "price": total_price / qty if qty > 0 else total_price
-                    })
-                    total += total_price
-                else:
-                    delivery_cost = total_price
+def get_orders_for_delivery_person(delivery_person_id: int, status: str='in_progress'):
 
-            orders.append({
-                "order_id": order_id,
-                "customer": get_user_from_id(rows[0][3]),
-                "date": rows[0][5],
-                "address": rows[0][6],
-                "lat": rows[0][7],
-                "lng": rows[0][8],
-                "delivery_cost": delivery_cost,
-                "total": total + delivery_cost,
-                "items": items
-            })
+    """Récupère toutes les commandes en cours pour un livreur donné et un status donné."""
 
-        return orders
+    return _load_orders(ORDER_FILTER_DELIVERY_PERSON, (status, delivery_person_id))
     
 
 def get_orders_for_customer(user_id: int, status: str='in_progress'):
 
     """Récupère toutes les commandes en cours pour un utilisateur donné et un status donné."""
 
-    with get_connection() as conn:
-        cur = conn.cursor()
-
-        # Sélection des commandes correspondantes
-        cur.execute("""
-            SELECT DISTINCT order_id
-            FROM orders
-            WHERE status = ?
-              AND user_id = ?
-            ORDER BY date DESC
-        """, (status, user_id,))
-        order_rows = cur.fetchall()
-
-        if not order_rows:
-            return []
-
-        orders = []
-
-        # Pour chaque commande trouvée, on récupère ses détails complets
-        for (order_id,) in order_rows:
-            cur.execute("""
-                SELECT product_id, qty, total_price, delivery_person_id, pharmacy_id, date, address, latitude, longitude
-                FROM orders
-                WHERE order_id = ?
-            """, (order_id,))
-            rows = cur.fetchall()
-
-            if not rows:
-                continue
-
-            items = []
-            total = 0.0
-            delivery_cost = 0.0
-
-            for product_id, qty, total_price, delivery_person_id, pharmacy_id, date, address, latitude, longitude in rows:
-                if product_id != 0:
-                    product = get_product(product_id)
-                    items.append({
-                        "product_id": product_id,
-                        "pharmacy_id": pharmacy_id,
-                        "name": product.get("name", "Inconnu") if product else "Inconnu",
-                        "qty": qty,
-                        "price": total_price / qty if qty > 0 else total_price
-                    })
-                    total += total_price
-                else:
-                    delivery_cost = total_price
-
-            orders.append({
-                "order_id": order_id,
-                "delivery_person": get_user_from_id(rows[0][3]),
-                "date": rows[0][5],
-                "address": rows[0][6],
-                "lat": rows[0][7],
-                "lng": rows[0][8],
-                "delivery_cost": delivery_cost,
-                "total": total + delivery_cost,
-                "items": items
-            })
-
-        return orders
+    return _load_orders(ORDER_FILTER_CUSTOMER, (status, user_id))
     
 
 def cancel_order_delivery(order_id: int) -> bool:
@@ -972,34 +806,34 @@ def cancel_order_delivery(order_id: int) -> bool:
     with get_connection() as conn:
         cur = conn.cursor()
 
-        # Vérifier que la commande est en cours de livraison
-        cur.execute("SELECT status FROM orders WHERE order_id = ?", (order_id,))
-        row = cur.fetchone()
-        if not row or row[0] != 'in_progress':
-
-            return False  # commande introuvable ou pas en cours
-
-        # Remettre le statut à 'pending' et retirer le livreur assigné
+        # Remettre le statut à 'pending' et retirer le livreur assigné, seulement si la commande est en cours
         cur.execute("""
-            UPDATE orders
+            UPDATE order_headers
             SET status = 'pending',
                 delivery_person_id = NULL
-            WHERE order_id = ? AND status = 'in_progress'
+            WHERE id = ? AND status = 'in_progress'
         """, (order_id,))
         conn.commit()
+        cancelled = cur.rowcount == 1  # 0 : commande introuvable ou pas en cours
 
-        return True
+    if cancelled:
+        pending_orders.refresh_order(order_id)  # de nouveau disponible pour les autres livreurs
+
+    return cancelled
     
 
+IN_PROGRESS_ORDERS_COUNT_SQL = """
+    SELECT COUNT(*)
+    FROM order_headers
+    WHERE user_id = ? AND status IN ('in_progress', 'pending')
+"""
+
+
 def get_in_progress_orders_count(user_id: int) -> int:
 
     """Retourne le nombre de commandes 'in_progress' ou 'pending' pour un utilisateur."""
     
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute("""
-            SELECT COUNT(DISTINCT order_id)
-            FROM orders
-            WHERE user_id = ? AND status IN ('in_progress', 'pending')
-        """, (user_id,))
+        cur.execute(IN_PROGRESS_ORDERS_COUNT_SQL, (user_id,))
         return cur.fetchone()[0] or 0
\ No newline at end of file
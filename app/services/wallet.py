@@ -0,0 +1,159 @@
+import os
+from datetime import datetime
+
+from app.services.db import get_connection, immediate_transaction
+from app.services.periodic import PeriodicTask
+
+
+# === Paramètres ===
+WALLET_HISTORY_PAGE_SIZE = 20
+WALLET_RECONCILE_INTERVAL = float(os.getenv("WALLET_RECONCILE_INTERVAL", "3600"))  # secondes entre deux contrôles (0 = désactivé)
+WALLET_RECONCILE_TOLERANCE = 0.005                                                  # écart toléré (arrondis en centimes)
+
+
+# === Requêtes ===
+WALLET_BALANCE_SQL = "SELECT balance FROM wallets WHERE user_id = ?"
+WALLET_DEBIT_SQL = "UPDATE wallets SET balance = balance - ? WHERE user_id = ? AND balance >= ?"
+WALLET_HISTORY_SQL = """
+    SELECT id, date, amount, description FROM wallet_history
+    WHERE user_id = ?
+    ORDER BY id DESC LIMIT ?
+"""
+WALLET_HISTORY_BEFORE_SQL = """
+    SELECT id, date, amount, description FROM wallet_history
+    WHERE user_id = ? AND id < ?
+    ORDER BY id DESC LIMIT ?
+"""
+WALLET_HISTORY_COUNT_SQL = "SELECT COUNT(*) FROM wallet_history WHERE user_id = ?"
+
+
+# === Écritures (dans une transaction ouverte) ===
+# Le solde et le journal (wallet_history) sont toujours modifiés ensemble, dans la même transaction.
+
+def credit(cur, user_id: int, amount: float, description: str = "Recharge", date: str | None = None) -> float:
+
+    """Ajoute `amount` au solde (UPDATE relatif, pas de lecture préalable) et l'inscrit au journal. Retourne le nouveau solde."""
+
+    date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur.execute("""
+        INSERT INTO wallets (user_id, balance) VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET balance = balance + excluded.balance
+    """, (user_id, amount))
+    cur.execute(
+        "INSERT INTO wallet_history (user_id, date, amount, description) VALUES (?, ?, ?, ?)",
+        (user_id, date, amount, description),
+    )
+
+    return cur.execute(WALLET_BALANCE_SQL, (user_id,)).fetchone()[0]
+
+
+def debit(cur, user_id: int, amount: float, description: str = "Dépense", date: str | None = None) -> float | None:
+
+    """
+    Retire `amount` du solde seulement s'il est suffisant (UPDATE conditionnel) et l'inscrit au journal.
+    Retourne le nouveau solde, ou None si le solde est insuffisant (rien n'est écrit).
+    """
+
+    cur.execute(WALLET_DEBIT_SQL, (amount, user_id, amount))
+    if cur.rowcount != 1:
+        return None
+
+    date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    cur.execute(
+        "INSERT INTO wallet_history (user_id, date, amount, description) VALUES (?, ?, ?, ?)",
+        (user_id, date, -amount, description),
+    )
+
+    return cur.execute(WALLET_BALANCE_SQL, (user_id,)).fetchone()[0]
+
+
+# === API ===
+def get_wallet_balance(user_id: int) -> float:
+
+    """Retourne le solde du wallet d'un utilisateur."""
+
+    with get_connection() as conn:
+        row = conn.execute(WALLET_BALANCE_SQL, (user_id,)).fetchone()
+
+        return row[0] if row else 0.0
+
+
+def credit_wallet(user_id: int, amount: float, description: str = "Recharge") -> float:
+
+    """Recharge le wallet (solde + journal en une transaction). Retourne le nouveau solde."""
+
+    with immediate_transaction() as conn:
+        return credit(conn.cursor(), user_id, amount, description)
+
+
+def debit_wallet(user_id: int, amount: float, description: str = "Dépense") -> float | None:
+
+    """Débite le wallet si le solde suffit (solde + journal en une transaction). Retourne le nouveau solde ou None."""
+
+    with immediate_transaction() as conn:
+        return debit(conn.cursor(), user_id, amount, description)
+
+
+def get_wallet_history(user_id: int, before_id: int | None = None, limit: int = WALLET_HISTORY_PAGE_SIZE) -> list[tuple]:
+
+    """
+    Retourne une page de l'historique du wallet, des plus récentes aux plus anciennes :
+    [(id, date, amount, description), ...]. Pagination par clé : passer l'id de la dernière
+    transaction de la page précédente dans `before_id` (pas d'OFFSET ni de tri sur la date texte).
+    """
+
+    with get_connection() as conn:
+        if before_id is None:
+            cursor = conn.execute(WALLET_HISTORY_SQL, (user_id, limit))
+        else:
+            cursor = conn.execute(WALLET_HISTORY_BEFORE_SQL, (user_id, before_id, limit))
+
+        return cursor.fetchall()
+
+
+def count_wallet_history(user_id: int) -> int:
+
+    """Nombre de transactions du wallet d'un utilisateur."""
+
+    with get_connection() as conn:
+        return conn.execute(WALLET_HISTORY_COUNT_SQL, (user_id,)).fetchone()[0]
+
+
+# === Réconciliation ===
+def reconcile_wallets() -> list[dict]:
+
+    """
+    Compare le solde de chaque wallet à la somme de son journal (wallet_history.amount).
+    Retourne les écarts : [{"user_id", "balance", "ledger", "difference"}, ...] (liste vide si tout concorde).
+    """
+
+    with get_connection() as conn:
+        rows = conn.execute("""
+            SELECT w.user_id, w.balance, COALESCE(h.total, 0)
+            FROM wallets w
+            LEFT JOIN (SELECT user_id, SUM(amount) AS total FROM wallet_history GROUP BY user_id) h ON h.user_id = w.user_id
+            UNION ALL
+            SELECT user_id, 0, SUM(amount)
+            FROM wallet_history
+            WHERE user_id NOT IN (SELECT user_id FROM wallets WHERE user_id IS NOT NULL)
+            GROUP BY user_id
+        """).fetchall()
+
+    return [
+        {"user_id": user_id, "balance": balance, "ledger": ledger, "difference": round((balance or 0) - ledger, 2)}
+        for user_id, balance, ledger in rows
+        if abs((balance or 0) - ledger) > WALLET_RECONCILE_TOLERANCE
+    ]
+
+
+def _report_reconciliation():
+
+    mismatches = reconcile_wallets()
+    for mismatch in mismatches:
+        print(f"⚠️ Wallet {mismatch['user_id']} : solde {mismatch['balance']:.2f} € != journal {mismatch['ledger']:.2f} € "
+              f"(écart {mismatch['difference']:+.2f} €)")
+
+    return mismatches
+
+
+reconciliation_task = PeriodicTask(_report_reconciliation, interval=WALLET_RECONCILE_INTERVAL, name="wallet-reconciliation")
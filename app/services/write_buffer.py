@@ -0,0 +1,151 @@
+import atexit
+import threading
+import traceback
+from typing import Callable, Hashable
+
+
+class WriteBehindBuffer:
+
+    """
+    Agrège en mémoire des compteurs par clé et les écrit en base par lots, hors du chemin des requêtes.
+
+    - add(key, amount) additionne `amount` au compteur de `key` (aucun accès à la base).
+    - Un thread de fond appelle flush_fn({clé: total}) toutes les `interval` secondes,
+      ou dès que le nombre de clés en attente atteint `max_size`.
+    - stop() fait un dernier flush (appelé à l'arrêt de l'application et à la sortie du process) ; ensuite,
+      add() écrit directement (flush synchrone) au lieu de relancer le thread, jusqu'au prochain start().
+    - `capacity` (optionnel) borne le nombre de clés en attente : au-delà, une nouvelle clé est refusée
+      (add retourne False) plutôt que de bloquer l'appelant ; une clé déjà présente est toujours additionnée.
+    - stats() donne les compteurs (ajouts, regroupements, refus, flushs anticipés, écritures).
+    Si flush_fn échoue, les compteurs sont remis dans le buffer et retentés au flush suivant.
+    """
+
+    def __init__(self, flush_fn: Callable[[dict], None], interval: float = 5.0, max_size: int = 1000, name: str = "write-behind",
+                 capacity: int | None = None):
+
+        self.flush_fn = flush_fn
+        self.interval = interval
+        self.max_size = max_size
+        self.capacity = capacity
+        self.name = name
+        self._stats = {"added": 0, "coalesced": 0, "dropped": 0, "backpressure": 0, "flushes": 0, "flushed_keys": 0, "flush_errors": 0}
+
+        self._pending: dict[Hashable, int] = {}
+        self._lock = threading.Lock()          # protège _pending
+        self._flush_lock = threading.Lock()    # un seul flush à la fois
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._closed = False                   # stop() appelé : plus de démarrage implicite par add()
+        self._atexit_registered = False
+
+    def add(self, key: Hashable, amount: int = 1) -> bool:
+
+        """Ajoute `amount` au compteur de `key`. Retourne False si le buffer est plein (valeur perdue)."""
+
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] += amount
+                self._stats["coalesced"] += 1
+            elif self.capacity is not None and len(self._pending) >= self.capacity:
+                self._stats["dropped"] += 1
+                self._wake.set()
+                return False
+            else:
+                self._pending[key] = amount
+            self._stats["added"] += 1
+            full = len(self._pending) >= self.max_size
+            if full:
+                self._stats["backpressure"] += 1  # écritures pas assez rapides : flush anticipé demandé
+
+        if self._closed:
+            self.flush()  # arrêté : écriture immédiate
+            return True
+        if self._thread is None:
+            self.start()
+        if full:
+            self._wake.set()  # le thread de fond flush immédiatement
+
+        return True
+
+    def pending(self, predicate: Callable[[Hashable], bool] | None = None) -> dict:
+
+        """Retourne une copie des compteurs pas encore écrits (filtrés par `predicate` sur la clé)."""
+
+        with self._lock:
+            if predicate is None:
+                return dict(self._pending)
+            return {key: amount for key, amount in self._pending.items() if predicate(key)}
+
+    def discard(self, predicate: Callable[[Hashable], bool]):
+
+        """Oublie les compteurs en attente dont la clé satisfait `predicate` (ex : utilisateur supprimé)."""
+
+        with self._lock:
+            for key in [key for key in self._pending if predicate(key)]:
+                del self._pending[key]
+
+    def stats(self) -> dict:
+
+        """Compteurs depuis le démarrage, plus le nombre de clés actuellement en attente ("pending")."""
+
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def flush(self):
+
+        """Écrit immédiatement tous les compteurs en attente."""
+
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return
+
+            try:
+                self.flush_fn(batch)
+            except Exception:
+                print(f"Erreur flush {self.name} ({len(batch)} clés), nouvel essai au prochain flush :")
+                traceback.print_exc()
+                with self._lock:
+                    self._stats["flush_errors"] += 1
+                    for key, amount in batch.items():
+                        self._pending[key] = self._pending.get(key, 0) + amount
+            else:
+                with self._lock:
+                    self._stats["flushes"] += 1
+                    self._stats["flushed_keys"] += len(batch)
+
+    def start(self):
+
+        """Démarre le thread de flush périodique (sans effet s'il tourne déjà)."""
+
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._closed = False
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            register, self._atexit_registered = not self._atexit_registered, True
+        if register:
+            atexit.register(self.stop)  # une seule fois, même après plusieurs start() / stop()
+
+    def stop(self):
+
+        """Arrête le thread de fond puis écrit ce qui reste dans le buffer."""
+
+        self._closed = True
+        self._stopped.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=self.interval + 5)
+        self.flush()
+
+    def _run(self):
+
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
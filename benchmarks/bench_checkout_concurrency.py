@@ -0,0 +1,166 @@
+"""
+Test de charge de la validation de commande (app.services.checkout) : de nombreux utilisateurs
+valident en parallèle un panier sur un stock limité, dans une base temporaire.
+
+Vérifie à la fin :
+- aucun stock négatif et stock retiré == quantités commandées (pas de survente) ;
+- solde final + dépenses == solde initial + recharges pour chaque utilisateur (pas de mise à jour perdue) ;
+- aucune commande à moitié écrite (chaque commande a ses lignes produits, son débit et un panier vidé).
+
+Lancement : python -m benchmarks.bench_checkout_concurrency [--users 200] [--stock 60] [--threads 32]
+"""
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.data.create_db import init_db
+from app.data.migrations import run_migrations
+from app.recommendations.interaction_events import interaction_buffer
+from app.services import db
+from app.services.checkout import checkout
+
+N_PRODUCTS = 5
+N_PHARMACIES = 3
+
+
+def setup_database(path: Path, n_users: int, stock: int, seed: int = 0) -> dict:
+
+    """Crée la base : `stock` unités par produit réparties sur les pharmacies, un panier et un solde aléatoires par utilisateur."""
+
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    run_migrations(conn)
+    cur = conn.cursor()
+
+    cur.executemany("INSERT INTO pharmacies (id, name) VALUES (?, ?)", [(i, f"Pharmacie {i}") for i in range(1, N_PHARMACIES + 1)])
+    cur.executemany("INSERT INTO products (id, name) VALUES (?, ?)", [(i, f"Produit {i}") for i in range(1, N_PRODUCTS + 1)])
+    for product_id in range(1, N_PRODUCTS + 1):
+        share = stock // N_PHARMACIES
+        for pharmacy_id in range(1, N_PHARMACIES + 1):
+            qty = share if pharmacy_id < N_PHARMACIES else stock - share * (N_PHARMACIES - 1)
+            cur.execute("INSERT INTO pharmacy_products (pharmacy_id, product_id, price, qty) VALUES (?, ?, ?, ?)",
+                        (pharmacy_id, product_id, round(rng.uniform(2, 10), 2), qty))
+
+    balances = {}
+    for user_id in range(1, n_users + 1):
+        cur.execute("INSERT INTO users (id, username) VALUES (?, ?)", (user_id, f"user{user_id}"))
+        balances[user_id] = round(rng.uniform(0, 80), 2)
+        cur.execute("INSERT INTO wallets (user_id, balance) VALUES (?, ?)", (user_id, balances[user_id]))
+        for product_id in rng.sample(range(1, N_PRODUCTS + 1), rng.randint(1, 3)):
+            cur.execute("INSERT INTO panier (user_id, product_id, quantity) VALUES (?, ?, ?)", (user_id, product_id, rng.randint(1, 4)))
+
+    conn.commit()
+    conn.close()
+
+    return balances
+
+
+def run_checkouts(balances: dict, threads: int) -> dict:
+
+    """Valide en parallèle le panier de chaque utilisateur (un quart recharge en validant). Retourne {user_id: résultat}."""
+
+    top_ups = {user_id: 20.0 if user_id % 4 == 0 else 0.0 for user_id in balances}
+    barrier = threading.Barrier(threads)
+
+    def worker(user_id):
+        try:
+            barrier.wait(timeout=1)  # démarrages groupés pour maximiser la contention
+        except threading.BrokenBarrierError:
+            pass
+        return user_id, checkout(user_id, delivery_fee=3.5, top_up=top_ups[user_id])
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return dict(executor.map(worker, balances))
+
+
+def check_invariants(path: Path, balances: dict, results: dict, stock: int) -> list[str]:
+
+    """Relit la base après run_checkouts. Retourne les invariants violés (liste vide si tout est cohérent)."""
+
+    conn = sqlite3.connect(path)
+    cur = conn.cursor()
+    errors = []
+
+    # === Stock ===
+    for product_id in range(1, N_PRODUCTS + 1):
+        remaining = cur.execute("SELECT SUM(qty), MIN(qty) FROM pharmacy_products WHERE product_id = ?", (product_id,)).fetchone()
+        ordered = cur.execute("SELECT COALESCE(SUM(qty), 0) FROM orders WHERE product_id = ?", (product_id,)).fetchone()[0]
+        if remaining[1] < 0:
+            errors.append(f"stock négatif pour le produit {product_id}")
+        if remaining[0] + ordered != stock:
+            errors.append(f"produit {product_id} : stock {remaining[0]} + commandé {ordered} != {stock}")
+
+    # === Wallets et commandes ===
+    for user_id, result in results.items():
+        balance = cur.execute("SELECT balance FROM wallets WHERE user_id = ?", (user_id,)).fetchone()[0]
+        history = cur.execute("SELECT COALESCE(SUM(amount), 0) FROM wallet_history WHERE user_id = ?", (user_id,)).fetchone()[0]
+        billed = cur.execute("SELECT COALESCE(SUM(total), 0), COUNT(*) FROM order_headers WHERE user_id = ?", (user_id,)).fetchone()
+        panier = cur.execute("SELECT COUNT(*) FROM panier WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+        if abs(balances[user_id] + history - balance) > 1e-6:
+            errors.append(f"utilisateur {user_id} : solde {balance} != {balances[user_id]} + {history}")
+        if result["success"] and (billed[1] != 1 or abs(billed[0] - result["total"]) > 1e-6 or panier):
+            errors.append(f"utilisateur {user_id} : commande incomplète {billed} / {result['total']}, panier {panier}")
+        if not result["success"] and (billed[1] or history or not panier):
+            errors.append(f"utilisateur {user_id} : échec ({result['error']}) mais écritures présentes")
+
+    orders = cur.execute("SELECT COUNT(*), COUNT(DISTINCT user_id) FROM order_headers").fetchone()
+    if orders[0] != orders[1]:
+        errors.append(f"{orders[0]} commandes pour {orders[1]} utilisateurs")
+    orphans = cur.execute("SELECT COUNT(*) FROM orders WHERE order_id NOT IN (SELECT id FROM order_headers)").fetchone()[0]
+    if orphans:
+        errors.append(f"{orphans} lignes de commande sans en-tête")
+    conn.close()
+
+    return errors
+
+
+def run(n_users: int, stock: int, threads: int) -> bool:
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "checkout.db"
+        balances = setup_database(path, n_users, stock)
+        db.DB_PATH = path
+
+        start = time.perf_counter()
+        results = run_checkouts(balances, threads)
+        elapsed = time.perf_counter() - start
+        interaction_buffer.stop()  # dernières interactions écrites tant que la base temporaire existe
+        db.close_all_connections()
+
+        errors = check_invariants(path, balances, results, stock)
+
+    outcomes = {}
+    for result in results.values():
+        key = "ok" if result["success"] else result["error"]
+        outcomes[key] = outcomes.get(key, 0) + 1
+
+    print(f"{n_users} validations sur {threads} threads en {elapsed:.2f} s : {outcomes}")
+    for error in errors:
+        print(f"❌ {error}")
+    if not errors:
+        print("✅ Pas de survente, pas de mise à jour de solde perdue, pas de commande partielle.")
+
+    return not errors
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=60, help="unités disponibles par produit (toutes pharmacies)")
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    raise SystemExit(0 if run(args.users, args.stock, args.threads) else 1)
+
+
+if __name__ == "__main__":
+    main()
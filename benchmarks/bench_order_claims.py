@@ -0,0 +1,134 @@
+"""
+Test de charge de la prise en charge des commandes (app.services.users.claim_order) : de nombreux livreurs
+se disputent en parallèle les mêmes commandes en attente (pic du midi), dans une base temporaire.
+
+Vérifie à la fin :
+- chaque commande attribuée l'est à un seul livreur, et un seul claim_order a répondu "claimed" pour elle ;
+- aucun livreur ne dépasse sa limite de livraisons en cours (--max-order) ;
+- les compteurs de claim_metrics correspondent aux résultats obtenus.
+
+Lancement : python -m benchmarks.bench_order_claims [--orders 50] [--couriers 40] [--attempts 10] [--max-order 2] [--threads 32]
+"""
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.data.create_db import init_db
+from app.data.migrations import run_migrations
+from app.services import db
+from app.services.users import claim_order, claim_metrics, pending_orders, CLAIMED, ALREADY_TAKEN, OVER_CAPACITY
+
+
+def setup_database(path: Path, n_orders: int, n_couriers: int):
+
+    """Crée la base : un client, `n_orders` commandes en attente et `n_couriers` livreurs."""
+
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    run_migrations(conn)
+    cur = conn.cursor()
+
+    cur.execute("INSERT INTO users (id, username) VALUES (1, 'client')")
+    cur.executemany("INSERT INTO users (id, username, is_delivery_person) VALUES (?, ?, 1)",
+                    [(courier_id, f"livreur{courier_id}") for courier_id in range(2, n_couriers + 2)])
+    cur.executemany("INSERT INTO order_headers (user_id, status, date, delivery_fee, total) VALUES (1, 'pending', ?, 3.5, 10)",
+                    [(f"2025-01-01 12:{i % 60:02d}:00",) for i in range(n_orders)])
+
+    conn.commit()
+    conn.close()
+
+
+def run(n_orders: int, n_couriers: int, attempts: int, max_order: int, threads: int) -> bool:
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "claims.db"
+        setup_database(path, n_orders, n_couriers)
+        db.DB_PATH = path
+        pending_orders.invalidate()
+        claim_metrics.reset()
+
+        # Chaque livreur tente `attempts` commandes tirées parmi les premières (toutes visent les mêmes)
+        rng = random.Random(0)
+        hot = list(range(1, min(n_orders, max(attempts, n_orders // 4)) + 1))
+        jobs = [(courier_id, order_id) for courier_id in range(2, n_couriers + 2) for order_id in rng.sample(hot, min(attempts, len(hot)))]
+        rng.shuffle(jobs)
+        barrier = threading.Barrier(threads)
+
+        def worker(job):
+            courier_id, order_id = job
+            try:
+                barrier.wait(timeout=1)  # démarrages groupés pour maximiser la contention
+            except threading.BrokenBarrierError:
+                pass
+            return courier_id, order_id, claim_order(order_id, courier_id, max_order)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            results = list(executor.map(worker, jobs))
+        elapsed = time.perf_counter() - start
+        db.close_all_connections()
+
+        conn = sqlite3.connect(path)
+        cur = conn.cursor()
+        errors = []
+
+        # === Une commande, un livreur ===
+        claimed_by = {}
+        for courier_id, order_id, outcome in results:
+            if outcome == CLAIMED:
+                if order_id in claimed_by:
+                    errors.append(f"commande {order_id} attribuée à {claimed_by[order_id]} puis à {courier_id}")
+                claimed_by[order_id] = courier_id
+
+        assigned = dict(cur.execute("SELECT id, delivery_person_id FROM order_headers WHERE status = 'in_progress'").fetchall())
+        if assigned != claimed_by:
+            errors.append(f"{len(assigned)} commandes en cours en base pour {len(claimed_by)} prises en charge réussies")
+
+        # === Limite par livreur ===
+        for courier_id, count in cur.execute("""
+            SELECT delivery_person_id, COUNT(*) FROM order_headers WHERE status = 'in_progress' GROUP BY delivery_person_id
+        """).fetchall():
+            if count > max_order:
+                errors.append(f"livreur {courier_id} : {count} livraisons en cours (limite {max_order})")
+        conn.close()
+
+    outcomes = {}
+    for _, _, outcome in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    metrics = claim_metrics.snapshot()
+    if metrics["counts"] != outcomes:
+        errors.append(f"métriques {metrics['counts']} != résultats {outcomes}")
+
+    print(f"{len(jobs)} prises en charge sur {threads} threads en {elapsed:.2f} s : {outcomes}")
+    print(f"latence p50 {metrics['p50_ms']:.2f} ms, p95 {metrics['p95_ms']:.2f} ms, max {metrics['max_ms']:.2f} ms")
+    for error in errors:
+        print(f"❌ {error}")
+    if not errors:
+        print(f"✅ Aucune double attribution, aucune limite dépassée ({outcomes.get(ALREADY_TAKEN, 0)} conflits, "
+              f"{outcomes.get(OVER_CAPACITY, 0)} refus pour limite).")
+
+    return not errors
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50)
+    parser.add_argument("--couriers", type=int, default=40)
+    parser.add_argument("--attempts", type=int, default=10, help="commandes tentées par livreur")
+    parser.add_argument("--max-order", type=int, default=2, help="livraisons en cours autorisées par livreur")
+    parser.add_argument("--threads", type=int, default=32)
+    args = parser.parse_args()
+
+    raise SystemExit(0 if run(args.orders, args.couriers, args.attempts, args.max_order, args.threads) else 1)
+
+
+if __name__ == "__main__":
+    main()
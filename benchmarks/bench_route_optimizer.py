@@ -0,0 +1,111 @@
+"""
+Benchmark de l'optimisation de tournée : plus proche voisin (ancienne version de
+optimize_route) contre app.services.route_optimizer (Held-Karp / insertion + 2-opt / Or-opt).
+
+Longueurs en km sur des tournées aléatoires départ -> pharmacies -> client dans une zone urbaine.
+Pour les petites tailles, le résultat exact est vérifié par énumération de toutes les permutations.
+
+Lancement : python -m benchmarks.bench_route_optimizer [--sizes 4 8 10 15 30 60] [--instances 20] [--budget 0.2]
+"""
+
+import argparse
+import itertools
+import random
+import statistics
+import time
+
+from app.services.distance import haversine_dist, haversine_matrix, optimize_route
+from app.services.route_optimizer import path_length
+
+CENTER = (48.8566, 2.3522)   # Paris
+SPREAD = 0.08                # ~9 km autour du centre
+
+
+def random_instance(n_stops: int, rng: random.Random):
+
+    """Retourne (départ, pharmacies, arrivée) tirés uniformément autour de CENTER."""
+
+    def point():
+        return CENTER[0] + rng.uniform(-SPREAD, SPREAD), CENTER[1] + rng.uniform(-SPREAD, SPREAD)
+
+    pharmacies = [dict(zip(("lat", "lng"), point()), name=f"P{i}") for i in range(n_stops)]
+    return point(), pharmacies, point()
+
+
+def greedy_route(start_lat, start_lng, pharmacies, end_lat=None, end_lng=None):
+
+    """Reproduit l'ancienne optimize_route : plus proche voisin, l'arrivée n'est ajoutée qu'à la fin."""
+
+    unvisited = pharmacies[:]
+    ordered = []
+    current = {"lat": start_lat, "lng": start_lng}
+
+    while unvisited:
+        next_ph = min(unvisited, key=lambda ph: haversine_dist(current["lat"], current["lng"], ph["lat"], ph["lng"]))
+        ordered.append(next_ph)
+        unvisited.remove(next_ph)
+        current = next_ph
+
+    if end_lat is not None and end_lng is not None:
+        ordered.append({"lat": end_lat, "lng": end_lng, "name": "Destination finale"})
+
+    return ordered
+
+
+def route_km(start, route) -> float:
+
+    points = [start, *((ph["lat"], ph["lng"]) for ph in route)]
+    return sum(haversine_dist(*a, *b) for a, b in zip(points, points[1:]))
+
+
+def brute_force_km(start, pharmacies, end) -> float:
+
+    """Longueur optimale par énumération (petites tailles uniquement)."""
+
+    points = [start, *((ph["lat"], ph["lng"]) for ph in pharmacies), end]
+    lats, lngs = zip(*points)
+    matrix = haversine_matrix(lats, lngs, lats, lngs).tolist()
+    return min(path_length(matrix, list(order)) for order in itertools.permutations(range(1, len(pharmacies) + 1)))
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 10, 15, 30, 60])
+    parser.add_argument("--instances", type=int, default=20)
+    parser.add_argument("--budget", type=float, default=0.2, help="budget de recherche locale (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'étapes':>7}{'glouton (km)':>14}{'optimisé (km)':>15}{'gain':>8}{'glouton (ms)':>14}{'optimisé (ms)':>15}")
+
+    for size in args.sizes:
+        greedy_km, optimized_km, greedy_ms, optimized_ms = [], [], [], []
+
+        for _ in range(args.instances):
+            start, pharmacies, end = random_instance(size, rng)
+
+            t0 = time.perf_counter()
+            greedy = greedy_route(*start, pharmacies, *end)
+            t1 = time.perf_counter()
+            optimized = optimize_route(*start, pharmacies, *end, time_budget=args.budget)
+            t2 = time.perf_counter()
+
+            assert sorted(ph["name"] for ph in optimized) == sorted(ph["name"] for ph in greedy), "étapes perdues"
+            greedy_km.append(route_km(start, greedy))
+            optimized_km.append(route_km(start, optimized))
+            greedy_ms.append((t1 - t0) * 1000)
+            optimized_ms.append((t2 - t1) * 1000)
+
+            if size <= 8:
+                exact = brute_force_km(start, pharmacies, end)
+                assert abs(optimized_km[-1] - exact) < 1e-6, f"non optimal : {optimized_km[-1]:.3f} > {exact:.3f}"
+
+        mean_greedy, mean_optimized = statistics.mean(greedy_km), statistics.mean(optimized_km)
+        print(f"{size:>7}{mean_greedy:>14.2f}{mean_optimized:>15.2f}{(1 - mean_optimized / mean_greedy) * 100:>7.1f}%"
+              f"{statistics.mean(greedy_ms):>14.2f}{statistics.mean(optimized_ms):>15.2f}")
+
+
+if __name__ == "__main__":
+    main()
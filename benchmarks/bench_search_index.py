@@ -0,0 +1,93 @@
+"""
+Benchmark de la recherche floue : boucle produit par produit (ancienne version de
+search_filter_product) contre l'index précalculé de app.services.search_index.
+
+Lancement : python -m benchmarks.bench_search_index [--sizes 10000 100000] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+from rapidfuzz import fuzz
+
+from app.services.search_index import SearchIndex
+
+SYLLABLES = ["do", "li", "pra", "ne", "ibu", "pro", "fen", "ami", "xi", "cil", "vi", "ta", "mi", "cal", "ci", "um",
+             "der", "ma", "bio", "sun", "gel", "cre", "me", "spray", "zinc", "omega", "flex", "lac", "to", "sept"]
+QUERIES = ["doli", "ibuprofene", "vitamine", "crème", "gel", "spray nasal", "omega 3", "xyz", "bio", "antidouleur"]
+
+
+def synthetic_catalog(n_products: int, n_tags: int = 400, seed: int = 0):
+
+    """Génère (product_rows, tag_rows) : des noms composés de syllabes et 2 à 6 tags par produit."""
+
+    rng = random.Random(seed)
+    vocabulary = [" ".join("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(rng.randint(1, 2)))
+                  for _ in range(n_tags)]
+    product_rows, tag_rows = [], []
+    for pid in range(1, n_products + 1):
+        name = " ".join("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize() for _ in range(rng.randint(1, 3)))
+        product_rows.append((pid, f"{name} {rng.randint(1, 1000)}mg"))
+        tag_rows.extend((pid, tag) for tag in rng.sample(vocabulary, rng.randint(2, 6)))
+    return product_rows, tag_rows
+
+
+def loop_match(query: str, product_rows, tags_by_product, min_score: int = 80) -> set[int]:
+
+    """Reproduit l'ancienne boucle : partial_ratio sur le nom puis sur chaque tag, produit par produit."""
+
+    query = query.lower().strip()
+    ids = set()
+    for pid, name in product_rows:
+        name_score = fuzz.partial_ratio(query, name.lower())
+        tags_score = max([fuzz.partial_ratio(query, t.lower()) for t in tags_by_product.get(pid, [])], default=0)
+        if max(name_score, tags_score) >= min_score:
+            ids.add(pid)
+    return ids
+
+
+def timed(fn, repeat: int) -> float:
+
+    """Retourne le meilleur temps (en secondes) sur `repeat` exécutions."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        product_rows, tag_rows = synthetic_catalog(size)
+        tags_by_product = {}
+        for pid, tag in tag_rows:
+            tags_by_product.setdefault(pid, []).append(tag)
+
+        start = time.perf_counter()
+        index = SearchIndex(product_rows, tag_rows)
+        build_time = time.perf_counter() - start
+
+        print(f"\n=== {size} produits, {len(tag_rows)} tags ({len(index.choices)} chaînes distinctes) ===")
+        print(f"Construction de l'index : {build_time * 1000:.1f} ms")
+        print(f"{'requête':<14}{'boucle (ms)':>14}{'index (ms)':>14}{'gain':>8}{'résultats':>11}")
+
+        for query in QUERIES:
+            expected = loop_match(query, product_rows, tags_by_product)
+            found = index.match(query)
+            assert found == expected, f"résultats différents pour {query!r}"
+
+            loop_time = timed(lambda: loop_match(query, product_rows, tags_by_product), args.repeat)
+            index_time = timed(lambda: index.match(query), args.repeat)
+            print(f"{query:<14}{loop_time * 1000:>14.1f}{index_time * 1000:>14.1f}{loop_time / index_time:>7.1f}x{len(found):>11}")
+
+
+if __name__ == "__main__":
+    main()
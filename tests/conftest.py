@@ -0,0 +1,47 @@
+import sqlite3
+
+import pytest
+
+from app.data import migrate_json_to_sql
+from app.data.create_db import init_db
+from app.data.migrations import run_migrations
+from app.recommendations.interaction_events import interaction_buffer
+from app.services import db
+from app.services.catalog import invalidate_catalog
+from app.services.users import _cached_display_page, pending_orders, visit_buffer
+
+
+def create_database(path):
+
+    """Base neuve comme au premier lancement : tables, produits/pharmacies/réglages du JSON, migrations."""
+
+    conn = sqlite3.connect(path)
+    init_db(conn)
+    migrate_json_to_sql.migrate_products(conn)
+    migrate_json_to_sql.migrate_pharmacies(conn)
+    migrate_json_to_sql.migrate_settings(conn)
+    run_migrations(conn)
+    conn.close()
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+
+    """Base temporaire utilisée par les services (db.DB_PATH) ; caches en mémoire vidés avant et après."""
+
+    path = tmp_path / "data.db"
+    create_database(path)
+    monkeypatch.setattr(db, "DB_PATH", path)
+
+    def reset_caches():
+        invalidate_catalog()
+        pending_orders.invalidate()
+        _cached_display_page.cache_clear()
+
+    reset_caches()
+    yield path
+
+    visit_buffer.stop()
+    interaction_buffer.stop()
+    db.close_all_connections()
+    reset_caches()
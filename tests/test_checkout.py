@@ -0,0 +1,20 @@
+from benchmarks.bench_checkout_concurrency import check_invariants, run_checkouts, setup_database
+from app.recommendations.interaction_events import interaction_buffer
+from app.services import db
+
+
+def test_concurrent_checkouts_keep_stock_wallets_and_orders_consistent(database, tmp_path, monkeypatch):
+
+    # Base du test de charge à la place de celle du fixture (dont on garde la remise à zéro des caches)
+    path = tmp_path / "checkout.db"
+    stock = 20
+    balances = setup_database(path, n_users=60, stock=stock)
+    monkeypatch.setattr(db, "DB_PATH", path)
+
+    results = run_checkouts(balances, threads=16)
+    interaction_buffer.stop()
+    db.close_all_connections()
+
+    assert check_invariants(path, balances, results, stock) == []
+    assert any(result["success"] for result in results.values())
+    assert any(result.get("error") == "insufficient_stock" for result in results.values())  # le stock a bien été disputé
@@ -0,0 +1,28 @@
+from app.recommendations.interaction_events import interaction_buffer
+from app.recommendations.user_product_matrix import PURCHASE_WEIGHT, populate_interactions_from_db
+from app.services import db
+from app.services.checkout import checkout
+
+
+def _scores():
+
+    with db.get_connection() as conn:
+        return dict(((user_id, product_id), score) for user_id, product_id, score in
+                    conn.execute("SELECT user_id, product_id, score FROM user_product_interactions"))
+
+
+def test_rebuild_weights_purchases_like_checkout(database):
+
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO users (id, username) VALUES (1, 'client')")
+        conn.execute("INSERT INTO wallets (user_id, balance) VALUES (1, 1000)")
+        conn.execute("INSERT INTO panier (user_id, product_id, quantity) VALUES (1, 1, 3)")
+        conn.commit()
+
+    assert checkout(1, delivery_fee=0)["success"]
+    interaction_buffer.flush()
+    live = _scores()
+
+    populate_interactions_from_db(progress=lambda message: None)
+
+    assert live == _scores() == {(1, 1): 3 * PURCHASE_WEIGHT}
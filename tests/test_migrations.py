@@ -0,0 +1,18 @@
+import sqlite3
+
+from app.data.migrations import MIGRATIONS, check_query_plans, find_full_scans, get_schema_version
+
+
+def test_hot_queries_use_indexes_on_fresh_schema():
+
+    assert check_query_plans()
+
+
+def test_hot_queries_use_indexes_on_migrated_database(database):
+
+    conn = sqlite3.connect(database)
+    try:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        assert find_full_scans(conn) == {}
+    finally:
+        conn.close()
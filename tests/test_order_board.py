@@ -0,0 +1,32 @@
+from app.services import db
+from app.services.checkout import checkout
+from app.services.order_board import PendingOrderBoard
+from app.services.users import _load_pending_orders, _order_changes, claim_order, pending_orders
+
+
+def test_other_worker_board_reloads_only_changed_orders(database):
+
+    with db.get_connection() as conn:
+        conn.execute("INSERT INTO users (id, username) VALUES (1, 'client'), (2, 'livreur')")
+        conn.execute("INSERT INTO wallets (user_id, balance) VALUES (1, 1000)")
+        conn.execute("INSERT INTO panier (user_id, product_id, quantity) VALUES (1, 1, 1)")
+        conn.commit()
+
+    loads = []
+
+    def load(order_id=None):
+        loads.append(order_id)
+        return _load_pending_orders(order_id)
+
+    other = PendingOrderBoard(load, changes_fn=_order_changes)  # tableau d'un autre worker
+    assert other.orders() == [] and loads == [None]
+
+    order_id = checkout(1, delivery_fee=3.0)["order_id"]
+    assert [order["id"] for order in pending_orders.orders()] == [order_id]
+    assert [order["id"] for order in other.orders()] == [order_id]
+    assert loads == [None, order_id]  # seule la nouvelle commande est relue
+
+    assert claim_order(order_id, 2, max_order=5) == "claimed"
+    assert other.orders() == [] and pending_orders.orders() == []
+    assert loads == [None, order_id, order_id]
+    assert not other.sync()  # rien de nouveau dans le journal
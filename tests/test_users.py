@@ -0,0 +1,19 @@
+from app.services.items import get_product
+from app.services.users import _cached_display_page, _display_page_or_raw, get_display_page
+
+
+def test_display_page_uses_product_name(database):
+
+    name = get_product(1)["name"]
+
+    assert get_display_page("/product/1") == "product " + name
+    assert get_display_page("/product/1/reviews") == "product " + name + " reviews"
+    assert get_display_page("/wallet") == "wallet"
+
+
+def test_visit_of_deleted_product_keeps_raw_path_uncached(database):
+
+    assert _display_page_or_raw("/product/999999") == "/product/999999"
+    assert _cached_display_page.cache_info().currsize == 0  # repli non mis en cache
+
+    assert _display_page_or_raw("/product/1") == "product " + get_product(1)["name"]